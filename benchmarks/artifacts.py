@@ -0,0 +1,77 @@
+"""
+Benchmark the binary artifact store against the CSV artifacts it replaces.
+
+A k-means-results-like table (k, x, y, cluster_id, mse, center_x, center_y,
+radius) is written and read back with pandas CSV and with common/artifacts.py.
+
+usage: python benchmarks/artifacts.py [--rows 12750 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+
+def synthetic_results(rows: int) -> pd.DataFrame:
+    """
+    Generate a k-means results table.
+    :param rows: The number of rows.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "k": rng.integers(1, 11, rows),
+        "x": rng.normal(size=rows),
+        "y": rng.normal(size=rows),
+        "cluster_id": rng.integers(0, 10, rows),
+        "mse": rng.random(rows),
+        "center_x": rng.normal(size=rows),
+        "center_y": rng.normal(size=rows),
+        "radius": rng.random(rows),
+    })
+
+
+def timed(func) -> float:
+    """
+    Run a function and return its wall time in milliseconds.
+    :param func: The function to run.
+    :return: The elapsed time.
+    """
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[12750, 1000000], help='table sizes to benchmark')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from common import artifacts
+
+    print(f"{'rows':>10}{'csv write':>12}{'npy write':>12}{'csv read':>12}{'npy read':>12}{'npy column':>12}  (ms)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            df = synthetic_results(rows)
+            csv_path = os.path.join(tmp, f"{rows}.csv")
+            npy_path = os.path.join(tmp, f"{rows}")
+
+            csv_write = timed(lambda: df.to_csv(csv_path, index=False))
+            npy_write = timed(lambda: artifacts.save(npy_path, df, export_csv=False))
+            csv_read = timed(lambda: pd.read_csv(csv_path)[['k', 'radius']])
+            npy_read = timed(lambda: artifacts.load(npy_path, ['k', 'radius']))
+            npy_column = timed(lambda: artifacts.columns(npy_path, ['radius'])['radius'].max())
+
+            print(f"{rows:>10}{csv_write:>12.1f}{npy_write:>12.1f}{csv_read:>12.1f}{npy_read:>12.1f}{npy_column:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
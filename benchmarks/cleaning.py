@@ -0,0 +1,101 @@
+"""
+Benchmark the cleaning of lab2-b's raw laptop dataset (lab2-b/src/cleaning.py) in memory and in chunks.
+
+A CSV shaped like org_laptop_prices.csv, with about 1% missing weights and 5% duplicated rows,
+is cleaned with every step: once in memory with exact quartiles (cleaning.clean) and once in
+two streaming passes with approximate quartiles (cleaning.clean_csv). Before the timed runs,
+the streaming cleaning is checked on a source with a header and no rows, and on an empty file:
+both must give an output with the header alone and zero rows.
+
+usage: python benchmarks/cleaning.py [--rows 100000 1000000] [--chunk-size 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LAB2B = os.path.join(ROOT, 'lab2-b')
+
+
+
+def synthetic_dataset(path: str, rows: int):
+    """
+    Write rows shaped like org_laptop_prices.csv, with missing weights and duplicated rows.
+    :param path: The path of the CSV file.
+    :param rows: The number of rows.
+    """
+    rng = np.random.default_rng(0)
+
+    def pick(values):
+        return np.asarray(values)[rng.integers(len(values), size=rows)]
+
+    weight = rng.normal(2.0, 0.5, size=rows).round(2)
+    weight[rng.random(rows) < 0.01] = np.nan
+    df = pd.DataFrame({
+        'Company': pick(['Acer', 'Apple', 'Asus', 'Dell', 'HP', 'Lenovo', 'MSI', 'Toshiba']),
+        'Product': pick([f'Model {i}' for i in range(600)]),
+        'Inches': pick([13.3, 14.0, 15.6, 17.3]),
+        'Ram': pick([4, 8, 16, 32]),
+        'Weight': weight,
+        'Price': rng.lognormal(7, 0.5, size=rows).round(2),
+        'CPU_freq': rng.uniform(1.0, 3.6, size=rows).round(1),
+        'PrimaryStorage': pick([128, 256, 512, 1024]),
+    })
+    duplicated = rng.random(rows) < 0.05
+    df[duplicated] = df.iloc[rng.integers(rows, size=int(duplicated.sum()))].to_numpy()
+    df.to_csv(path, index=False)
+
+
+def check_empty(cleaning, tmp: str):
+    """
+    Check that a source without rows is cleaned to its header alone.
+    :param cleaning: The cleaning module.
+    :param tmp: A temporary directory.
+    """
+    header = "Company,Inches,Price\n"
+    for name, content in (('header.csv', header), ('empty.csv', '')):
+        source, output = os.path.join(tmp, name), os.path.join(tmp, f'clean-{name}')
+        with open(source, 'w') as f:
+            f.write(content)
+        rows, _ = cleaning.clean_csv(source, output)
+        with open(output) as f:
+            assert rows == 0 and f.read() == content, name
+        assert not os.path.exists(f'{output}.tmp'), name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000], help='dataset sizes')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='the number of rows per chunk')
+    args = parser.parse_args()
+
+    sys.path.insert(0, LAB2B)
+    sys.path.insert(0, ROOT)
+    from src import cleaning
+
+    print(f"{'rows':>10}{'mode':>10}{'kept':>10}{'time (s)':>12}{'rows/s':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        check_empty(cleaning, tmp)
+
+        for rows in args.rows:
+            source = os.path.join(tmp, f'{rows}.csv')
+            synthetic_dataset(source, rows)
+
+            start = time.perf_counter()
+            kept = len(cleaning.clean(pd.read_csv(source), list(cleaning.STEPS))[0])
+            seconds = time.perf_counter() - start
+            print(f"{rows:>10}{'memory':>10}{kept:>10}{seconds:>12.3f}{rows / seconds:>14,.0f}")
+
+            start = time.perf_counter()
+            kept, _ = cleaning.clean_csv(source, os.path.join(tmp, 'clean.csv'), chunk_size=args.chunk_size)
+            seconds = time.perf_counter() - start
+            print(f"{rows:>10}{'chunked':>10}{kept:>10}{seconds:>12.3f}{rows / seconds:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
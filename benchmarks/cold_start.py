@@ -0,0 +1,94 @@
+"""
+Measure the cold start of the three apps: the time to start a process and create the app, and
+the latency of the first requests of the pages, with and without the preload mode (common/preload.py).
+
+Every run is a fresh interpreter started in the app directory, which imports run.py like a WSGI
+server would and then requests the routes the page loads first. Without preload, preload.warm is
+replaced by a no-op before run.py is imported. The process start is the wall time from spawning
+the interpreter until the app is created. The run fails when the median with preload exceeds
+the budgets.
+
+usage: python benchmarks/cold_start.py [--apps lab1 lab2-a lab2-b] [--runs 5] [--budget-start 4.0] [--budget-first 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# the routes each page requests first
+ROUTES = {
+    'lab1': ['/headers', '/data', '/data/histogram/Price'],
+    'lab2-a': ['/api/data', '/api/pca', '/api/pca/loadings', '/api/pca/elbow', '/api/kmeans/results'],
+    'lab2-b': ['/api/data', '/api/data/columns', '/api/data/cluster_means', '/api/data/mds', '/api/data/mds/variables'],
+}
+# the code run by every process: it prints the seconds spent creating the app and serving the first requests
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, '..')
+sys.path.insert(0, '.')
+{disable}
+import run
+ready = time.perf_counter()
+client, first = run.app.test_client(), {{}}
+for url in {routes!r}:
+    request = time.perf_counter()
+    client.get(url, headers={{'Accept': '*/*'}})
+    first[url] = time.perf_counter() - request
+print(json.dumps({{"create": ready - start, "first": first}}))
+"""
+
+
+
+def start(app: str, preload: bool) -> dict:
+    """
+    Start a fresh process that creates an app and serves its first requests.
+    :param app: lab1, lab2-a or lab2-b.
+    :param preload: Whether to keep the preload mode.
+    :return: The process start, the app creation and the first request latencies, in seconds.
+    """
+    disable = '' if preload else "import common.preload; common.preload.warm = lambda *args, **kwargs: {}"
+    code = CHILD.format(disable=disable, routes=ROUTES[app])
+
+    spawned = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(ROOT, app), check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    result = json.loads(output.decode().splitlines()[-1])
+
+    # the process start ends when the app is created, the first requests come after
+    result["start"] = time.perf_counter() - spawned - sum(result["first"].values())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', nargs='+', choices=list(ROUTES), default=list(ROUTES), help='the apps to measure')
+    parser.add_argument('--runs', type=int, default=5, help='the number of processes per app and mode')
+    parser.add_argument('--budget-start', type=float, default=4.0, help='the process start budget, in seconds')
+    parser.add_argument('--budget-first', type=float, default=50.0, help='the slowest first request budget, in ms')
+    args = parser.parse_args()
+
+    print(f"{'app':>8}{'preload':>9}{'start (s)':>11}{'create (s)':>12}{'first max (ms)':>16}{'first sum (ms)':>16}")
+    over = []
+    for app in args.apps:
+        for preload in (False, True):
+            runs = [start(app, preload) for _ in range(args.runs)]
+            process = statistics.median(run["start"] for run in runs)
+            create = statistics.median(run["create"] for run in runs)
+            slowest = statistics.median(max(run["first"].values()) for run in runs) * 1000
+            total = statistics.median(sum(run["first"].values()) for run in runs) * 1000
+            print(f"{app:>8}{'yes' if preload else 'no':>9}{process:>11.2f}{create:>12.2f}{slowest:>16.1f}{total:>16.1f}")
+            if preload and (process > args.budget_start or slowest > args.budget_first):
+                over.append(app)
+
+    if over:
+        print(f"over budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark the interactive k-means service of lab2-a and lab2-b (common/kmeans.py).
+
+For every algorithm, a synthetic CSV with three feature columns is clustered like
+the page re-clusters it: a cold fit of one K from k-means++, the same fit again
+from the fit cache, and a sweep of K=2..10. Every fit of the sweep is checked
+against the same fit with an empty cache, since a fit must not depend on what was
+fitted before it. The feature matrix is read once per file, its read time is
+reported separately.
+
+usage: python benchmarks/kmeans_fit.py [--rows 10000 1000000] [--k 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# the clustered features of the synthetic datasets
+FEATURES = ['Weight', 'Inches', 'Price']
+
+
+
+def synthetic_dataset(path: str, rows: int):
+    """
+    Write (Weight, Inches, Price)-like points around a few laptop sizes.
+    :param path: The path of the CSV file.
+    :param rows: The number of points.
+    """
+    rng = np.random.default_rng(0)
+    sizes = np.array([[1.2, 12.5, 900], [1.6, 13.3, 1200], [2.2, 15.6, 800], [3.2, 17.3, 2000]])
+    points = sizes[rng.integers(0, len(sizes), rows)] + rng.normal(scale=(0.3, 0.3, 150), size=(rows, 3))
+    pd.DataFrame(points, columns=FEATURES).to_csv(path, index=False)
+
+
+def timed(func) -> float:
+    """
+    Run a function and return its wall time in seconds.
+    :param func: The function to run.
+    :return: The elapsed seconds.
+    """
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000], help='dataset sizes')
+    parser.add_argument('--k', type=int, default=5, help='the K of the single fits')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from common import kmeans
+
+    print(f"{'rows':>10}{'algorithm':>11}{'read (s)':>10}{'cold (s)':>10}{'cached (s)':>12}{'sweep (s)':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f'{rows}.csv')
+            synthetic_dataset(path, rows)
+            read = timed(lambda: kmeans.matrix(path, FEATURES))
+
+            for seed, algorithm in enumerate(kmeans.ALGORITHMS[1:]):
+                # a fresh seed per algorithm, so nothing is fitted yet
+                cold = timed(lambda: kmeans.fit(path, FEATURES, args.k, algorithm, seed))
+                cached = timed(lambda: kmeans.fit(path, FEATURES, args.k, algorithm, seed))
+                sweep = timed(lambda: kmeans.sweep(path, FEATURES, range(2, 11), algorithm, seed + 100))
+                print(f"{rows:>10}{algorithm:>11}{read:>10.3f}{cold:>10.3f}{cached:>12.6f}{sweep:>11.3f}")
+
+                # the fits of the sweep are the fits of an empty cache
+                fits = kmeans.sweep(path, FEATURES, range(2, 11), algorithm, seed + 100)
+                kmeans._fits.clear()
+                for model in fits:
+                    assert np.array_equal(model["labels"], kmeans.fit(path, FEATURES, model["k"], algorithm, seed + 100)["labels"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the k-means sweep of lab2-a (k=1..10 on two features).
+
+The legacy sweep is the original per-point loop (iloc + np.linalg.norm per
+row), which is only run up to --legacy-max rows because it is O(k*n) Python.
+The vectorized sweep is src.api.clustering.kmeans_sweep, run sequentially and
+with the fits spread over every core.
+
+usage: python benchmarks/kmeans_sweep.py [--rows 1000 100000 1000000] [--legacy-max 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LAB2A = os.path.join(ROOT, 'lab2-a')
+
+
+
+def synthetic_points(rows: int) -> np.ndarray:
+    """
+    Generate (Weight, Inches)-like points around a few laptop sizes.
+    :param rows: The number of points.
+    :return: An (n, 2) array.
+    """
+    rng = np.random.default_rng(0)
+    sizes = np.array([[1.2, 12.5], [1.6, 13.3], [2.2, 15.6], [3.2, 17.3]])
+    return sizes[rng.integers(0, len(sizes), rows)] + rng.normal(scale=0.3, size=(rows, 2))
+
+
+def legacy_sweep(X: np.ndarray) -> list:
+    """
+    The original sweep that appends one dict per point and K.
+    :param X: The points.
+    :return: The list of result rows.
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import mean_squared_error
+
+    df_selected = pd.DataFrame(X, columns=['x', 'y'])
+    results = []
+    for k in range(1, 11):
+        kmeans = KMeans(n_clusters=k)
+        clusters = kmeans.fit_predict(df_selected)
+        mse = mean_squared_error(df_selected, kmeans.cluster_centers_[clusters])
+        for i, cluster in enumerate(clusters):
+            center = kmeans.cluster_centers_[cluster]
+            radius = np.linalg.norm(df_selected.iloc[i] - center)
+            results.append({"k": k, "coordinates": df_selected.iloc[i].tolist(), "cluster_id": cluster,
+                            "mse": mse, "center": center.tolist(), "radius": radius})
+    return results
+
+
+def timed(func) -> float:
+    """
+    Run a function and return its wall time in seconds.
+    :param func: The function to run.
+    :return: The elapsed time.
+    """
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000], help='dataset sizes')
+    parser.add_argument('--legacy-max', type=int, default=1000, help='largest size to run the legacy sweep on')
+    args = parser.parse_args()
+
+    sys.path.insert(0, LAB2A)
+    sys.path.insert(0, ROOT)
+    from src.api.clustering import kmeans_sweep
+
+    print(f"{'rows':>10}{'legacy':>12}{'vectorized':>12}{'parallel':>12}  (s)")
+    for rows in args.rows:
+        X = synthetic_points(rows)
+        legacy = timed(lambda: legacy_sweep(X)) if rows <= args.legacy_max else float('nan')
+        sequential = timed(lambda: kmeans_sweep(X, range(1, 11), n_jobs=1))
+        parallel = timed(lambda: kmeans_sweep(X, range(1, 11), n_jobs=-1))
+        print(f"{rows:>10}{legacy:>12.2f}{sequential:>12.2f}{parallel:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark the lab1 routes before and after the in-memory dataset store.
+
+The "before" numbers come from handlers that re-read the CSV and the JSON
+sidecars on every request (the original implementation), the "after" numbers
+come from the routes registered in lab1/run.py.
+
+usage: python benchmarks/lab1_store.py [--requests 500]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+LAB1 = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lab1')
+
+
+
+def legacy_app():
+    """
+    Build a Flask app with the original per-request CSV parsing handlers.
+    :return: The Flask app.
+    """
+    from flask import Flask, jsonify
+    import pandas as pd
+
+    app = Flask(__name__)
+
+    @app.route('/data/<column_name>')
+    def data_column(column_name):
+        df = pd.read_csv('./data/500_laptop_prices.csv')
+        if column_name in df.columns:
+            return df[column_name].to_json(orient='records')
+        return jsonify({"error": "Column not found"}), 404
+
+    @app.route('/data/type/<column_name>')
+    def data_column_type(column_name):
+        with open('./data/metadata.json') as f:
+            metadata = json.load(f)
+        if column_name in metadata["categorical"]:
+            return jsonify({"type": "categorical"})
+        return jsonify({"type": "numerical"})
+
+    @app.route('/data')
+    def data():
+        df = pd.read_csv('./data/500_laptop_prices.csv')
+        return df.to_json(orient='records')
+
+    @app.route('/headers')
+    def data_headers():
+        df = pd.read_csv('./data/500_laptop_prices.csv')
+        return jsonify(df.columns.tolist())
+
+    return app
+
+
+def requests_per_second(client, url: str, count: int) -> float:
+    """
+    Issue the same GET request several times and measure the throughput.
+    :param client: The Flask test client.
+    :param url: The URL to request.
+    :param count: The number of requests.
+    :return: The number of requests per second.
+    """
+    client.get(url)
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(url)
+        assert response.status_code == 200, url
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help='number of requests per route')
+    args = parser.parse_args()
+
+    # the apps use paths relative to the lab1 directory
+    os.chdir(LAB1)
+    sys.path.insert(0, LAB1)
+    import run
+
+    urls = ['/data/Price', '/data/type/Price', '/data', '/headers']
+    before = legacy_app().test_client()
+    after = run.app.test_client()
+
+    print(f"{'route':<20}{'before (req/s)':>16}{'after (req/s)':>16}{'speedup':>10}")
+    for url in urls:
+        old = requests_per_second(before, url, args.requests)
+        new = requests_per_second(after, url, args.requests)
+        print(f"{url:<20}{old:>16.1f}{new:>16.1f}{new / old:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
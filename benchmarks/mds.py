@@ -0,0 +1,58 @@
+"""
+Compare the MDS methods of lab2-b on standardized synthetic laptop features.
+
+SMACOF (the exact sklearn path) is O(n^2) in memory and time, so it is only
+run up to --smacof-max rows. Stress is Kruskal's stress-1 on sampled pairs.
+
+usage: python benchmarks/mds.py [--rows 1275 100000 1000000] [--smacof-max 1275]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+LAB2B = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lab2-b')
+
+
+
+def synthetic_features(rows: int) -> np.ndarray:
+    """
+    Generate 9 correlated numeric features, standardized like the sampled dataset.
+    :param rows: The number of rows.
+    :return: An (n, 9) array.
+    """
+    rng = np.random.default_rng(0)
+    latent = rng.normal(size=(rows, 3))
+    X = latent @ rng.normal(size=(3, 9)) + rng.normal(scale=0.5, size=(rows, 9))
+    return (X - X.mean(axis=0)) / X.std(axis=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1275, 100000, 1000000], help='dataset sizes')
+    parser.add_argument('--smacof-max', type=int, default=1275, help='largest size to run SMACOF on')
+    args = parser.parse_args()
+
+    sys.path.insert(0, LAB2B)
+    from src import embedding
+    from sklearn.manifold import MDS
+
+    print(f"{'rows':>10}{'method':>12}{'time (s)':>12}{'stress':>10}")
+    for rows in args.rows:
+        X = synthetic_features(rows)
+        for method in embedding.METHODS:
+            if method == 'smacof' and rows > args.smacof_max:
+                continue
+            start = time.perf_counter()
+            if method == 'smacof':
+                Y = MDS(n_components=2, dissimilarity='euclidean', random_state=42).fit_transform(X)
+                value = embedding.stress(X, Y)
+            else:
+                Y, value = embedding.embed(X, method)
+            print(f"{rows:>10}{method:>12}{time.perf_counter() - start:>12.2f}{value:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
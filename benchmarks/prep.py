@@ -0,0 +1,139 @@
+"""
+Measure the throughput of the dataset preparation engine (common/prep.py) on synthetic laptop datasets.
+
+A CSV shaped like lab1's laptop_prices.csv (23 columns, 10 of them strings and 4 yes or no)
+is generated chunk by chunk, then prepared with lab1's recipe: drop the missing values and the
+boolean columns, convert the price, dictionary-encode the categorical columns and write .npz
+columns. The sampled run draws 500 rows in a single streaming pass instead. The legacy run is
+the former lab1/setup.py (object strings, apply(lambda) and astype('category')), skipped above
+--legacy-max rows since its Python strings do not fit in memory at 10M rows.
+
+usage: python benchmarks/prep.py [--rows 100000 1000000 10000000] [--legacy-max 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# lab1's boolean columns, dropped by its recipe
+BOOLEANS = ['Touchscreen', 'IPSpanel', 'RetinaDisplay', 'SecondaryStorageType']
+
+
+
+def synthetic_chunk(rows: int, rng) -> pd.DataFrame:
+    """
+    Generate rows shaped like lab1's laptop_prices.csv, with about 1% missing weights.
+    :param rows: The number of rows.
+    :param rng: The random generator.
+    :return: The DataFrame.
+    """
+    def pick(values):
+        return np.asarray(values)[rng.integers(len(values), size=rows)]
+
+    weight = rng.normal(2.0, 0.5, size=rows).round(2)
+    weight[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        'Company': pick(['Acer', 'Apple', 'Asus', 'Dell', 'HP', 'Lenovo', 'MSI', 'Toshiba']),
+        'Product': pick([f'Model {i}' for i in range(600)]),
+        'TypeName': pick(['Notebook', 'Gaming', 'Ultrabook', '2 in 1 Convertible', 'Workstation']),
+        'Inches': pick([13.3, 14.0, 15.6, 17.3]),
+        'Ram': pick([4, 8, 16, 32]),
+        'OS': pick(['Windows 10', 'macOS', 'Linux', 'No OS', 'Chrome OS']),
+        'Weight': weight,
+        'Price_euros': rng.lognormal(7, 0.5, size=rows).round(2),
+        'Screen': pick(['Standard', 'Full HD', '4K Ultra HD', 'Quad HD+']),
+        'ScreenW': pick([1366, 1920, 2560, 3840]),
+        'ScreenH': pick([768, 1080, 1440, 2160]),
+        'Touchscreen': pick(['Yes', 'No']),
+        'IPSpanel': pick(['Yes', 'No']),
+        'RetinaDisplay': pick(['Yes', 'No']),
+        'CPU_company': pick(['Intel', 'AMD', 'Samsung']),
+        'CPU_freq': rng.uniform(1.0, 3.6, size=rows).round(1),
+        'CPU_model': pick([f'Core i{i} {j}' for i in (3, 5, 7) for j in range(30)]),
+        'PrimaryStorage': pick([128, 256, 512, 1024]),
+        'SecondaryStorage': pick([0, 0, 500, 1024]),
+        'PrimaryStorageType': pick(['SSD', 'HDD', 'Flash Storage', 'Hybrid']),
+        'SecondaryStorageType': pick(['No', 'HDD', 'SSD']),
+        'GPU_company': pick(['Intel', 'Nvidia', 'AMD']),
+        'GPU_model': pick([f'GPU {i}' for i in range(100)]),
+    })
+
+
+def generate(path: str, rows: int, chunk_size: int = 1000000):
+    """
+    Write a synthetic dataset chunk by chunk.
+    :param path: The path of the CSV file.
+    :param rows: The number of rows.
+    :param chunk_size: The number of rows generated at once.
+    """
+    rng = np.random.default_rng(0)
+    for start in range(0, rows, chunk_size):
+        synthetic_chunk(min(chunk_size, rows - start), rng).to_csv(path, mode='w' if start == 0 else 'a',
+                                                                     header=start == 0, index=False)
+
+
+def legacy(source: str, output: str):
+    """
+    Prepare a dataset like the former lab1/setup.py did.
+    :param source: The path of the source CSV file.
+    :param output: The path of the output CSV file.
+    """
+    df = pd.read_csv(source)
+    df.replace('', np.nan, inplace=True)
+    df.dropna(inplace=True)
+    df.drop(columns=BOOLEANS, inplace=True)
+    df['Price'] = df['Price_euros'].apply(lambda x: round(x * 1.19, 2))
+    df.drop(columns=['Price_euros'], inplace=True)
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].astype('category').cat.codes
+    df.to_csv(output, index=False)
+
+
+def measure(func) -> float:
+    """
+    Time a callable.
+    :param func: The callable.
+    :return: The time in seconds.
+    """
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000], help='dataset sizes')
+    parser.add_argument('--legacy-max', type=int, default=1000000, help='the biggest dataset of the legacy run')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from common import prep
+
+    print(f"pyarrow parser: {'yes' if prep.pyarrow is not None else 'no'}")
+    print(f"{'rows':>10}{'run':>10}{'time (s)':>12}{'rows/s':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'laptops.csv')
+        for rows in args.rows:
+            generate(source, rows)
+            runs = {
+                'prepare': lambda: prep.prepare(source, os.path.join(tmp, 'out.npz'), drop=BOOLEANS,
+                                                scales=[('Price', 'Price_euros', 1.19, 2)]),
+                'sample': lambda: prep.prepare(source, os.path.join(tmp, 'sample.csv'), drop=BOOLEANS, sample=500,
+                                               seed=42, scales=[('Price', 'Price_euros', 1.19, 2)]),
+            }
+            if rows <= args.legacy_max:
+                runs['legacy'] = lambda: legacy(source, os.path.join(tmp, 'legacy.csv'))
+
+            for name, run in runs.items():
+                elapsed = measure(run)
+                print(f"{rows:>10}{name:>10}{elapsed:>12.3f}{rows / elapsed:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark the brushing query engine of lab2-a and lab2-b (common/query.py).
+
+A synthetic artifact shaped like lab2-b's cluster data (numeric columns, string
+columns with few and many values, and the cluster of every row) is indexed once,
+then brushed with a few typical predicates. Every query is checked against a
+pandas boolean mask over the same columns, then timed returning the row ids and
+returning only the count, next to the time of the mask.
+
+usage: python benchmarks/query.py [--rows 1275 100000 1000000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# the brushes, as predicates of common/query.py
+QUERIES = {
+    'narrow range': [('range', 'Price', 0.20, 0.21)],
+    'wide range': [('range', 'Price', 0.1, 0.6)],
+    'range + set': [('range', 'Price', 0.1, 0.6), ('in', 'Company', ['Apple', 'Dell'])],
+    'range + set + cluster': [('range', 'Price', 0.1, 0.6), ('range', 'Weight', 0.2, 0.8),
+                              ('in', 'Company', ['Apple', 'Dell', 'HP']), ('in', 'cluster', ['0', '2'])],
+    'rare value': [('in', 'Product', ['Model 7']), ('range', 'Ram', 0.2, 1.0)],
+    # an open bound on an integer column, i.e. range=cluster:1:
+    'open cluster range': [('range', 'cluster', 1, float('inf'))],
+}
+
+
+
+def synthetic_frame(rows: int) -> pd.DataFrame:
+    """
+    Generate rows shaped like lab2-b's cluster data.
+    :param rows: The number of rows.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'Company': np.array(['Acer', 'Apple', 'Asus', 'Dell', 'HP', 'Lenovo', 'MSI', 'Toshiba'])[rng.integers(0, 8, rows)],
+        'Product': np.array([f'Model {i}' for i in range(600)])[rng.integers(0, 600, rows)],
+        'Inches': rng.choice([0.2, 0.4, 0.6, 0.8], rows),
+        'Ram': rng.choice([0.0, 0.1, 0.25, 1.0], rows),
+        'Weight': rng.random(rows),
+        'Price': rng.beta(2, 5, rows),
+        'cluster': rng.integers(0, 3, rows).astype(np.int32),
+    })
+
+
+def pandas_mask(df: pd.DataFrame, predicates: list) -> np.ndarray:
+    """
+    Evaluate the predicates with boolean masks, like a browser-side filter.
+    :param df: The DataFrame.
+    :param predicates: The predicates.
+    :return: The matching row ids.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for kind, name, *args in predicates:
+        column = df[name]
+        if kind == 'range':
+            mask &= column.between(*args).to_numpy()
+        else:
+            mask &= column.isin(args[0] if column.dtype == object else [float(v) for v in args[0]]).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def timed(func, repeat: int) -> float:
+    """
+    Run a function several times and return its median wall time in microseconds.
+    :param func: The function to run.
+    :param repeat: The number of runs.
+    :return: The median microseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1275, 100000, 1000000], help='dataset sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='the number of runs per query')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from common import artifacts, query
+
+    print(f"{'rows':>10}{'query':>24}{'matches':>10}{'ids (us)':>11}{'count (us)':>12}{'pandas (us)':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            df = synthetic_frame(rows)
+            path = os.path.join(tmp, f'{rows}')
+            artifacts.save(path, df, export_csv=False)
+            start = time.perf_counter()
+            indexes = query.index(path)
+            indexes.prepare()
+            print(f"{rows:>10}{'index build':>24}{'':>10}{(time.perf_counter() - start) * 1e6:>11.0f}")
+
+            for name, predicates in QUERIES.items():
+                count, ids = indexes.select(predicates)
+                assert np.array_equal(ids, pandas_mask(df, predicates))
+                with_ids = timed(lambda: indexes.select(predicates), args.repeat)
+                count_only = timed(lambda: indexes.select(predicates, ids=False), args.repeat)
+                baseline = timed(lambda: pandas_mask(df, predicates), args.repeat)
+                print(f"{rows:>10}{name:>24}{count:>10}{with_ids:>11.0f}{count_only:>12.0f}{baseline:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Time the pages of lab2-a's streamed dataset (GET /api/data?offset=&limit=) at increasing offsets.
+
+The rows before a page are skipped by pandas without being parsed (lab2-a/src/api/data.py),
+so both the time and the peak memory of a page should stay nearly flat as the offset grows.
+Every page is checked against the same rows sliced from the whole dataset, the deepest one
+ending on the last row.
+
+usage: python benchmarks/streaming.py [--rows 1000000] [--limit 1000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LAB2A = os.path.join(ROOT, 'lab2-a')
+
+
+
+def synthetic_dataset(rows: int) -> pd.DataFrame:
+    """
+    Generate a sampled dataset shaped like lab2-a's: numeric columns only.
+    :param rows: The number of rows.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'Inches': rng.choice([13.3, 14.0, 15.6, 17.3], size=rows),
+        'Ram': rng.choice([4, 8, 16, 32], size=rows),
+        'Weight': rng.normal(2.0, 0.5, size=rows).round(2),
+        'Price_euros': rng.lognormal(7, 0.5, size=rows).round(2),
+        'CPU_freq': rng.uniform(1.0, 3.6, size=rows).round(1),
+        'PrimaryStorage': rng.choice([128, 256, 512, 1024], size=rows),
+    })
+
+
+def fetch(app, data, offset: int, limit: int) -> tuple:
+    """
+    Stream a page of the dataset as NDJSON.
+    :param app: The Flask app.
+    :param data: The data API module.
+    :param offset: The first row of the page.
+    :param limit: The number of rows of the page.
+    :return: The records of the page, the time in seconds and the peak of traced memory in bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with app.test_request_context(f'/api/data?offset={offset}&limit={limit}', headers={'Accept': 'application/x-ndjson'}):
+        response = data._stream_dataset('application/x-ndjson')
+        body = response.get_data()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return [json.loads(line) for line in body.splitlines()], elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='the number of rows of the dataset')
+    parser.add_argument('--limit', type=int, default=1000, help='the number of rows of a page')
+    args = parser.parse_args()
+
+    sys.path.insert(0, LAB2A)
+    sys.path.insert(0, ROOT)
+    from flask import Flask
+    from src import config
+    from src.api import data
+
+    df = synthetic_dataset(args.rows)
+    offsets = sorted({0, args.rows // 10, args.rows // 2, max(0, args.rows - args.limit)})
+
+    print(f"{'offset':>10}{'rows':>8}{'time (s)':>12}{'peak (MB)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        config.SAMPLED_DATASET = os.path.join(tmp, 'dataset.csv')
+        df.to_csv(config.SAMPLED_DATASET, index=False)
+        expected = pd.read_csv(config.SAMPLED_DATASET)
+
+        app = Flask(__name__)
+        for offset in offsets:
+            records, elapsed, peak = fetch(app, data, offset, args.limit)
+            assert records == expected.iloc[offset:offset + args.limit].to_dict(orient='records'), offset
+            print(f"{offset:>10}{len(records):>8}{elapsed:>12.3f}{peak / 2 ** 20:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
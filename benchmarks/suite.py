@@ -0,0 +1,397 @@
+"""
+Benchmark every route of the three apps, and the compute functions behind them, on synthetic laptop datasets.
+
+Each (app, rows) run happens in its own subprocess, on a copy of the app in a temporary
+directory whose input files are replaced by synthetic data shaped like the originals, so the
+apps never share modules, the peak RSS is the one of the run and the repository data is never
+touched. The routes come from the url map of the app built by its run.py (router.configure_routes
+for lab2-a and lab2-b): the pipeline routes run first, in order, then every read route, then
+the routes that modify the data and the job routes. Every route is requested once cold (with
+force=true for the pipeline stages) and --repeat more times warm, through Flask's test client.
+The compute functions are then timed on their own, without HTTP.
+
+The results are written as JSON to --output. --compare prints the warm p50 and compute time
+ratios against a previous results file and exits with 1 when one exceeds --threshold.
+
+usage: python benchmarks/suite.py [--apps lab1 lab2-a lab2-b] [--rows 1000 100000 1000000] [--repeat 20]
+                                  [--output results.json] [--compare baseline.json] [--threshold 1.25]
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APPS = ('lab1', 'lab2-a', 'lab2-b')
+# the numeric columns of the lab2 sampled datasets
+NUMERIC = ['Inches', 'Ram', 'Weight', 'Price', 'ScreenW', 'ScreenH', 'CPU_freq', 'PrimaryStorage', 'SecondaryStorage']
+# lab1's boolean columns, dropped by its recipe
+BOOLEANS = ['Touchscreen', 'IPSpanel', 'RetinaDisplay', 'SecondaryStorageType']
+# SMACOF is O(n^2) in memory and time, bigger datasets are embedded with landmark MDS
+SMACOF_MAX = 2000
+# the routes that build the pipeline, requested first and in this order
+SETUP = ['create_dataset', 'create_eigenvalues_and_eigenvectors', 'create_clusters',
+         'create_data', 'cluster_data', 'data_mds', 'variables_mds']
+# the routes that modify the data or need a job, requested last and in this order
+LAST = ['append_rows', 'rebuild_pipeline', 'get_jobs', 'get_job', 'get_job_result', 'metrics']
+# every append_rows request appends rows, so it is repeated less
+APPEND_REPEAT = 3
+
+
+
+def raw_laptops(rows: int, price: str = 'Price', seed: int = 0) -> pd.DataFrame:
+    """
+    Generate rows shaped like the raw laptop_prices.csv, with about 1% missing weights.
+    :param rows: The number of rows.
+    :param price: The name of the price column, Price_euros for lab1.
+    :param seed: The seed of the generator.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(seed)
+
+    def pick(values):
+        return np.asarray(values)[rng.integers(len(values), size=rows)]
+
+    weight = rng.normal(2.0, 0.5, size=rows).round(2)
+    weight[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        'Company': pick(['Acer', 'Apple', 'Asus', 'Dell', 'HP', 'Lenovo', 'MSI', 'Toshiba']),
+        'Product': pick([f'Model {i}' for i in range(600)]),
+        'TypeName': pick(['Notebook', 'Gaming', 'Ultrabook', '2 in 1 Convertible', 'Workstation']),
+        'Inches': pick([13.3, 14.0, 15.6, 17.3]),
+        'Ram': pick([4, 8, 16, 32]),
+        'OS': pick(['Windows 10', 'macOS', 'Linux', 'No OS', 'Chrome OS']),
+        'Weight': weight,
+        price: rng.lognormal(7, 0.5, size=rows).round(2),
+        'Screen': pick(['Standard', 'Full HD', '4K Ultra HD', 'Quad HD+']),
+        'ScreenW': pick([1366, 1920, 2560, 3840]),
+        'ScreenH': pick([768, 1080, 1440, 2160]),
+        'Touchscreen': pick(['Yes', 'No']),
+        'IPSpanel': pick(['Yes', 'No']),
+        'RetinaDisplay': pick(['Yes', 'No']),
+        'CPU_company': pick(['Intel', 'AMD', 'Samsung']),
+        'CPU_freq': rng.uniform(1.0, 3.6, size=rows).round(1),
+        'CPU_model': pick([f'Core i{i} {j}' for i in (3, 5, 7) for j in range(30)]),
+        'PrimaryStorage': pick([128, 256, 512, 1024]),
+        'SecondaryStorage': pick([0, 0, 500, 1024]),
+        'PrimaryStorageType': pick(['SSD', 'HDD', 'Flash Storage', 'Hybrid']),
+        'SecondaryStorageType': pick(['No', 'HDD', 'SSD']),
+        'GPU_company': pick(['Intel', 'Nvidia', 'AMD']),
+        'GPU_model': pick([f'GPU {i}' for i in range(100)]),
+    })
+
+
+def sample_size(rows: int) -> int:
+    """
+    Return the size of the lab2-a sample of a dataset, half of its rows.
+    :param rows: The number of rows of the dataset.
+    :return: The number of sampled rows.
+    """
+    return max(rows // 2, 10)
+
+
+def prepare(app: str, rows: int, directory: str):
+    """
+    Copy an app and replace its data with a synthetic dataset.
+    :param app: lab1, lab2-a or lab2-b.
+    :param rows: The number of rows of the dataset.
+    :param directory: The directory of the copy.
+    """
+    shutil.copytree(os.path.join(ROOT, app), directory, ignore=shutil.ignore_patterns('data', '__pycache__'))
+    os.makedirs(os.path.join(directory, 'data'))
+
+    def path(name):
+        return os.path.join(directory, 'data', name)
+
+    if app == 'lab1':
+        # the dataset the app serves is prepared from the raw rows, like setup.py does
+        raw_laptops(rows, price='Price_euros').to_csv(path('laptop_prices.csv'), index=False)
+        sys.path.insert(0, ROOT)
+        from common import prep
+        prep.prepare(path('laptop_prices.csv'), path('500_laptop_prices.csv'), drop=BOOLEANS,
+                     scales=[('Price', 'Price_euros', 1.19, 2)], metadata=path('metadata.json'),
+                     mappings=path('mappings.json'))
+    elif app == 'lab2-a':
+        # the sampled dataset is created by the sample route
+        raw_laptops(rows).to_csv(path('laptop_prices.csv'), index=False)
+    else:
+        # the cleaned dataset is created by the dataset route, the sampled dataset is an input
+        df = raw_laptops(rows)
+        df.to_csv(path('org_laptop_prices.csv'), index=False)
+        df[NUMERIC].dropna().to_csv(path('dataset.csv'), index=False)
+
+
+def requests_of(app: str, rows: int) -> dict:
+    """
+    Return how to request the routes that need arguments, a body or a specific query.
+    :param app: lab1, lab2-a or lab2-b.
+    :param rows: The number of rows of the dataset.
+    :return: A dictionary of endpoint to its view arguments, query string and JSON body.
+    """
+    if app == 'lab1':
+        # the categorical routes get a categorical column, the others a numerical one
+        categorical = {"column_name": "Company"}
+        return {
+            'data_column': {"args": {"column_name": "Price"}},
+            'data_column_type': {"args": {"column_name": "Price"}},
+            'data_column_histogram': {"args": {"column_name": "Price"}, "query": "bins=20"},
+            'data_column_mapping': {"args": categorical},
+            'data_column_counts': {"args": categorical},
+        }
+
+    appended = raw_laptops(10, seed=1)[NUMERIC].dropna().to_dict(orient='records')
+    return {
+        'create_dataset': {"args": {"number_of_samples": sample_size(rows)}},
+        'create_eigenvalues_and_eigenvectors': {"query": "standardize=true"},
+        'append_rows': {"body": appended},
+        'data_mds': {"query": "method=smacof" if rows <= SMACOF_MAX else "method=landmark"},
+    }
+
+
+def computations(app: str, rows: int) -> dict:
+    """
+    Return the compute functions of an app, run without HTTP once the routes built the pipeline.
+    :param app: lab1, lab2-a or lab2-b.
+    :param rows: The number of rows of the dataset.
+    :return: A dictionary of name to callable.
+    """
+    if app == 'lab1':
+        import aggregations
+        from common import prep
+        prices = pd.read_csv('./data/500_laptop_prices.csv', usecols=['Price'])['Price'].to_numpy()
+        return {
+            'prepare.sample': lambda: prep.prepare('./data/laptop_prices.csv', './data/sample.csv', drop=BOOLEANS,
+                                                   sample=500, seed=42),
+            'histogram': lambda: aggregations.histogram(prices, 20, True),
+        }
+
+    if app == 'lab2-a':
+        from src.api import clustering, data, pca
+        return {
+            'sample': lambda: data.compute_dataset(sample_size(rows), True, True, seed=42),
+            'pca.full': lambda: pca.compute_eigendecomposition(True),
+            'pca.streaming': lambda: pca.compute_eigendecomposition(True, 'streaming'),
+            'kmeans.sweep': clustering.compute_clusters,
+        }
+
+    from src.api import data, mds
+    functions = {
+        'cleaning.memory': lambda: data.compute_dataset(mode='memory'),
+        'cleaning.chunked': lambda: data.compute_dataset(mode='chunked'),
+        'kmeans': data.compute_cluster_data,
+        'mds.landmark': lambda: mds.compute_data_mds('landmark'),
+        'mds.variables': mds.compute_variables_mds,
+    }
+    if rows <= SMACOF_MAX:
+        functions['mds.smacof'] = mds.compute_data_mds
+    return functions
+
+
+def peak_rss() -> int:
+    """
+    Return the peak resident memory of this process.
+    :return: The number of bytes, ru_maxrss being in kilobytes on Linux.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def summarize(seconds: list) -> dict:
+    """
+    Summarize the latencies of the warm requests of a route.
+    :param seconds: The latencies.
+    :return: The percentiles and the mean in milliseconds and the throughput in requests per second.
+    """
+    if not seconds:
+        return None
+    ms = np.asarray(seconds) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {"p50": p50, "p90": p90, "p99": p99, "mean": ms.mean(), "rps": len(ms) / sum(seconds)}
+
+
+def request_route(client, method: str, url: str, body, repeat: int, cold_url: str = None) -> dict:
+    """
+    Request a route once cold and repeat times warm.
+    :param client: The test client.
+    :param method: The HTTP method.
+    :param url: The URL, with its query string.
+    :param body: The JSON body, or None.
+    :param repeat: The number of warm requests.
+    :param cold_url: The URL of the cold request, defaults to url.
+    :return: The cold latency, the warm statistics, the statuses, the size of the body and the growth of the peak RSS.
+    """
+    rss, seconds, statuses = peak_rss(), [], collections.Counter()
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        response = client.open(url if i > 0 or cold_url is None else cold_url, method=method, json=body)
+        size = len(response.get_data())
+        seconds.append(time.perf_counter() - start)
+        statuses[str(response.status_code)] += 1
+    return {"cold": seconds[0] * 1000, "warm": summarize(seconds[1:]), "statuses": dict(statuses), "bytes": size,
+            "rss_growth": peak_rss() - rss}
+
+
+def run(app: str, rows: int, repeat: int, compute_repeat: int) -> dict:
+    """
+    Benchmark every route and compute function of an app copy, from its directory.
+    :param app: lab1, lab2-a or lab2-b.
+    :param rows: The number of rows of the dataset.
+    :param repeat: The number of warm requests per route.
+    :param compute_repeat: The number of runs per compute function.
+    :return: The results.
+    """
+    from flask import url_for
+
+    # the copy of the app imports the modules shared by the apps from the repository
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.getcwd())
+    import run as module
+    client = module.app.test_client()
+    specs = requests_of(app, rows)
+
+    # the pipeline first, then the read routes, then the routes that modify the data or need a job
+    rules = [(rule, method) for rule in module.app.url_map.iter_rules() if rule.endpoint != 'static'
+             for method in sorted(rule.methods - {'HEAD', 'OPTIONS'})]
+    def order(item):
+        endpoint = item[0].endpoint
+        if endpoint in SETUP:
+            return 0, SETUP.index(endpoint), ''
+        if endpoint in LAST:
+            return 2, LAST.index(endpoint), ''
+        return 1, 0, item[0].rule
+
+    routes, job = {}, None
+    for rule, method in sorted(rules, key=order):
+        spec = specs.get(rule.endpoint, {})
+        args = dict(spec.get("args", {}))
+        name = f"{method} {rule.rule}"
+
+        if 'job_id' in rule.arguments:
+            # a rebuild of the pipeline, which is up to date by now, gives a finished job
+            if job is None:
+                rebuild = client.open('/api/pipeline/rebuild?async=true', method='GET' if app == 'lab2-a' else 'POST')
+                job = rebuild.get_json()["job_id"]
+                while client.get(f'/api/jobs/{job}').get_json()["status"] not in ('finished', 'failed'):
+                    time.sleep(0.01)
+            args["job_id"] = job
+        missing = rule.arguments - set(args)
+        if missing:
+            routes[name] = {"skipped": f"no value for {', '.join(sorted(missing))}"}
+            continue
+
+        with module.app.test_request_context():
+            url = url_for(rule.endpoint, **args)
+        query = spec.get("query", "")
+        url += f"?{query}" if query else ""
+
+        # the cold request rebuilds the pipeline stages, the warm ones find them up to date
+        cold_url = f"{url}{'&' if query else '?'}force=true" if rule.endpoint in SETUP else None
+        count = min(repeat, APPEND_REPEAT) if rule.endpoint == 'append_rows' else repeat
+        routes[name] = request_route(client, method, url, spec.get("body"), count, cold_url)
+        print(f"{app:>8}{rows:>10}  {name:<45}{routes[name]['cold']:>12.1f}", file=sys.stderr)
+
+    compute = {}
+    for name, func in computations(app, rows).items():
+        seconds = []
+        for _ in range(compute_repeat):
+            start = time.perf_counter()
+            func()
+            seconds.append(time.perf_counter() - start)
+        compute[name] = {"min": min(seconds), "median": float(np.median(seconds))}
+
+    return {"app": app, "rows": rows, "routes": routes, "compute": compute, "peak_rss": peak_rss()}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """
+    Print the ratios of the warm p50 latencies and compute times of two results files.
+    :param results: The new results.
+    :param baseline: The previous results.
+    :param threshold: The ratio from which a measure is a regression.
+    :return: True if no measure regressed.
+    """
+    def measures(data):
+        values = {}
+        for run in data["runs"]:
+            for route, result in run["routes"].items():
+                if result.get("warm"):
+                    values[(run["app"], run["rows"], route)] = result["warm"]["p50"]
+            for name, result in run["compute"].items():
+                values[(run["app"], run["rows"], name)] = result["min"]
+        return values
+
+    new, old = measures(results), measures(baseline)
+    regressions = 0
+    print(f"{'app':>8}{'rows':>10}  {'measure':<45}{'ratio':>8}")
+    for key in sorted(set(new) & set(old)):
+        ratio = new[key] / old[key] if old[key] else float('inf')
+        flag = "  regression" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{key[0]:>8}{key[1]:>10}  {key[2]:<45}{ratio:>8.2f}{flag}")
+    return regressions == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', nargs='+', choices=APPS, default=list(APPS), help='the apps to benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000], help='dataset sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='the number of warm requests per route')
+    parser.add_argument('--compute-repeat', type=int, default=3, help='the number of runs per compute function')
+    parser.add_argument('--output', default='results.json', help='the JSON results file')
+    parser.add_argument('--compare', help='a previous JSON results file to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25, help='the ratio from which a measure regressed')
+    # the subprocess of one (app, rows) run, given the directory of the prepared copy
+    parser.add_argument('--worker', nargs=3, metavar=('APP', 'ROWS', 'DIRECTORY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        app, rows, directory = args.worker
+        os.chdir(directory)
+        json.dump(run(app, int(rows), args.repeat, args.compute_repeat), sys.stdout)
+        return
+
+    results = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+               "repeat": args.repeat, "runs": []}
+    for rows in args.rows:
+        for app in args.apps:
+            with tempfile.TemporaryDirectory() as tmp:
+                directory = os.path.join(tmp, app)
+                prepare(app, rows, directory)
+                command = [sys.executable, os.path.abspath(__file__), '--worker', app, str(rows), directory,
+                           '--repeat', str(args.repeat), '--compute-repeat', str(args.compute_repeat)]
+                output = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+                results["runs"].append(json.loads(output))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'app':>8}{'rows':>10}  {'route':<45}{'cold ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for result in results["runs"]:
+        for route, measure in result["routes"].items():
+            if "skipped" in measure:
+                print(f"{result['app']:>8}{result['rows']:>10}  {route:<45}  skipped: {measure['skipped']}")
+                continue
+            warm = measure["warm"] or {"p50": float('nan'), "p99": float('nan'), "rps": float('nan')}
+            print(f"{result['app']:>8}{result['rows']:>10}  {route:<45}{measure['cold']:>10.1f}"
+                  f"{warm['p50']:>10.2f}{warm['p99']:>10.2f}{warm['rps']:>10.0f}")
+        for name, measure in result["compute"].items():
+            print(f"{result['app']:>8}{result['rows']:>10}  {'compute ' + name:<45}{measure['min'] * 1000:>10.1f}")
+        print(f"{result['app']:>8}{result['rows']:>10}  {'peak RSS (MB)':<45}{result['peak_rss'] / 2 ** 20:>10.0f}")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            if not compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the JSON records of the bulk data endpoints with the binary columnar formats.
+
+The JSON path is the one the endpoints use by default (to_dict(orient='records')
+and a JSON dump), the typed columns and Arrow payloads come from common/wire.py.
+Arrow is skipped when pyarrow is not installed.
+
+usage: python benchmarks/wire.py [--rows 1000 100000 1000000]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+
+def synthetic_dataset(rows: int) -> pd.DataFrame:
+    """
+    Generate a dataset shaped like the lab2-b cluster data: floats, small integers and categoricals.
+    :param rows: The number of rows.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(0)
+    companies = np.array(['Acer', 'Apple', 'Asus', 'Dell', 'HP', 'Lenovo', 'MSI', 'Toshiba'])
+    types = np.array(['Noteb', 'Gamin', 'Ultra', '2 in ', 'Works'])
+    return pd.DataFrame({
+        'Company': companies[rng.integers(len(companies), size=rows)],
+        'TypeName': types[rng.integers(len(types), size=rows)],
+        'Inches': rng.choice([13.3, 14.0, 15.6, 17.3], size=rows),
+        'Ram': rng.choice([4, 8, 16, 32], size=rows),
+        'Weight': rng.normal(2.0, 0.5, size=rows).round(2),
+        'Price': rng.lognormal(7, 0.5, size=rows).round(2),
+        'ScreenW': rng.choice([1366, 1920, 2560, 3840], size=rows),
+        'CPU_freq': rng.uniform(1.0, 3.6, size=rows).round(1),
+        'cluster': rng.integers(3, size=rows),
+    })
+
+
+def measure(encode, df: pd.DataFrame) -> tuple:
+    """
+    Time an encoder.
+    :param encode: A callable turning the DataFrame into bytes.
+    :param df: The DataFrame.
+    :return: The time in seconds, the size and the gzip size of the payload.
+    """
+    start = time.perf_counter()
+    body = encode(df)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(body), len(gzip.compress(body, compresslevel=6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000], help='dataset sizes')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from common import wire
+
+    encoders = {
+        'json': lambda df: json.dumps(df.to_dict(orient='records')).encode(),
+        'columns': wire.encode_columns,
+    }
+    if wire.pyarrow is not None:
+        encoders['arrow'] = wire.encode_arrow
+
+    print(f"{'rows':>10}{'format':>10}{'time (s)':>12}{'bytes':>14}{'gzip bytes':>14}")
+    for rows in args.rows:
+        df = synthetic_dataset(rows)
+        for name, encode in encoders.items():
+            elapsed, size, compressed = measure(encode, df)
+            print(f"{rows:>10}{name:>10}{elapsed:>12.3f}{size:>14,}{compressed:>14,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+from flask import jsonify, url_for
+
+from common import cache, jobs
+
+
+
+def submit(name: str, func, *args, artifacts: tuple = ()):
+    """
+    Submit a computation as a background job and answer with its id.
+    :param name: The name of the job.
+    :param func: The job function, see jobs.submit.
+    :param args: The positional arguments of the function.
+    :param artifacts: The artifacts the job rewrites, their cached responses are dropped once it succeeds.
+    :return: A 202 response with the job id and status URL, or 503 if the queue is full.
+    """
+    try:
+        job = jobs.submit(name, func, *args, on_done=lambda: cache.invalidate(*artifacts))
+    except jobs.QueueFullError as error:
+        return jsonify({"error": str(error)}), 503
+
+    status_url = url_for('get_job', job_id=job.id)
+    return jsonify({"job_id": job.id, "status_url": status_url}), 202, {"Location": status_url}
+
+def get_jobs():
+    """
+    Return the status of every job of this server.
+    :return: The list of job statuses.
+    """
+    return jsonify({"jobs": [job.status() for job in jobs.all_jobs()]})
+
+def get_job(job_id: str):
+    """
+    Return the status, progress and (once finished) the result of a job.
+    :param job_id: The id of the job.
+    :return: The status of the job.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job.status())
+
+def get_job_result(job_id: str):
+    """
+    Return the result of a finished job.
+    :param job_id: The id of the job.
+    :return: The result of the job, 202 while it is still pending, or 500 if it failed.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    status = job.status()
+    if status["status"] == "finished":
+        return jsonify(status["result"])
+    if status["status"] == "failed":
+        return jsonify({"error": status["error"]}), 500
+    return jsonify(status), 202
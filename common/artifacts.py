@@ -0,0 +1,208 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from common import metrics
+
+
+
+# the manifest that lists the columns of an artifact, written last so readers never see a partial artifact
+MANIFEST = "columns.json"
+# whether save also writes every table as <path>.csv unless told otherwise, see configure
+EXPORT_CSV = False
+
+
+def configure(export_csv: bool):
+    """
+    Set the defaults of the app that saves the artifacts.
+    :param export_csv: Whether save also writes every table as <path>.csv unless told otherwise.
+    """
+    global EXPORT_CSV
+    EXPORT_CSV = export_csv
+
+
+def _column_array(values) -> tuple:
+    """
+    Convert a column to typed numpy arrays that can be saved without pickling.
+    :param values: The column values.
+    :return: The typed numpy array and, for a string column, the dictionary its array holds the codes of.
+    """
+    array = np.asarray(values)
+    if array.dtype == object or array.dtype.kind == "U":
+        # strings are dictionary-encoded like lab1's mappings.json: the sorted distinct values,
+        # stored once as fixed-width unicode, plus the smallest integer code of every row
+        codes, dictionary = pd.factorize(pd.Series(array, copy=False).astype(str), sort=True)
+        dictionary = np.asarray(dictionary, dtype=str)
+        codes = codes.astype(np.min_scalar_type(-max(len(dictionary), 1)))
+        return np.ascontiguousarray(codes), dictionary
+    return np.ascontiguousarray(array), None
+
+
+def _current_files(path: str) -> set:
+    """
+    Return the column files of the current version of an artifact.
+    :param path: The artifact directory.
+    :return: The set of file names, empty if the artifact does not exist yet.
+    """
+    if not os.path.exists(os.path.join(path, MANIFEST)):
+        return set()
+    with open(os.path.join(path, MANIFEST)) as f:
+        return {file for column in json.load(f)["columns"] for file in (column["file"], column.get("dictionary")) if file}
+
+
+def _publish(path: str, prefix: str, manifest: dict, keep: set):
+    """
+    Atomically replace the manifest of an artifact and remove the files of older versions.
+    :param path: The artifact directory.
+    :param prefix: The prefix of the files of the new version.
+    :param manifest: The manifest of the new version.
+    :param keep: The files of the previous version, kept for readers that already opened its manifest.
+    """
+    tmp = os.path.join(path, f"{MANIFEST}.{prefix}")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+
+    # remove the files of older versions, open memory maps stay valid
+    for file in os.listdir(path):
+        if file.endswith(".npy") and not file.startswith(prefix) and file not in keep:
+            os.remove(os.path.join(path, file))
+
+
+def save(path: str, data, export_csv: bool = None):
+    """
+    Save a table as one .npy file per column inside the artifact directory,
+    plus one dictionary file per string column.
+    :param path: The artifact directory.
+    :param data: A DataFrame or a dictionary of column arrays.
+    :param export_csv: Whether to also write <path>.csv, defaults to EXPORT_CSV.
+    """
+    columns = {str(name): _column_array(values) for name, values in data.items()}
+    os.makedirs(path, exist_ok=True)
+    keep = _current_files(path)
+
+    # write the columns under a fresh prefix, then atomically replace the manifest
+    prefix = uuid.uuid4().hex[:8]
+    manifest = {"rows": 0, "columns": []}
+    for i, (name, (array, dictionary)) in enumerate(columns.items()):
+        file = f"{prefix}-{i}.npy"
+        np.save(os.path.join(path, file), array)
+        manifest["rows"] = len(array)
+        entry = {"name": name, "file": file, "dtype": array.dtype.str}
+        if dictionary is not None:
+            entry["dictionary"] = f"{prefix}-{i}-dictionary.npy"
+            np.save(os.path.join(path, entry["dictionary"]), dictionary)
+        manifest["columns"].append(entry)
+    _publish(path, prefix, manifest, keep)
+
+    if export_csv is None:
+        export_csv = EXPORT_CSV
+    if export_csv:
+        decoded = {name: array if dictionary is None else dictionary[array] for name, (array, dictionary) in columns.items()}
+        pd.DataFrame(decoded).to_csv(f"{path}.csv", index=False)
+
+
+class Writer:
+    """
+    Write the columns of an artifact chunk by chunk through writable memory maps,
+    for tables that are produced in chunks and should not be held in memory at once.
+    """
+
+    def __init__(self, path: str, schema: dict, rows: int):
+        """
+        :param path: The artifact directory.
+        :param schema: A dictionary of column name to numeric dtype.
+        :param rows: The number of rows of the table.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.keep = _current_files(path)
+        self.prefix = uuid.uuid4().hex[:8]
+        self.manifest = {"rows": rows, "columns": []}
+        self.columns = {}
+        for i, (name, dtype) in enumerate(schema.items()):
+            file = f"{self.prefix}-{i}.npy"
+            self.columns[name] = np.lib.format.open_memmap(os.path.join(path, file), mode="w+", dtype=dtype, shape=(rows,))
+            self.manifest["columns"].append({"name": name, "file": file, "dtype": np.dtype(dtype).str})
+
+    def write(self, rows: slice, data):
+        """
+        Write a chunk of rows.
+        :param rows: The slice of rows to write.
+        :param data: A DataFrame or a dictionary of column arrays with the chunk values.
+        """
+        for name, values in data.items():
+            self.columns[name][rows] = values
+
+    def commit(self):
+        """
+        Flush the columns and publish the new version of the artifact.
+        """
+        for array in self.columns.values():
+            array.flush()
+        self.columns = {}
+        _publish(self.path, self.prefix, self.manifest, self.keep)
+
+
+def names(path: str) -> list:
+    """
+    Return the column names of an artifact.
+    :param path: The artifact directory.
+    :return: The list of column names.
+    """
+    with open(os.path.join(path, MANIFEST)) as f:
+        return [column["name"] for column in json.load(f)["columns"]]
+
+
+def _open(path: str, column: dict, decode: bool):
+    """
+    Open one column of an artifact.
+    :param path: The artifact directory.
+    :param column: The manifest entry of the column.
+    :param decode: Whether to decode a dictionary-encoded column into its values.
+    :return: The memory mapped array, or for a dictionary-encoded column the decoded values
+        or a Categorical over the memory mapped codes.
+    """
+    array = np.load(os.path.join(path, column["file"]), mmap_mode="r")
+    if "dictionary" not in column:
+        return array
+
+    dictionary = np.load(os.path.join(path, column["dictionary"]))
+    if decode:
+        return dictionary[array]
+    return pd.Categorical.from_codes(array, categories=dictionary, validate=False)
+
+
+def columns(path: str, selected: list = None, decode: bool = True) -> dict:
+    """
+    Open the columns of an artifact as read-only memory maps, without copying them.
+    :param path: The artifact directory.
+    :param selected: The column names to open, defaults to every column.
+    :param decode: Whether to decode the dictionary-encoded string columns, otherwise they
+        are returned as Categoricals whose codes are the memory mapped codes.
+    :return: A dictionary of column name to array.
+    """
+    with metrics.phase("load"):
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = {column["name"]: column for column in json.load(f)["columns"]}
+
+        selected = list(manifest) if selected is None else selected
+        missing = [name for name in selected if name not in manifest]
+        if missing:
+            raise KeyError(f"columns not found in {path}: {missing}")
+
+        return {name: _open(path, manifest[name], decode) for name in selected}
+
+
+def load(path: str, selected: list = None, decode: bool = True) -> pd.DataFrame:
+    """
+    Load an artifact (or some of its columns) as a DataFrame.
+    :param path: The artifact directory.
+    :param selected: The column names to load, defaults to every column.
+    :param decode: Whether to decode the dictionary-encoded string columns, otherwise they are categorical columns.
+    :return: The DataFrame.
+    """
+    return pd.DataFrame(columns(path, selected, decode), copy=False)
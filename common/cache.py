@@ -0,0 +1,142 @@
+import collections
+import functools
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import make_response, request
+
+from common import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+# the number of cached responses kept, the least recently used are dropped first
+CACHE_SIZE = 256
+
+# the cached responses, keyed by endpoint + view arguments + query arguments + Accept header
+_entries = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+class Entry:
+    """
+    A pre-serialized response body together with its compressed variants and ETag.
+    """
+
+    def __init__(self, version: tuple, body: bytes, mimetype: str):
+        """
+        :param version: The version of the artifacts the body was built from.
+        :param body: The encoded response body.
+        :param mimetype: The mimetype of the body.
+        """
+        self.version = version
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()
+        self.bodies = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.bodies['gzip'] = gzip.compress(body)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(body)
+
+
+def artifact_version(*paths: str) -> tuple:
+    """
+    Return the version of a set of artifacts based on their mtime and size.
+    :param paths: The artifact paths.
+    :return: A tuple that changes whenever one of the artifacts is rewritten.
+    """
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def invalidate(*paths: str):
+    """
+    Drop every cached response that was built from one of the given artifacts.
+    :param paths: The artifact paths that were rewritten.
+    """
+    with _lock:
+        for key in [key for key, entry in _entries.items() if set(entry[0]) & set(paths)]:
+            del _entries[key]
+
+
+def _encoding(entry: Entry) -> str:
+    """
+    Pick the best content encoding accepted by the client and available for the entry.
+    :param entry: The cached entry.
+    :return: 'br', 'gzip' or 'identity'.
+    """
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in entry.bodies and encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def cached(*artifacts: str):
+    """
+    Cache the encoded response of a read endpoint until one of its artifacts changes.
+    Responses carry a strong ETag and conditional requests are answered with 304.
+    :param artifacts: The paths of the artifacts the endpoint reads.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))),
+                   request.headers.get('Accept', ''))
+            version = artifact_version(*artifacts)
+
+            with _lock:
+                _, entry = _entries.get(key, (None, None))
+                if entry is not None:
+                    _entries.move_to_end(key)
+
+            hit = entry is not None and entry.version == version
+            metrics.cache_event("responses", hit)
+            if not hit:
+                response = make_response(func(*args, **kwargs))
+                # errors and streamed responses are sent as they are, buffering a stream would defeat it
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                with metrics.phase("serialize"):
+                    entry = Entry(version, response.get_data(), response.mimetype)
+                with _lock:
+                    _entries[key] = (artifacts, entry)
+                    _entries.move_to_end(key)
+                    while len(_entries) > CACHE_SIZE:
+                        _entries.popitem(last=False)
+
+            # each encoding is a different representation, so it gets its own strong ETag
+            encoding = _encoding(entry)
+            etag = entry.etag if encoding == 'identity' else f'{entry.etag}-{encoding}'
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(entry.bodies[encoding], 200)
+                response.mimetype = entry.mimetype
+                if encoding != 'identity':
+                    response.headers['Content-Encoding'] = encoding
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.update(('Accept', 'Accept-Encoding'))
+            return response
+
+        # the artifacts tell common/preload.py whether the endpoint can be warmed
+        wrapper.artifacts = artifacts
+        return wrapper
+    return decorator
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+
+
+# the number of worker processes, the number of pending jobs from which submissions are refused,
+# and the number of finished jobs kept, see configure
+WORKERS = 2
+QUEUE_SIZE = 16
+HISTORY = 100
+
+# the jobs of this process, keyed by job id
+_jobs = {}
+# the in-flight job id of each submission key, used to de-duplicate identical submissions
+_inflight = {}
+_lock = threading.Lock()
+
+# the process pool and the manager that shares progress between the workers and the server, started lazily
+_executor = None
+_manager = None
+_progress = None
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the job queue already holds QUEUE_SIZE pending jobs.
+    """
+
+
+class Job:
+    """
+    A computation submitted to the process pool.
+    """
+
+    def __init__(self, name: str, key: str):
+        """
+        :param name: The name of the job, e.g. the endpoint that submitted it.
+        :param key: The submission key of the job.
+        """
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.key = key
+        self.submitted = time.time()
+        self.finished = None
+        self.future = None
+
+    def status(self) -> dict:
+        """
+        Return the status of the job.
+        :return: The id, name, status, progress and timestamps of the job, plus its result or error once finished.
+        """
+        state = dict(_progress.get(self.id, {})) if _progress is not None else {}
+        status = {
+            "id": self.id,
+            "name": self.name,
+            "status": state.get("status", "queued"),
+            "progress": state.get("progress", 0.0),
+            "message": state.get("message"),
+            "submitted": self.submitted,
+            "finished": self.finished,
+        }
+
+        if self.future is not None and self.future.done():
+            error = self.future.exception()
+            if error is not None:
+                status.update(status="failed", error=str(error))
+            else:
+                status.update(status="finished", progress=1.0, message="completed", result=self.future.result())
+        return status
+
+
+class Progress:
+    """
+    A picklable progress reporter handed to the job function inside the worker.
+    """
+
+    def __init__(self, job_id: str, shared):
+        """
+        :param job_id: The id of the job.
+        :param shared: The manager dictionary shared with the server process.
+        """
+        self.job_id = job_id
+        self.shared = shared
+
+    def __call__(self, fraction: float, message: str = None):
+        """
+        Report the progress of the job.
+        :param fraction: The completed fraction, between 0 and 1.
+        :param message: A short description of the current step.
+        """
+        self.shared[self.job_id] = {"status": "running", "progress": round(float(fraction), 4), "message": message}
+
+
+def _run(func, args: tuple, progress: Progress):
+    """
+    Run a job function inside a worker process.
+    :param func: The job function, called as func(*args, progress=progress).
+    :param args: The positional arguments of the function.
+    :param progress: The progress reporter of the job.
+    :return: The result of the function.
+    """
+    progress(0.0, "started")
+    return func(*args, progress=progress)
+
+
+def configure(workers: int, queue_size: int, history: int):
+    """
+    Set the limits of the app that submits the jobs, before the first submission.
+    :param workers: The number of worker processes.
+    :param queue_size: The number of pending jobs from which submissions are refused.
+    :param history: The number of finished jobs kept.
+    """
+    global WORKERS, QUEUE_SIZE, HISTORY
+    WORKERS, QUEUE_SIZE, HISTORY = workers, queue_size, history
+
+
+def _start():
+    """
+    Start the process pool and the progress manager on first use.
+    """
+    global _executor, _manager, _progress
+    if _executor is None:
+        _manager = multiprocessing.Manager()
+        _progress = _manager.dict()
+        _executor = ProcessPoolExecutor(max_workers=WORKERS)
+
+
+def _prune():
+    """
+    Forget the oldest finished jobs once more than HISTORY are kept.
+    """
+    finished = sorted((job for job in _jobs.values() if job.finished is not None), key=lambda job: job.finished)
+    for job in finished[:max(0, len(finished) - HISTORY)]:
+        del _jobs[job.id]
+        _progress.pop(job.id, None)
+
+
+def submit(name: str, func, *args, on_done=None) -> Job:
+    """
+    Submit a computation to the process pool, or return the in-flight job of an identical submission.
+    :param name: The name of the job.
+    :param func: A module level function accepting the arguments and a progress keyword argument.
+    :param args: JSON serializable positional arguments of the function.
+    :param on_done: An optional callback called in the server process once the job succeeded.
+    :return: The job.
+    """
+    key = hashlib.sha256(json.dumps([func.__module__, func.__qualname__, args]).encode()).hexdigest()
+
+    with _lock:
+        _start()
+
+        # identical submissions share the job that is already queued or running
+        if key in _inflight:
+            return _jobs[_inflight[key]]
+
+        pending = sum(1 for job in _jobs.values() if job.finished is None)
+        if pending >= QUEUE_SIZE:
+            raise QueueFullError(f"{pending} jobs are already pending")
+
+        job = Job(name, key)
+        _jobs[job.id] = job
+        _inflight[key] = job.id
+        job.future = _executor.submit(_run, func, args, Progress(job.id, _progress))
+
+    def done(future):
+        with _lock:
+            job.finished = time.time()
+            _inflight.pop(key, None)
+            _prune()
+        if on_done is not None and future.exception() is None:
+            on_done()
+
+    job.future.add_done_callback(done)
+    return job
+
+
+def get(job_id: str):
+    """
+    Return a job by id.
+    :param job_id: The id of the job.
+    :return: The job, or None if the job is unknown.
+    """
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def all_jobs() -> list:
+    """
+    Return every job known to this process, newest first.
+    :return: The list of jobs.
+    """
+    with _lock:
+        return sorted(_jobs.values(), key=lambda job: job.submitted, reverse=True)
@@ -0,0 +1,185 @@
+import collections
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from common import cache, metrics
+
+
+
+# the k-means algorithms: lloyd and elkan are exact, minibatch updates the centers from random batches,
+# all are seeded with k-means++ and auto picks minibatch from MINIBATCH_MIN_ROWS rows, lloyd below
+ALGORITHMS = ("auto", "lloyd", "elkan", "minibatch")
+# the number of rows from which the auto algorithm uses mini-batch updates
+MINIBATCH_MIN_ROWS = 100000
+# the number of rows of a mini-batch
+BATCH_SIZE = 4096
+# the largest accepted K
+MAX_K = 50
+# the number of fitted models kept, the least recently used are dropped first
+CACHE_SIZE = 64
+
+# the feature matrices read by this process, keyed by dataset path, dataset version and features
+_matrices = {}
+# the fitted models, keyed by dataset path, dataset version, features, algorithm, seed and K
+_fits = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def parse_args(args, features: list, k: str) -> tuple:
+    """
+    Parse the clustering query parameters of an endpoint.
+    :param args: The request query parameters.
+    :param features: The default features.
+    :param k: The default K values.
+    :return: The features, the sorted K values, the algorithm and the seed.
+    :raises ValueError: If one of the parameters is invalid.
+    """
+    features = args.get('features', ','.join(features)).split(',')
+    if not all(features):
+        raise ValueError("features must be a comma-separated list of columns")
+
+    # K is a single value, a range like 2-10 or a comma-separated list, each part is checked before it is expanded
+    k_values = set()
+    for part in args.get('k', k).split(','):
+        first, _, last = part.partition('-')
+        try:
+            first, last = int(first), int(last or first)
+        except ValueError:
+            raise ValueError("k must be a value, a range like 2-10 or a comma-separated list of them") from None
+        if not 1 <= first <= last <= MAX_K:
+            raise ValueError(f"k must be between 1 and {MAX_K}, with ranges in increasing order")
+        k_values.update(range(first, last + 1))
+
+    algorithm = args.get('algorithm', 'auto')
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+
+    try:
+        seed = int(args.get('seed', 0))
+    except ValueError:
+        raise ValueError("seed must be an integer") from None
+
+    return features, sorted(k_values), algorithm, seed
+
+def matrix(path: str, features: list) -> tuple:
+    """
+    Return the feature matrix of a CSV file, reading it once per version of the file.
+    :param path: The path of the CSV file.
+    :param features: The numeric columns to read.
+    :return: The (n, d) float array, NaN for the missing values, and the indices of the rows with every feature.
+    :raises ValueError: If a feature is not a numeric column of the file.
+    """
+    key = (path, cache.artifact_version(path), tuple(features))
+    with _lock:
+        loaded = _matrices.get(key)
+    if loaded is not None:
+        return loaded
+
+    with metrics.phase("load"):
+        columns = pd.read_csv(path, nrows=0).columns
+        missing = [feature for feature in features if feature not in columns]
+        if missing:
+            raise ValueError(f"unknown features: {missing}")
+        df = pd.read_csv(path, usecols=features)[features]
+    strings = [feature for feature in features if not pd.api.types.is_numeric_dtype(df[feature])]
+    if strings:
+        raise ValueError(f"features must be numeric: {strings}")
+
+    X = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+    loaded = X, np.flatnonzero(~np.isnan(X).any(axis=1))
+    with _lock:
+        # forget the matrices of the previous versions of the file
+        for stale in [stale for stale in _matrices if stale[0] == path and stale[1] != key[1]]:
+            del _matrices[stale]
+        _matrices[key] = loaded
+    return loaded
+
+def fit(path: str, features: list, k: int, algorithm: str = 'auto', seed: int = 0) -> dict:
+    """
+    Cluster the rows of a CSV file on some of its features, fitting once per version of the file,
+    features, algorithm, seed and K. Every fit starts from a k-means++ initialization drawn with
+    the seed, so the same parameters give the same clusters whatever was fitted before.
+    Rows with a missing feature are not clustered.
+    :param path: The path of the CSV file.
+    :param features: The numeric columns to cluster on.
+    :param k: The number of clusters.
+    :param algorithm: 'lloyd', 'elkan', 'minibatch' or 'auto'.
+    :param seed: The seed of the k-means++ initialization and of the mini-batches.
+    :return: The K, the algorithm used, the number of iterations, the sum of squared errors, the
+        (k, d) centers, the size of every cluster and the cluster of every row (-1 if not clustered).
+    :raises ValueError: If a feature is invalid or there are fewer clustered rows than K.
+    """
+    X, rows = matrix(path, features)
+    if len(rows) < k:
+        raise ValueError(f"k must not exceed the {len(rows)} rows with every feature")
+    if algorithm == 'auto':
+        algorithm = 'minibatch' if len(rows) >= MINIBATCH_MIN_ROWS else 'lloyd'
+
+    key = (path, cache.artifact_version(path), tuple(features), algorithm, seed)
+    with _lock:
+        model = _fits.get(key + (k,))
+        if model is not None:
+            _fits.move_to_end(key + (k,))
+    metrics.cache_event("kmeans", model is not None)
+    if model is not None:
+        return model
+
+    fitted = X[rows] if len(rows) < len(X) else X
+    options = {"n_clusters": k, "init": 'k-means++', "n_init": 1, "random_state": seed}
+    if algorithm == 'minibatch':
+        estimator = MiniBatchKMeans(batch_size=BATCH_SIZE, **options).fit(fitted)
+    else:
+        estimator = KMeans(algorithm=algorithm, **options).fit(fitted)
+
+    labels = np.full(len(X), -1, dtype=np.int8)
+    labels[rows] = estimator.labels_
+    model = {
+        "k": k,
+        "algorithm": algorithm,
+        "n_iter": int(estimator.n_iter_),
+        "sse": float(estimator.inertia_),
+        "centers": estimator.cluster_centers_,
+        "sizes": np.bincount(estimator.labels_, minlength=k),
+        "labels": labels,
+        "rows": rows,
+    }
+    with _lock:
+        # forget the fits of the previous versions of the file, then the least recently used ones
+        for stale in [stale for stale in _fits if stale[0] == path and stale[1] != key[1]]:
+            del _fits[stale]
+        _fits[key + (k,)] = model
+        while len(_fits) > CACHE_SIZE:
+            _fits.popitem(last=False)
+    return model
+
+def sweep(path: str, features: list, k_values: list, algorithm: str = 'auto', seed: int = 0) -> list:
+    """
+    Fit several K in increasing order.
+    :param path: The path of the CSV file.
+    :param features: The numeric columns to cluster on.
+    :param k_values: The K values.
+    :param algorithm: 'lloyd', 'elkan', 'minibatch' or 'auto'.
+    :param seed: The seed of the k-means++ initialization and of the mini-batches.
+    :return: The fits, see fit.
+    """
+    return [fit(path, features, k, algorithm, seed) for k in sorted(k_values)]
+
+def summary(models: list, labels: bool) -> dict:
+    """
+    Convert fits of the same features to a JSON-serializable response.
+    :param models: The fits, see fit.
+    :param labels: Whether to add the cluster of every row, only for a single fit.
+    :return: The algorithm and, per K, the number of iterations, the sum of squared errors,
+        the centers and the cluster sizes, plus the labels.
+    """
+    response = {
+        "algorithm": models[0]["algorithm"],
+        "fits": [{"k": model["k"], "n_iter": model["n_iter"], "sse": model["sse"],
+                  "centers": model["centers"].tolist(), "sizes": model["sizes"].tolist()} for model in models],
+    }
+    if labels and len(models) == 1:
+        response["labels"] = models[0]["labels"].tolist()
+    return response
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+
+from common import artifacts, metrics
+
+
+
+# the directory of the lineage records, see configure
+DIRECTORY = "./data/lineage"
+
+# the content digests computed by this process, keyed by path and the stamp of the file they were computed from
+_digests = {}
+_lock = threading.Lock()
+
+
+def configure(directory: str):
+    """
+    Set where the app keeps its lineage records.
+    :param directory: The directory of the lineage records.
+    """
+    global DIRECTORY
+    DIRECTORY = directory
+
+def _stamp(path: str):
+    """
+    Return the mtime and size of a file, or of the manifest of an artifact directory.
+    :param path: The file or artifact path.
+    :return: The stamp, or None if the path does not exist.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, artifacts.MANIFEST)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _hash_file(sha, path: str):
+    """
+    Feed the content of a file to a hash.
+    :param sha: The hash object.
+    :param path: The file path.
+    """
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+
+
+def digest(path: str):
+    """
+    Return the content digest of a file or an artifact directory. The digest of an artifact
+    only depends on its column names, dtypes and values, not on the prefix of its files, so
+    rewriting an artifact with the same values keeps its digest.
+    :param path: The file or artifact path.
+    :return: The hex digest, or None if the path does not exist.
+    """
+    stamp = _stamp(path)
+    if stamp is None:
+        return None
+    with _lock:
+        if (path, stamp) in _digests:
+            return _digests[(path, stamp)]
+
+    sha = hashlib.sha256()
+    if os.path.isdir(path):
+        with open(os.path.join(path, artifacts.MANIFEST)) as f:
+            manifest = json.load(f)
+        for column in manifest["columns"]:
+            sha.update(json.dumps([column["name"], column["dtype"], "dictionary" in column]).encode())
+            for file in (column["file"], column.get("dictionary")):
+                if file:
+                    _hash_file(sha, os.path.join(path, file))
+    else:
+        _hash_file(sha, path)
+
+    with _lock:
+        # forget the digests of the previous versions of the path
+        for stale in [stale for stale in _digests if stale[0] == path]:
+            del _digests[stale]
+        _digests[(path, stamp)] = sha.hexdigest()
+    return _digests[(path, stamp)]
+
+
+class Stage:
+    """
+    A step of the pipeline that builds a set of artifacts from a set of inputs.
+
+    Every run records the digests of its inputs and outputs together with its parameters,
+    so a later request with the same inputs and parameters is answered from the record
+    instead of recomputing the artifacts.
+    """
+
+    def __init__(self, name: str, inputs: tuple, outputs: tuple):
+        """
+        :param name: The name of the stage, also the name of its record.
+        :param inputs: The paths of the files and artifacts the stage reads.
+        :param outputs: The paths of the files and artifacts the stage writes.
+        """
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    def key(self, params: dict) -> str:
+        """
+        Return the content address of a run, the hash of the input digests and the parameters.
+        :param params: The parameters of the run.
+        :return: The hex digest.
+        """
+        inputs = {path: digest(path) for path in self.inputs}
+        return hashlib.sha256(json.dumps([self.name, inputs, params], sort_keys=True).encode()).hexdigest()
+
+    def recorded(self):
+        """
+        Return the record of the last run of the stage.
+        :return: The record, or None if the stage never ran with lineage tracking.
+        """
+        try:
+            with open(os.path.join(DIRECTORY, f"{self.name}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def record(self, params: dict, result: dict) -> dict:
+        """
+        Atomically record a run of the stage, once its outputs are written.
+        :param params: The parameters of the run.
+        :param result: The result of the run, returned again by lookup.
+        :return: The result.
+        """
+        record = {
+            "stage": self.name,
+            "key": self.key(params),
+            "params": params,
+            "inputs": {path: digest(path) for path in self.inputs},
+            "outputs": {path: digest(path) for path in self.outputs},
+            "result": result,
+        }
+        os.makedirs(DIRECTORY, exist_ok=True)
+        path = os.path.join(DIRECTORY, f"{self.name}.json")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+        return result
+
+    def status(self) -> dict:
+        """
+        Compare the record of the stage with its current inputs and outputs.
+        :return: The name, parameters and status of the stage: 'untracked' if it never ran with
+            lineage tracking, 'stale' if an input changed since, 'modified' if an output was
+            rewritten outside of the stage, 'fresh' otherwise.
+        """
+        record = self.recorded()
+        if record is None:
+            return {"stage": self.name, "status": "untracked", "params": None}
+
+        if record["key"] != self.key(record["params"]):
+            status = "stale"
+        elif any(digest(path) != value for path, value in record["outputs"].items()):
+            status = "modified"
+        else:
+            status = "fresh"
+        return {"stage": self.name, "status": status, "params": record["params"]}
+
+    def lookup(self, params: dict):
+        """
+        Return the result of the last run if it was built from the current inputs with the same
+        parameters and its outputs were not rewritten since.
+        :param params: The parameters of the requested run.
+        :return: The recorded result flagged as cached, or None if the stage has to run.
+        """
+        record = self.recorded()
+        fresh = record is not None and record["params"] == params and record["key"] == self.key(params)
+        fresh = fresh and all(digest(path) == value for path, value in record["outputs"].items())
+        metrics.cache_event("lineage", fresh)
+        return dict(record["result"], cached=True) if fresh else None
@@ -0,0 +1,142 @@
+import numpy as np
+
+
+
+# the default number of cells per axis of the sampling and density grids
+GRID_SIZE = 64
+# the largest accepted grid, keeps the density responses small
+MAX_GRID_SIZE = 1024
+
+
+def parse_args(args) -> tuple:
+    """
+    Parse the level-of-detail query parameters of a scatterplot endpoint.
+    :param args: The request query parameters.
+    :return: The max_points (None for every point), the viewport (None for the whole plot) and the grid size.
+    :raises ValueError: If one of the parameters is invalid.
+    """
+    max_points = args.get('max_points')
+    if max_points is not None:
+        max_points = int(max_points)
+        if max_points < 1:
+            raise ValueError("max_points must be a positive integer")
+
+    grid_size = int(args.get('grid', GRID_SIZE))
+    if not 1 <= grid_size <= MAX_GRID_SIZE:
+        raise ValueError(f"grid must be between 1 and {MAX_GRID_SIZE}")
+
+    return max_points, parse_viewport(args.get('viewport')), grid_size
+
+
+def parse_viewport(value: str):
+    """
+    Parse a viewport query parameter.
+    :param value: The viewport as 'x0,x1,y0,y1', or None.
+    :return: The (x0, x1, y0, y1) tuple, or None if no viewport is given.
+    :raises ValueError: If the viewport is not four numbers with x0 < x1 and y0 < y1.
+    """
+    if value is None:
+        return None
+    try:
+        x0, x1, y0, y1 = (float(v) for v in value.split(','))
+    except ValueError:
+        x0 = x1 = y0 = y1 = 0.0
+    if not (x0 < x1 and y0 < y1):
+        raise ValueError("the viewport must be x0,x1,y0,y1 with x0 < x1 and y0 < y1")
+    return x0, x1, y0, y1
+
+
+def in_viewport(x: np.ndarray, y: np.ndarray, viewport) -> np.ndarray:
+    """
+    Return the indices of the points inside a viewport.
+    :param x: The x coordinates.
+    :param y: The y coordinates.
+    :param viewport: The (x0, x1, y0, y1) bounds, or None for every point.
+    :return: The indices of the points.
+    """
+    if viewport is None:
+        return np.arange(len(x))
+    x0, x1, y0, y1 = viewport
+    return np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+
+
+def _cells(x: np.ndarray, y: np.ndarray, grid_size: int, bounds=None) -> np.ndarray:
+    """
+    Return the flat grid cell of every point.
+    :param x: The x coordinates.
+    :param y: The y coordinates.
+    :param grid_size: The number of cells per axis.
+    :param bounds: The (x0, x1, y0, y1) extent of the grid, the extent of the points by default.
+    :return: The cell indices, between 0 and grid_size^2 - 1.
+    """
+    x0, x1, y0, y1 = bounds if bounds is not None else (x.min(), x.max(), y.min(), y.max())
+    column = np.clip(((x - x0) / max(x1 - x0, 1e-12) * grid_size).astype(np.int64), 0, grid_size - 1)
+    row = np.clip(((y - y0) / max(y1 - y0, 1e-12) * grid_size).astype(np.int64), 0, grid_size - 1)
+    return row * grid_size + column
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int, strata: np.ndarray = None,
+               grid_size: int = GRID_SIZE, random_state: int = 42) -> np.ndarray:
+    """
+    Select at most max_points points while preserving the density of the scatterplot.
+
+    Points are binned on a grid (and by stratum, e.g. cluster, when given). Every non-empty
+    bin keeps at least one point, so sparse regions and outliers stay visible, and the rest
+    of the budget is spread proportionally to the bin counts, so dense regions stay dense.
+    :param x: The x coordinates.
+    :param y: The y coordinates.
+    :param max_points: The maximum number of points to keep.
+    :param strata: An optional integer label per point, each label is sampled separately.
+    :param grid_size: The number of cells per axis.
+    :param random_state: The seed of the sampling.
+    :return: The sorted indices of the kept points.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+
+    bins = _cells(x, y, grid_size)
+    if strata is not None:
+        _, strata = np.unique(strata, return_inverse=True)
+        bins = strata.astype(np.int64) * grid_size * grid_size + bins
+
+    # a random rank of each point inside its bin
+    rng = np.random.default_rng(random_state)
+    order = rng.permutation(n)
+    order = order[np.argsort(bins[order], kind='stable')]
+    _, starts, counts = np.unique(bins[order], return_index=True, return_counts=True)
+
+    # keeping the points with the smallest rank / bin count takes the first point of every bin
+    # first, then the same fraction of every bin
+    priority = np.empty(n)
+    priority[order] = (np.arange(n) - np.repeat(starts, counts)) / np.repeat(counts, counts)
+    kept = np.lexsort((rng.random(n), priority))[:max_points]
+    return np.sort(kept)
+
+
+def density_grid(x: np.ndarray, y: np.ndarray, grid_size: int = GRID_SIZE, viewport=None) -> dict:
+    """
+    Count the points of every cell of a grid, the companion of a downsampled scatterplot.
+    :param x: The x coordinates.
+    :param y: The y coordinates.
+    :param grid_size: The number of cells per axis.
+    :param viewport: The (x0, x1, y0, y1) extent of the grid, the extent of the points by default.
+    :return: The extent, the grid size and the counts as rows (y) of columns (x).
+    """
+    if viewport is None:
+        viewport = (float(x.min()), float(x.max()), float(y.min()), float(y.max())) if len(x) else (0.0, 1.0, 0.0, 1.0)
+    x0, x1, y0, y1 = viewport
+
+    selected = in_viewport(x, y, viewport)
+    cells = _cells(x[selected], y[selected], grid_size, viewport)
+    counts = np.bincount(cells, minlength=grid_size * grid_size).reshape(grid_size, grid_size)
+
+    return {
+        "x0": x0,
+        "x1": x1,
+        "y0": y0,
+        "y1": y1,
+        "size": grid_size,
+        "total": int(len(selected)),
+        "counts": counts.tolist(),
+    }
@@ -0,0 +1,276 @@
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from flask import Flask, Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import resource
+except ImportError:  # resource is POSIX only, the peak RSS is not reported elsewhere
+    resource = None
+
+
+
+# the upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# the phases of a request, compute being the time of the view spent outside the other two
+PHASES = ("load", "compute", "serialize")
+# the content type of the Prometheus text exposition format
+MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# the instrumentation settings, see instrument
+_settings = {"trace_memory": False, "slow": None, "profile_dir": None, "interval": 0.005}
+# the latency histograms, keyed by (endpoint, method, phase): the count of every bucket plus +Inf, then the sum
+_latency = {}
+# the number of requests, keyed by (endpoint, method, status)
+_requests = collections.Counter()
+# the largest traced memory peak of a request, keyed by (endpoint, method)
+_peak_memory = {}
+# the number of lookups, keyed by (cache, 'hit' or 'miss')
+_cache = collections.Counter()
+# the number of profiled slow requests, keyed by endpoint
+_slow = collections.Counter()
+# the sampled stacks of the requests being profiled, keyed by thread id
+_samples = {}
+# the id of the process running the sampler thread, threads do not survive a fork
+_sampler_pid = None
+_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """
+    Account the time spent in a block to a phase of the current request, not to the enclosing phase.
+    Outside of an instrumented request, e.g. in a background job, the block is not timed.
+    :param name: 'load', 'compute' or 'serialize'.
+    """
+    state = g.get("_metrics") if has_request_context() else None
+    if state is None:
+        yield
+        return
+
+    outer = state["phase"]
+    _switch(state, name)
+    try:
+        yield
+    finally:
+        _switch(state, outer)
+
+def _switch(state: dict, name: str):
+    """
+    Charge the time since the last switch to the current phase and enter another one.
+    :param state: The instrumentation state of the request.
+    :param name: The phase entered.
+    """
+    now = time.perf_counter()
+    state["phases"][state["phase"]] += now - state["since"]
+    state["phase"], state["since"] = name, now
+
+def cache_event(cache: str, hit: bool):
+    """
+    Count a cache lookup.
+    :param cache: The name of the cache.
+    :param hit: Whether the lookup found a valid entry.
+    """
+    with _lock:
+        _cache[(cache, "hit" if hit else "miss")] += 1
+
+
+class _JSONProvider(DefaultJSONProvider):
+    """
+    The default JSON provider, with its encoding accounted to the serialize phase.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        with phase("serialize"):
+            return super().dumps(obj, **kwargs)
+
+
+def _stack(frame) -> str:
+    """
+    Format a stack in the collapsed format of flame graphs.
+    :param frame: The innermost frame.
+    :return: The calls from the outermost, separated by semicolons.
+    """
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(calls))
+
+def _sampler():
+    """
+    Sample the stacks of the threads serving a request, forever.
+    """
+    while True:
+        time.sleep(_settings["interval"])
+        frames = sys._current_frames()
+        with _lock:
+            for ident, stacks in _samples.items():
+                if ident in frames:
+                    stacks[_stack(frames[ident])] += 1
+
+def _dump(endpoint: str, stacks: collections.Counter):
+    """
+    Write the sampled stacks of a slow request, one collapsed stack and its sample count per line.
+    :param endpoint: The endpoint of the request.
+    :param stacks: The sample count of every stack.
+    """
+    path = os.path.join(_settings["profile_dir"], f"{time.time_ns()}-{endpoint}.folded")
+    with open(path, 'w') as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _before_request():
+    """
+    Start timing the request, in the compute phase until another one is entered.
+    """
+    global _sampler_pid
+
+    now = time.perf_counter()
+    g._metrics = {"start": now, "since": now, "phase": "compute", "phases": dict.fromkeys(PHASES, 0.0)}
+    if _settings["trace_memory"]:
+        # the peak is process-wide, so it is approximate when requests overlap
+        tracemalloc.reset_peak()
+        g._metrics["memory"] = tracemalloc.get_traced_memory()[0]
+    if _settings["slow"] is not None:
+        with _lock:
+            _samples[threading.get_ident()] = collections.Counter()
+            # started by the first request of every process, so it also runs in the workers of a preforking server
+            if _sampler_pid != os.getpid():
+                _sampler_pid = os.getpid()
+                threading.Thread(target=_sampler, name="metrics-sampler", daemon=True).start()
+
+def _after_request(response: Response) -> Response:
+    """
+    Record the latency of every phase of the request, its status and its memory peak.
+    A streamed body is produced after this, so its generation is not timed.
+    :param response: The response.
+    :return: The response, unchanged.
+    """
+    state = g.pop("_metrics", None)
+    if state is None:
+        return response
+    _switch(state, "compute")
+    total = state["since"] - state["start"]
+
+    endpoint, method = request.endpoint or "unmatched", request.method
+    peak = tracemalloc.get_traced_memory()[1] - state["memory"] if "memory" in state else None
+    with _lock:
+        for name, seconds in dict(state["phases"], total=total).items():
+            histogram = _latency.setdefault((endpoint, method, name), [0] * (len(BUCKETS) + 2))
+            histogram[next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))] += 1
+            histogram[-1] += seconds
+        _requests[(endpoint, method, str(response.status_code))] += 1
+        if peak is not None:
+            _peak_memory[(endpoint, method)] = max(peak, _peak_memory.get((endpoint, method), 0))
+        stacks = _samples.pop(threading.get_ident(), None)
+        if stacks and total >= _settings["slow"]:
+            _slow[endpoint] += 1
+        else:
+            stacks = None
+
+    if stacks:
+        _dump(endpoint, stacks)
+    return response
+
+
+def instrument(app: Flask, trace_memory: bool = False, slow: float = None, profile_dir: str = None,
+               interval: float = 0.005):
+    """
+    Record the latency, phases, status and memory of every request of an app, see export.
+    :param app: The Flask app.
+    :param trace_memory: Whether to trace the allocations to report the memory peak of the requests,
+        which slows every allocation down.
+    :param slow: The duration in seconds from which the stacks of a request are dumped to
+        profile_dir, None to disable the sampling profiler.
+    :param profile_dir: The directory of the dumped stacks.
+    :param interval: The number of seconds between two samples of the profiler.
+    """
+    _settings.update(trace_memory=trace_memory, slow=slow, profile_dir=profile_dir, interval=interval)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    # keep the JSON settings of the app, only the encoding is timed
+    provider = _JSONProvider(app)
+    provider.sort_keys = app.json.sort_keys
+    app.json = provider
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if slow is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+
+
+def _labels(**labels) -> str:
+    """
+    Format the labels of a sample, escaped like the Prometheus text format requires.
+    :param labels: The label values.
+    :return: The labels between braces.
+    """
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+def render() -> str:
+    """
+    Render every metric in the Prometheus text format.
+    :return: The text.
+    """
+    lines = []
+
+    def metric(name: str, kind: str, description: str):
+        lines.extend([f"# HELP {name} {description}", f"# TYPE {name} {kind}"])
+
+    with _lock:
+        metric("http_request_duration_seconds", "histogram", "The latency of the requests, in total and per phase.")
+        for (endpoint, method, name), histogram in sorted(_latency.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram):
+                cumulative += count
+                labels = _labels(endpoint=endpoint, method=method, phase=name, le=bound)
+                lines.append(f"http_request_duration_seconds_bucket{labels} {cumulative}")
+            labels = _labels(endpoint=endpoint, method=method, phase=name)
+            lines.append(f"http_request_duration_seconds_sum{labels} {histogram[-1]:.6f}")
+            lines.append(f"http_request_duration_seconds_count{labels} {cumulative}")
+
+        metric("http_requests_total", "counter", "The number of requests, per status.")
+        for (endpoint, method, status), count in sorted(_requests.items()):
+            lines.append(f"http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+        if _settings["trace_memory"]:
+            metric("http_request_peak_memory_bytes", "gauge", "The largest memory peak of a request, above its start.")
+            for (endpoint, method), peak in sorted(_peak_memory.items()):
+                lines.append(f"http_request_peak_memory_bytes{_labels(endpoint=endpoint, method=method)} {peak}")
+
+        metric("cache_requests_total", "counter", "The number of cache lookups, per result.")
+        for (cache, result), count in sorted(_cache.items()):
+            lines.append(f"cache_requests_total{_labels(cache=cache, result=result)} {count}")
+
+        metric("cache_hit_ratio", "gauge", "The fraction of the cache lookups that hit.")
+        for cache in sorted({cache for cache, _ in _cache}):
+            hits, misses = _cache[(cache, "hit")], _cache[(cache, "miss")]
+            lines.append(f"cache_hit_ratio{_labels(cache=cache)} {hits / (hits + misses):.6f}")
+
+        if _settings["slow"] is not None:
+            metric("slow_requests_total", "counter", "The number of requests whose stacks were dumped.")
+            for endpoint, count in sorted(_slow.items()):
+                lines.append(f"slow_requests_total{_labels(endpoint=endpoint)} {count}")
+
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        metric("process_peak_rss_bytes", "gauge", "The peak resident memory of the process.")
+        lines.append(f"process_peak_rss_bytes {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}")
+
+    return "\n".join(lines) + "\n"
+
+def export() -> Response:
+    """
+    Return every metric in the Prometheus text format.
+    """
+    return Response(render(), content_type=MIMETYPE)
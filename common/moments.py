@@ -0,0 +1,64 @@
+import numpy as np
+
+
+
+class MomentAccumulator:
+    """
+    Streaming estimate of the mean and the scatter matrix of a dataset.
+
+    Chunks are merged with the pairwise update of Chan et al., so the result does not
+    depend on the chunk size and memory stays O(d^2) regardless of the number of rows.
+    The covariance and the correlation matrices are both derived from the scatter matrix.
+    """
+
+    def __init__(self, columns: list):
+        """
+        :param columns: The names of the accumulated columns.
+        """
+        self.columns = list(columns)
+        self.n = 0
+        self.mean = np.zeros(len(self.columns))
+        self.m2 = np.zeros((len(self.columns), len(self.columns)))
+
+    def update(self, X):
+        """
+        Merge a chunk of rows into the accumulator.
+        :param X: An (n, d) array of rows.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return
+
+        mean = X.mean(axis=0)
+        centered = X - mean
+        n = self.n + len(X)
+        delta = mean - self.mean
+
+        self.m2 += centered.T @ centered + np.outer(delta, delta) * (self.n * len(X) / n)
+        self.mean += delta * (len(X) / n)
+        self.n = n
+
+    def covariance(self, ddof: int = 1) -> np.ndarray:
+        """
+        Return the covariance matrix of the accumulated rows.
+        :param ddof: The delta degrees of freedom, 1 for the sample covariance like DataFrame.cov().
+        :return: The (d, d) covariance matrix.
+        :raises ValueError: If there are no more rows than ddof.
+        """
+        if self.n <= ddof:
+            raise ValueError(f"the covariance needs more than {ddof} rows, got {self.n}")
+        return self.m2 / (self.n - ddof)
+
+    def correlation(self) -> np.ndarray:
+        """
+        Return the Pearson correlation matrix of the accumulated rows.
+        :return: The (d, d) correlation matrix. Constant columns get NaN, like DataFrame.corr().
+        :raises ValueError: If no rows were accumulated.
+        """
+        if self.n == 0:
+            raise ValueError("the correlation needs at least one row")
+        scale = np.sqrt(np.diag(self.m2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlations = self.m2 / np.outer(scale, scale)
+        np.fill_diagonal(correlations, np.where(scale > 0, 1.0, np.nan))
+        return np.clip(correlations, -1, 1)
@@ -0,0 +1,35 @@
+import os
+import time
+
+from flask import Flask
+
+
+
+def warm(app: Flask, endpoints: list = None) -> dict:
+    """
+    Request read routes once while the app is created, so that the first real request finds the
+    artifacts loaded, the responses encoded and the one-time initializations of numpy, pandas and
+    sklearn done. Run from the module that creates the app, this happens before a preloading WSGI
+    server (e.g. gunicorn --preload) forks its workers, which then share it copy-on-write.
+    :param app: The Flask app, with its routes configured.
+    :param endpoints: The endpoints to request, defaults to every cached GET route without arguments
+        whose artifacts exist (see cache.cached).
+    :return: The seconds spent per endpoint.
+    """
+    rules = [rule for rule in app.url_map.iter_rules() if 'GET' in rule.methods and not rule.arguments]
+    if endpoints is None:
+        # a cached route only reads its artifacts, it is safe to request unless one is missing
+        views = app.view_functions
+        rules = [rule for rule in rules if hasattr(views[rule.endpoint], 'artifacts')
+                 and all(os.path.exists(path) for path in views[rule.endpoint].artifacts)]
+    else:
+        rules = [rule for rule in rules if rule.endpoint in endpoints]
+
+    timings = {}
+    client = app.test_client()
+    for rule in rules:
+        start = time.perf_counter()
+        # browsers send */* to the JSON routes, and the cached responses are keyed by the Accept header
+        client.get(rule.rule, headers={'Accept': '*/*'})
+        timings[rule.endpoint] = time.perf_counter() - start
+    return timings
@@ -0,0 +1,367 @@
+"""
+Prepare a laptop dataset for the visualization apps: read it, drop the invalid rows and the
+unused columns, sample it, derive scaled columns, dictionary-encode the categorical columns
+and write it as CSV or as binary .npz columns, plus the metadata and mappings JSON sidecars.
+It only depends on numpy and pandas (and pyarrow, if installed, to parse whole files faster).
+
+usage: python -m common.prep SOURCE OUTPUT [--names ...] [--drop ...] [--sample N --seed S]
+                             [--scale TARGET=SOURCE*FACTOR[:DECIMALS] ...] [--metadata PATH] [--mappings PATH]
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:  # pyarrow is optional, pandas parses the files on its own
+    pyarrow = None
+
+
+
+# the kinds of column told apart by infer_schema
+NUMERIC = "numeric"
+BOOLEAN = "boolean"
+CATEGORICAL = "categorical"
+# the values of a yes or no column
+BOOLEAN_VALUES = {"Yes", "No", "yes", "no", "True", "False", "true", "false"}
+# the number of rows read per chunk by the streaming functions
+CHUNK_SIZE = 10000
+# the number of rows infer_schema looks at when it is given a file
+SCHEMA_ROWS = 10000
+
+# the helper columns of the sampling reservoir, named so they cannot clash with the columns of a dataset
+KEY = "__key__"
+STRATUM = "__stratum__"
+
+
+@contextlib.contextmanager
+def _timed(timings: dict, step: str):
+    """
+    Add the time spent in a block to the total of a step.
+    :param timings: The seconds spent per step.
+    :param step: The name of the step.
+    """
+    start = time.perf_counter()
+    yield
+    timings[step] = timings.get(step, 0.0) + time.perf_counter() - start
+
+def _map_columns(func, columns: list, workers: int = None) -> list:
+    """
+    Apply a function to every column in a thread pool, numpy and pandas release the GIL in their kernels.
+    :param func: The function of one column name.
+    :param columns: The column names.
+    :param workers: The number of threads, defaults to the number of CPUs.
+    :return: The results, in the order of the columns.
+    """
+    if len(columns) <= 1 or workers == 1:
+        return [func(column) for column in columns]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(func, columns))
+
+
+def _kind(values: pd.Series) -> str:
+    """
+    Infer the kind of a column.
+    :param values: The column.
+    :return: NUMERIC for int and float columns, BOOLEAN for bool and yes or no columns, CATEGORICAL otherwise.
+    """
+    if pd.api.types.is_bool_dtype(values):
+        return BOOLEAN
+    if pd.api.types.is_numeric_dtype(values):
+        return NUMERIC
+    distinct = values.dropna().unique()
+    if 0 < len(distinct) <= 2 and set(map(str, distinct)) <= BOOLEAN_VALUES:
+        return BOOLEAN
+    return CATEGORICAL
+
+def infer_schema(df: pd.DataFrame, workers: int = None) -> dict:
+    """
+    Infer the kind of every column of a dataset.
+    :param df: The dataset, or its first rows.
+    :param workers: The number of threads, defaults to the number of CPUs.
+    :return: A dictionary of column name to NUMERIC, BOOLEAN or CATEGORICAL, in the column order.
+    """
+    return dict(zip(df.columns, _map_columns(lambda column: _kind(df[column]), list(df.columns), workers)))
+
+def columns_of(schema: dict, *kinds: str) -> list:
+    """
+    Return the columns of some kinds.
+    :param schema: The schema, see infer_schema.
+    :param kinds: The kinds.
+    :return: The column names, in the column order.
+    """
+    return [column for column, kind in schema.items() if kind in kinds]
+
+
+def read_csv(path: str, names: list = None, categories: bool = False, **kwargs) -> pd.DataFrame:
+    """
+    Read a whole CSV file, with the multithreaded pyarrow parser when it is installed.
+    :param path: The path of the CSV file.
+    :param names: The names replacing those of the header, defaults to the header.
+    :param categories: Whether to parse the non-numeric columns straight to categoricals, which
+        keeps one code per row instead of one Python string per row.
+    :param kwargs: More arguments of pandas.read_csv.
+    :return: The dataset.
+    """
+    if names is not None:
+        kwargs.update(header=0, names=names)
+    if categories:
+        head = pd.read_csv(path, nrows=SCHEMA_ROWS, **kwargs)
+        dictionaries = columns_of(infer_schema(head), BOOLEAN, CATEGORICAL)
+        if pyarrow is not None and set(kwargs) <= {"header", "names"}:
+            # pandas would build one Python string per row before the categories, arrow encodes while parsing
+            options = pyarrow.csv.ReadOptions(column_names=names, skip_rows=1 if names is not None else 0)
+            types = {column: pyarrow.dictionary(pyarrow.int32(), pyarrow.string()) for column in dictionaries}
+            table = pyarrow.csv.read_csv(path, read_options=options,
+                                         convert_options=pyarrow.csv.ConvertOptions(column_types=types,
+                                                                                 strings_can_be_null=True))
+            return table.to_pandas()
+        kwargs["dtype"] = {column: 'category' for column in dictionaries}
+    if pyarrow is not None:
+        kwargs.setdefault("engine", "pyarrow")
+    return pd.read_csv(path, **kwargs)
+
+
+def _allocate(counts: pd.Series, n: int) -> pd.Series:
+    """
+    Split a sample size between strata in proportion to their sizes, with the largest remainder method.
+    :param counts: The number of valid rows of every stratum.
+    :param n: The sample size.
+    :return: The number of rows to sample from every stratum, summing to n.
+    """
+    shares = counts * n / counts.sum()
+    quotas = np.floor(shares).astype(np.int64)
+    remainders = (shares - quotas).sort_values(ascending=False, kind='stable')
+    quotas[remainders.index[:n - quotas.sum()]] += 1
+    return quotas
+
+def _reduce(reservoir: pd.DataFrame, n: int) -> pd.DataFrame:
+    """
+    Keep the n rows with the smallest keys of every stratum.
+    :param reservoir: The candidate rows.
+    :param n: The number of rows kept per stratum.
+    :return: The reduced reservoir, sorted by key.
+    """
+    return reservoir.sort_values(KEY, kind='stable').groupby(STRATUM, sort=False).head(n)
+
+def sample_csv(path: str, n: int, seed: int = None, stratify: str = None, drop_none: bool = True,
+               drop_categorical: bool = True, chunk_size: int = CHUNK_SIZE, names: list = None) -> pd.DataFrame:
+    """
+    Draw exactly n valid rows of a CSV file in a single pass, reading it chunk by chunk.
+
+    Every valid row gets a uniform random key and the rows with the n smallest keys form the
+    sample (a bottom-k reservoir), so memory stays O(n + chunk) regardless of the size of the
+    file and the sample only depends on the seed, not on the chunk size. When stratified, a
+    reservoir is kept per stratum and the sample is split between the strata in proportion to
+    their number of valid rows, known once the pass is over.
+    :param path: The path of the CSV file.
+    :param n: The number of rows to sample.
+    :param seed: The seed of the random keys, None for a fresh one.
+    :param stratify: The column whose values define the strata, None for a uniform sample.
+    :param drop_none: Whether rows with missing values are invalid.
+    :param drop_categorical: Whether to keep only the numeric columns, as inferred from the first chunk.
+    :param chunk_size: The number of rows per chunk.
+    :param names: The names replacing those of the header, defaults to the header.
+    :return: The sample, in the order of the file.
+    :raises ValueError: If the stratify column does not exist or the file has fewer than n valid rows.
+    """
+    rng = np.random.default_rng(seed)
+    kwargs = {"header": 0, "names": names} if names is not None else {}
+
+    columns, reservoir, offset = None, None, 0
+    counts, limits = pd.Series(dtype=np.int64), pd.Series(dtype=np.float64)
+    for chunk in pd.read_csv(path, chunksize=chunk_size, **kwargs):
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+
+        # the columns of the sample are decided once, so every chunk yields the same ones
+        if columns is None:
+            if stratify is not None and stratify not in chunk.columns:
+                raise ValueError(f"Unknown stratify column: {stratify}")
+            columns = columns_of(infer_schema(chunk), NUMERIC) if drop_categorical else list(chunk.columns)
+
+        # the rows are validated before sampling, so the sample holds exactly n valid rows
+        strata = chunk[stratify] if stratify is not None else pd.Series(0, index=chunk.index)
+        rows = chunk[columns]
+        valid = rows.notna().all(axis=1) if drop_none else pd.Series(True, index=chunk.index)
+        valid &= strata.notna()
+        rows, strata = rows[valid], strata[valid]
+        counts = counts.add(strata.value_counts(), fill_value=0)
+
+        # draw a key for every valid row, then skip the rows that cannot enter a full stratum
+        rows = rows.assign(**{KEY: rng.random(len(rows)), STRATUM: strata})
+        rows = rows[rows[KEY] < rows[STRATUM].map(limits).fillna(np.inf)]
+        reservoir = rows if reservoir is None else pd.concat([reservoir, rows])
+
+        # reduce once the reservoir doubled its bound, so the sort is amortized over several chunks
+        if len(reservoir) >= 2 * n * len(counts):
+            reservoir = _reduce(reservoir, n)
+            sizes = reservoir.groupby(STRATUM, sort=False)[KEY].agg(['size', 'max'])
+            limits = sizes['max'].where(sizes['size'] >= n, np.inf)
+
+    total = int(counts.sum())
+    if total < n:
+        raise ValueError(f"The dataset only has {total} valid rows, {n} were requested")
+    reservoir = _reduce(reservoir, n)
+
+    # take the smallest keys of every stratum up to its share of the sample
+    quotas = _allocate(counts.astype(np.int64), n)
+    rank = reservoir.groupby(STRATUM, sort=False).cumcount()
+    sample = reservoir[rank < reservoir[STRATUM].map(quotas)]
+    return sample.sort_index().drop(columns=[KEY, STRATUM]).reset_index(drop=True)
+
+
+def scale(df: pd.DataFrame, target: str, source: str, factor: float, decimals: int = None) -> pd.DataFrame:
+    """
+    Derive a column by scaling another one, e.g. a price in dollars from a price in euros.
+    The source column is replaced by the target column, appended last.
+    :param df: The dataset.
+    :param target: The name of the derived column.
+    :param source: The name of the scaled column.
+    :param factor: The scale factor.
+    :param decimals: The number of decimals to round to, None to keep every decimal.
+    :return: The dataset with the derived column.
+    """
+    values = df[source].to_numpy(dtype=np.float64) * factor
+    if decimals is not None:
+        values = np.round(values, decimals)
+    return df.drop(columns=[source]).assign(**{target: values})
+
+def encode(df: pd.DataFrame, columns: list, workers: int = None) -> tuple:
+    """
+    Dictionary-encode columns, each one in parallel: the sorted distinct values become the
+    dictionary and every row keeps the smallest integer code of its value (-1 for missing values).
+    :param df: The dataset.
+    :param columns: The columns to encode.
+    :param workers: The number of threads, defaults to the number of CPUs.
+    :return: The dataset with the codes and the dictionary of every encoded column, as
+        {column: {code: value}} like lab1's mappings.json.
+    """
+    def encode_column(column: str) -> tuple:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # the pyarrow parser keeps the values in order of appearance, the codes follow the sorted values
+            values = values.cat.remove_unused_categories()
+            values = values.cat.reorder_categories(sorted(values.cat.categories))
+        else:
+            values = values.astype('category')
+        return values.cat.codes, dict(enumerate(values.cat.categories.tolist()))
+
+    encoded = _map_columns(encode_column, list(columns), workers)
+    df = df.assign(**{column: codes for column, (codes, _) in zip(columns, encoded)})
+    return df, {column: mapping for column, (_, mapping) in zip(columns, encoded)}
+
+def write(df: pd.DataFrame, path: str):
+    """
+    Write a dataset as CSV, or as one typed array per column in a .npz file, by the extension of the path.
+    :param df: The dataset.
+    :param path: The path of the .csv or .npz file.
+    """
+    if path.endswith(".npz"):
+        np.savez(path, **{str(column): df[column].to_numpy() for column in df.columns})
+    else:
+        df.to_csv(path, index=False)
+
+
+def prepare(source: str, output: str, names: list = None, drop: list = (), dropna: bool = True, sample: int = None,
+            seed: int = None, scales: list = (), metadata: str = None, mappings: str = None, workers: int = None) -> dict:
+    """
+    Prepare a dataset: read it (or a sample of it), drop its invalid rows and unused columns,
+    derive its scaled columns, dictionary-encode its categorical columns and write it.
+    :param source: The path of the source CSV file.
+    :param output: The path of the .csv or .npz output file.
+    :param names: The names replacing those of the header, defaults to the header.
+    :param drop: The columns to drop.
+    :param dropna: Whether to drop the rows with missing values, before sampling.
+    :param sample: The number of rows to sample in a single streaming pass, None to keep every row.
+    :param seed: The seed of the sample.
+    :param scales: The (target, source, factor, decimals) column scalings, see scale.
+    :param metadata: The path of the JSON file listing the categorical and numerical columns, if any.
+    :param mappings: The path of the JSON file with the dictionary of every encoded column, if any.
+    :param workers: The number of threads of the per-column steps, defaults to the number of CPUs.
+    :return: The number of rows, the categorical and numerical columns and the seconds spent per step.
+    """
+    timings = {}
+
+    # a sample is drawn while the file is read, otherwise the file is read at once
+    if sample is not None:
+        with _timed(timings, "sample"):
+            df = sample_csv(source, sample, seed, drop_none=dropna, drop_categorical=False, names=names)
+    else:
+        with _timed(timings, "read"):
+            df = read_csv(source, names=names, categories=True)
+        with _timed(timings, "clean"):
+            df = df.dropna() if dropna else df
+
+    with _timed(timings, "clean"):
+        df = df.drop(columns=list(drop))
+
+    with _timed(timings, "scale"):
+        for target, column, factor, decimals in scales:
+            df = scale(df, target, column, factor, decimals)
+
+    # the yes or no columns that are left are categorical columns with two values
+    with _timed(timings, "encode"):
+        schema = infer_schema(df, workers)
+        categorical = columns_of(schema, BOOLEAN, CATEGORICAL)
+        numerical = columns_of(schema, NUMERIC)
+        df, dictionaries = encode(df, categorical, workers)
+
+    with _timed(timings, "write"):
+        write(df, output)
+        if metadata is not None:
+            with open(metadata, 'w') as f:
+                json.dump({'categorical': categorical, 'numerical': numerical}, f, indent=4)
+        if mappings is not None:
+            with open(mappings, 'w') as f:
+                json.dump(dictionaries, f, indent=4)
+
+    return {"rows": len(df), "categorical": categorical, "numerical": numerical, "timings": timings}
+
+
+def _parse_scale(spec: str) -> tuple:
+    """
+    Parse a --scale argument.
+    :param spec: TARGET=SOURCE*FACTOR, optionally followed by :DECIMALS.
+    :return: The (target, source, factor, decimals) tuple.
+    """
+    match = re.fullmatch(r"(.+?)=(.+)\*([-+.\deE]+)(?::(\d+))?", spec)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"expected TARGET=SOURCE*FACTOR[:DECIMALS], got {spec}")
+    target, source, factor, decimals = match.groups()
+    return target, source, float(factor), int(decimals) if decimals is not None else None
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='the source CSV file')
+    parser.add_argument('output', help='the output .csv or .npz file')
+    parser.add_argument('--names', nargs='+', help='the names replacing those of the header')
+    parser.add_argument('--drop', nargs='+', default=[], help='the columns to drop')
+    parser.add_argument('--keep-na', action='store_true', help='keep the rows with missing values')
+    parser.add_argument('--sample', type=int, help='the number of rows to sample')
+    parser.add_argument('--seed', type=int, help='the seed of the sample')
+    parser.add_argument('--scale', type=_parse_scale, nargs='+', default=[], help='TARGET=SOURCE*FACTOR[:DECIMALS]')
+    parser.add_argument('--metadata', help='the metadata JSON file to write')
+    parser.add_argument('--mappings', help='the mappings JSON file to write')
+    parser.add_argument('--workers', type=int, help='the number of threads of the per-column steps')
+    args = parser.parse_args(argv)
+
+    summary = prepare(args.source, args.output, args.names, args.drop, not args.keep_na, args.sample, args.seed,
+                      args.scale, args.metadata, args.mappings, args.workers)
+
+    print(f"rows: {summary['rows']}", f"categorical columns: {len(summary['categorical'])}",
+          f"numerical columns: {len(summary['numerical'])}")
+    for step, seconds in summary["timings"].items():
+        print(f"{step:>8}: {seconds:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
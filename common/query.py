@@ -0,0 +1,296 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from common import artifacts, cache, metrics
+
+
+
+# the columns with at most this many distinct values get one bitmap per value, e.g. the string columns and the clusters
+MAX_BITMAP_VALUES = 256
+# up to this fraction of the rows, the most selective predicate lists its rows and the others check them one by one,
+# above it every predicate becomes a bitmap and the bitmaps are intersected
+SPARSE_FRACTION = 1 / 64
+# the number of bits set in every byte value
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+# the indexes of the artifacts queried by this process, keyed by artifact path and version
+_indexes = {}
+_lock = threading.Lock()
+
+
+class Index:
+    """
+    The indexes of the columns of an artifact, built the first time a column is queried.
+
+    Every column gets a sorted index: the order of its rows by value, dictionary code for a
+    string column, and its sorted values, so a range or set predicate is a binary search
+    away from its row count and its row ids. Columns with few distinct values also get a
+    packed bitmap per value, so broad predicates are combined 8 rows per byte.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The artifact directory.
+        """
+        self.columns = artifacts.columns(path, decode=False)
+        self.rows = len(next(iter(self.columns.values()))) if self.columns else 0
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def column(self, name: str) -> dict:
+        """
+        Return the indexes of a column, building them on the first call.
+        :param name: The column name.
+        :return: The values (codes for a string column), the dictionary of a string column (None
+            otherwise), the row order, the sorted values, and for a column with few distinct values
+            those values, the number of rows of each and their packed bitmaps.
+        :raises ValueError: If the column does not exist.
+        """
+        with self.lock:
+            if name in self.indexes:
+                return self.indexes[name]
+            if name not in self.columns:
+                raise ValueError(f"unknown column: {name}")
+
+            column = self.columns[name]
+            if isinstance(column, pd.Categorical):
+                values, dictionary = np.asarray(column.codes), np.asarray(column.categories)
+            else:
+                values, dictionary = np.asarray(column), None
+
+            # the row ids fit in 32 bits for any dataset this app serves
+            order = np.argsort(values, kind='stable').astype(np.int32 if self.rows < 2 ** 31 else np.int64)
+            index = {"values": values, "dictionary": dictionary, "order": order, "sorted": values[order]}
+
+            # one bitmap per distinct value, built from the slice of its rows in the sorted index
+            starts = np.flatnonzero(np.r_[True, index["sorted"][1:] != index["sorted"][:-1]][:self.rows])
+            if len(starts) <= MAX_BITMAP_VALUES:
+                bounds = np.r_[starts, self.rows]
+                index["distinct"] = index["sorted"][starts]
+                index["counts"] = np.diff(bounds)
+                index["bitmaps"] = np.empty((len(starts), (self.rows + 7) // 8), dtype=np.uint8)
+                mask = np.zeros(self.rows, dtype=bool)
+                for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+                    mask[order[start:end]] = True
+                    index["bitmaps"][i] = np.packbits(mask)
+                    mask[order[start:end]] = False
+
+            self.indexes[name] = index
+            return index
+
+    def prepare(self):
+        """
+        Build the indexes of every column.
+        """
+        for name in self.columns:
+            self.column(name)
+
+    def _keys(self, index: dict, values: list) -> np.ndarray:
+        """
+        Convert the values of a set predicate to the values of the sorted index.
+        :param index: The indexes of the column.
+        :param values: The values, as strings.
+        :return: The sorted distinct keys with the dtype of the column, so the binary searches do not
+            convert the whole column: the codes of a string column, whose unknown values are dropped,
+            or the values of a numeric column, without the values an integer column cannot hold.
+        :raises ValueError: If a value of a numeric column is not a number.
+        """
+        dtype = index["values"].dtype
+        if index["dictionary"] is not None:
+            return np.flatnonzero(np.isin(index["dictionary"], values)).astype(dtype)
+        keys = np.unique(np.asarray(values, dtype=np.float64))
+        if dtype.kind in 'iu':
+            info = np.iinfo(dtype)
+            keys = keys[(keys == np.floor(keys)) & (keys >= info.min) & (keys <= info.max)]
+        return keys.astype(dtype)
+
+    def _plan(self, predicate: tuple) -> dict:
+        """
+        Resolve a predicate to slices of the sorted index of its column.
+        :param predicate: ('range', column, low, high) or ('in', column, values).
+        :return: The indexes of the column, the start and end of every slice, and the row count.
+        :raises ValueError: If the predicate does not apply to its column.
+        """
+        kind, name = predicate[:2]
+        index = self.column(name)
+        if kind == 'range':
+            if index["dictionary"] is not None:
+                raise ValueError(f"range predicates need a numeric column: {name}")
+            low, high = predicate[2:]
+            dtype = index["values"].dtype
+            if dtype.kind in 'iu':
+                # the bounds of an integer column are rounded inwards, an open or out of range bound
+                # becomes the first or last value of the column so the cast cannot overflow
+                low, high = np.ceil(low), np.floor(high)
+                first, last = index["sorted"][[0, -1]] if self.rows else (0, -1)
+                low, high = max(low, first), min(high, last)
+            starts = np.searchsorted(index["sorted"], np.asarray([low]).astype(dtype), side='left')
+            ends = np.searchsorted(index["sorted"], np.asarray([high]).astype(dtype), side='right')
+            if low > high:
+                starts, ends = starts[:0], ends[:0]
+            keys = None
+        else:
+            keys = self._keys(index, predicate[2])
+            starts = np.searchsorted(index["sorted"], keys, side='left')
+            ends = np.searchsorted(index["sorted"], keys, side='right')
+        return {"kind": kind, "index": index, "keys": keys, "starts": starts, "ends": ends,
+                "bounds": predicate[2:], "count": int(np.maximum(ends - starts, 0).sum())}
+
+    def _ids(self, plan: dict) -> np.ndarray:
+        """
+        List the rows of a predicate.
+        :param plan: The resolved predicate, see _plan.
+        :return: The row ids, in no particular order.
+        """
+        order = plan["index"]["order"]
+        return np.concatenate([order[start:end] for start, end in zip(plan["starts"], plan["ends"])] or [order[:0]])
+
+    def _test(self, plan: dict, ids: np.ndarray) -> np.ndarray:
+        """
+        Check a predicate on some rows.
+        :param plan: The resolved predicate, see _plan.
+        :param ids: The row ids, or a slice of the rows.
+        :return: The boolean mask of the rows that match.
+        """
+        values = plan["index"]["values"][ids]
+        if plan["kind"] == 'range':
+            low, high = plan["bounds"]
+            return (values >= low) & (values <= high)
+        return np.isin(values, plan["keys"])
+
+    def _bitmap(self, plan: dict) -> np.ndarray:
+        """
+        Return the packed bitmap of the rows of a predicate.
+        :param plan: The resolved predicate, see _plan.
+        :return: The bitmap, one bit per row in row order.
+        """
+        index = plan["index"]
+        if plan["kind"] == 'in' and "bitmaps" in index:
+            selected = np.flatnonzero(np.isin(index["distinct"], plan["keys"]))
+            if len(selected) == 0:
+                return np.zeros(index["bitmaps"].shape[1], dtype=np.uint8)
+            return np.bitwise_or.reduce(index["bitmaps"][selected], axis=0)
+        # setting the bits of many rows scattered by the index is slower than comparing every value in order
+        if plan["count"] * 4 > self.rows:
+            return np.packbits(self._test(plan, slice(None)))
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[self._ids(plan)] = True
+        return np.packbits(mask)
+
+    def select(self, predicates: list, ids: bool = True) -> tuple:
+        """
+        Find the rows that match every predicate.
+        The predicates are ordered by their row counts, known from the sorted indexes before any row is read.
+        :param predicates: The list of ('range', column, low, high) and ('in', column, values) predicates.
+        :param ids: Whether to list the rows, otherwise only their count is computed when possible.
+        :return: The number of matching rows and their sorted row ids (None if ids is false and not needed).
+        :raises ValueError: If a predicate does not apply to its column.
+        """
+        plans = sorted((self._plan(predicate) for predicate in predicates), key=lambda plan: plan["count"])
+        if not plans:
+            return self.rows, np.arange(self.rows) if ids else None
+        if len(plans) == 1 and not ids:
+            return plans[0]["count"], None
+
+        # a selective predicate lists few rows, the others only read the values of those rows
+        if plans[0]["count"] <= self.rows * SPARSE_FRACTION:
+            matches = self._ids(plans[0])
+            for plan in plans[1:]:
+                matches = matches[self._test(plan, matches)]
+            return len(matches), np.sort(matches)
+
+        # broad predicates are intersected 8 rows at a time
+        bitmap = self._bitmap(plans[0])
+        for plan in plans[1:]:
+            bitmap &= self._bitmap(plan)
+        count = int(POPCOUNT[bitmap].sum())
+        return count, np.flatnonzero(np.unpackbits(bitmap, count=self.rows)) if ids else None
+
+    def aggregate(self, name: str, ids: np.ndarray) -> dict:
+        """
+        Summarize a column over some rows.
+        :param name: The column name.
+        :param ids: The row ids.
+        :return: The min, max and mean of a numeric column, or the number of rows of every value
+            of a column with few distinct values.
+        """
+        index = self.column(name)
+        values = index["values"][ids]
+        if index["dictionary"] is not None:
+            counts = np.bincount(values[values >= 0], minlength=len(index["dictionary"]))
+            return {str(value): int(count) for value, count in zip(index["dictionary"], counts) if count}
+        if "distinct" in index:
+            counts = np.bincount(np.searchsorted(index["distinct"], values), minlength=len(index["distinct"]))
+            return {str(value): int(count) for value, count in zip(index["distinct"].tolist(), counts) if count}
+        if len(values) == 0:
+            return {"min": None, "max": None, "mean": None}
+        return {"min": float(np.nanmin(values)), "max": float(np.nanmax(values)), "mean": float(np.nanmean(values))}
+
+
+def index(path: str) -> Index:
+    """
+    Return the indexes of an artifact, creating them once per version of the artifact.
+    :param path: The artifact directory.
+    :return: The indexes.
+    """
+    key = (path, cache.artifact_version(path))
+    with _lock:
+        indexes = _indexes.get(key)
+    metrics.cache_event("query", indexes is not None)
+    if indexes is not None:
+        return indexes
+
+    indexes = Index(path)
+    with _lock:
+        # forget the indexes of the previous versions of the artifact
+        for stale in [stale for stale in _indexes if stale[0] == path and stale[1] != key[1]]:
+            del _indexes[stale]
+        indexes = _indexes.setdefault(key, indexes)
+    return indexes
+
+def parse_args(args) -> tuple:
+    """
+    Parse the query parameters of a query endpoint.
+    range=column:low:high (either bound may be empty) and in=column:value,value may be repeated.
+    :param args: The request query parameters.
+    :return: The predicates, whether to list the row ids, and the columns to aggregate.
+    :raises ValueError: If one of the parameters is invalid.
+    """
+    predicates = []
+    for value in args.getlist('range'):
+        try:
+            name, low, high = value.rsplit(':', 2)
+            predicates.append(('range', name, float(low or '-inf'), float(high or 'inf')))
+        except ValueError:
+            raise ValueError("range must be column:low:high") from None
+    for value in args.getlist('in'):
+        name, separator, values = value.partition(':')
+        if not separator:
+            raise ValueError("in must be column:value,value")
+        predicates.append(('in', name, values.split(',')))
+
+    ids = args.get('ids', 'true').lower() == 'true'
+    aggregate = [name for name in args.get('aggregate', '').split(',') if name]
+    return predicates, ids, aggregate
+
+def run(path: str, predicates: list, ids: bool = True, aggregate: list = ()) -> dict:
+    """
+    Run a query over an artifact.
+    :param path: The artifact directory.
+    :param predicates: The list of ('range', column, low, high) and ('in', column, values) predicates.
+    :param ids: Whether to return the ids of the matching rows.
+    :param aggregate: The columns to summarize over the matching rows, see Index.aggregate.
+    :return: The number of matching rows, plus their ids and the aggregates.
+    :raises ValueError: If a column does not exist or a predicate does not apply to it.
+    """
+    indexes = index(path)
+    count, matches = indexes.select(predicates, ids or bool(aggregate))
+
+    result = {"count": count}
+    if ids:
+        result["ids"] = matches.tolist()
+    if aggregate:
+        result["aggregates"] = {name: indexes.aggregate(name, matches) for name in aggregate}
+    return result
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import json
+
+from flask import Response, request
+
+from common import cache, wire
+
+
+
+# the number of rows sliced and encoded at a time, see configure
+CHUNK_SIZE = 10000
+
+
+class StaleCursorError(ValueError):
+    """
+    Raised when a cursor was issued for a previous version of the dataset.
+    """
+
+
+def configure(chunk_size: int):
+    """
+    Set how many rows the app slices and encodes at a time.
+    :param chunk_size: The number of rows of a chunk.
+    """
+    global CHUNK_SIZE
+    CHUNK_SIZE = chunk_size
+
+
+def requested(mimetype: str) -> bool:
+    """
+    Return whether the request asks for a streamed (and possibly paginated) response.
+    :param mimetype: The negotiated mimetype of the response.
+    :return: True for NDJSON, stream=true or any of the offset, limit and cursor parameters.
+    """
+    if mimetype == wire.NDJSON or request.args.get('stream', 'false').lower() == 'true':
+        return True
+    return any(name in request.args for name in ('offset', 'limit', 'cursor'))
+
+
+def version(*paths: str) -> str:
+    """
+    Return a short token identifying the current version of the artifacts a cursor points into.
+    :param paths: The artifact paths.
+    :return: The token.
+    """
+    return hashlib.sha256(repr(cache.artifact_version(*paths)).encode()).hexdigest()[:16]
+
+
+def encode_cursor(offset: int, limit: int, token: str) -> str:
+    """
+    Encode an opaque pagination cursor.
+    :param offset: The first row of the page.
+    :param limit: The number of rows of the page.
+    :param token: The version token of the dataset.
+    :return: The cursor.
+    """
+    payload = json.dumps({"offset": offset, "limit": limit, "version": token}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def page(token: str, mimetype: str) -> tuple:
+    """
+    Parse the offset, limit and cursor query parameters of the request.
+    :param token: The version token of the dataset.
+    :param mimetype: The negotiated mimetype of the response.
+    :return: The offset and the limit (None for every remaining row).
+    :raises StaleCursorError: If the cursor was issued for another version of the dataset.
+    :raises ValueError: If one of the parameters is invalid, or the mimetype cannot be streamed.
+    """
+    if mimetype not in (wire.JSON, wire.NDJSON):
+        raise ValueError("streaming and pagination are only available as JSON or NDJSON")
+
+    offset, limit = 0, None
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            offset, limit = int(state["offset"]), state["limit"]
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("invalid cursor")
+        if state.get("version") != token:
+            raise StaleCursorError("the dataset changed since the cursor was issued, restart from the first page")
+
+    offset = int(request.args.get('offset', offset))
+    limit = request.args.get('limit', limit)
+    limit = int(limit) if limit is not None else None
+    if offset < 0 or (limit is not None and limit < 1):
+        raise ValueError("offset must be >= 0 and limit >= 1")
+    return offset, limit
+
+
+def chunks(start: int, stop: int):
+    """
+    Yield the slices that split the rows [start, stop) into CHUNK_SIZE chunks.
+    :param start: The first row.
+    :param stop: The row after the last one.
+    """
+    for first in range(start, stop, CHUNK_SIZE):
+        yield slice(first, min(first + CHUNK_SIZE, stop))
+
+
+def _ndjson(frames):
+    """
+    Encode DataFrames as NDJSON, one record per line.
+    :param frames: An iterable of DataFrames.
+    """
+    for frame in frames:
+        if len(frame):
+            yield ''.join(json.dumps(record) + '\n' for record in frame.to_dict(orient='records'))
+
+
+def _json_array(frames):
+    """
+    Encode DataFrames as the fragments of a single JSON array of records.
+    :param frames: An iterable of DataFrames.
+    """
+    yield '['
+    first = True
+    for frame in frames:
+        if len(frame):
+            yield ('' if first else ',') + json.dumps(frame.to_dict(orient='records'))[1:-1]
+            first = False
+    yield ']'
+
+
+def response(frames, mimetype: str, offset: int, limit, total: int, token: str) -> Response:
+    """
+    Build a streamed response, encoding the DataFrames one at a time as they are produced,
+    so only one chunk of records is held in memory.
+    :param frames: An iterable of DataFrames, the rows of the page in order.
+    :param mimetype: wire.NDJSON, or wire.JSON for the fragments of a JSON array.
+    :param offset: The first row of the page.
+    :param limit: The number of rows of the page, None for every remaining row.
+    :param total: The number of rows of the dataset.
+    :param token: The version token of the dataset.
+    :return: The response, with the total count and the link to the next page in its headers.
+    """
+    body = _ndjson(frames) if mimetype == wire.NDJSON else _json_array(frames)
+    response = Response(body, mimetype=mimetype)
+    response.headers['X-Total-Count'] = str(total)
+
+    # the cursor of the next page, while rows remain
+    if limit is not None and offset + limit < total:
+        cursor = encode_cursor(offset + limit, limit, token)
+        response.headers['Link'] = f'<{request.base_url}?cursor={cursor}>; rel="next"'
+    return response
@@ -0,0 +1,142 @@
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+from flask import jsonify, make_response, request
+
+from common import metrics
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional, the typed columns format is always available
+    pyarrow = None
+
+
+
+# the representations of the bulk data endpoints, JSON first so it stays the default
+JSON = "application/json"
+COLUMNS = "application/vnd.columns"
+ARROW = "application/vnd.apache.arrow.stream"
+# one JSON record per line, streamed by the endpoints that support it (see common/streaming.py)
+NDJSON = "application/x-ndjson"
+
+# the magic bytes that start a typed columns payload
+MAGIC = b"TCOL"
+# every buffer starts on a multiple of this, so clients can view it as a typed array without copying
+ALIGNMENT = 8
+
+
+def formats(streaming: bool = False) -> list:
+    """
+    Return the representations this process can produce.
+    :param streaming: Whether the endpoint can also stream NDJSON.
+    :return: The mimetypes, in order of preference.
+    """
+    return [JSON, COLUMNS] + ([NDJSON] if streaming else []) + ([ARROW] if pyarrow is not None else [])
+
+
+def negotiate(streaming: bool = False):
+    """
+    Pick the representation of the response from the Accept header of the request.
+    :param streaming: Whether the endpoint can also stream NDJSON.
+    :return: The mimetype, or None if none of the accepted representations is available.
+    """
+    if not request.accept_mimetypes:
+        return JSON
+    return request.accept_mimetypes.best_match(formats(streaming))
+
+
+def not_acceptable(streaming: bool = False):
+    """
+    Return the error response of a request accepting none of the available representations.
+    :param streaming: Whether the endpoint can also stream NDJSON.
+    :return: The 406 response.
+    """
+    return jsonify({"error": "Not acceptable", "available": formats(streaming)}), 406
+
+
+def _column(values: pd.Series) -> tuple:
+    """
+    Convert a column to its typed array.
+    :param values: The column.
+    :return: The type name, the little-endian array and the dictionary of a categorical column (or None).
+    """
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_integer_dtype(values):
+        array = values.to_numpy()
+        if array.size == 0 or (array.min() >= np.iinfo(np.int32).min and array.max() <= np.iinfo(np.int32).max):
+            return "int32", array.astype('<i4'), None
+        return "float64", array.astype('<f8'), None
+    if pd.api.types.is_numeric_dtype(values):
+        return "float64", values.to_numpy(dtype='<f8', na_value=np.nan), None
+
+    # categoricals are sent once as a dictionary, plus one int32 code per row (-1 for missing values)
+    codes, dictionary = pd.factorize(values)
+    return "dictionary", codes.astype('<i4'), [str(v) for v in dictionary]
+
+
+def encode_columns(df: pd.DataFrame) -> bytes:
+    """
+    Encode a DataFrame in the typed columns format.
+
+    The payload is the MAGIC bytes, the little-endian uint32 length of a JSON header, the header
+    and the column buffers. The header gives the number of rows and, for every column, its name,
+    its type (float64, int32 or dictionary of int32 codes), the byte offset of its buffer from the
+    start of the payload and, for dictionary columns, the list of values.
+    :param df: The DataFrame.
+    :return: The payload.
+    """
+    columns = [(name, *_column(df[name])) for name in df.columns]
+
+    # the offsets only depend on the header length, so they are computed against a placeholder first
+    def header(start: int) -> bytes:
+        entries, offset = [], start
+        for name, kind, array, dictionary in columns:
+            entry = {"name": str(name), "type": kind, "offset": offset}
+            if dictionary is not None:
+                entry["dictionary"] = dictionary
+            entries.append(entry)
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        return json.dumps({"rows": len(df), "columns": entries}).encode()
+
+    start = 0
+    while True:
+        encoded = header(start)
+        prefix = len(MAGIC) + 4 + len(encoded)
+        aligned = -(-prefix // ALIGNMENT) * ALIGNMENT
+        if aligned == start:
+            break
+        start = aligned
+
+    chunks = [MAGIC, struct.pack('<I', len(encoded)), encoded, b"\0" * (start - prefix)]
+    for _, _, array, _ in columns:
+        chunks.append(array.tobytes())
+        chunks.append(b"\0" * (-array.nbytes % ALIGNMENT))
+    return b"".join(chunks)
+
+
+def encode_arrow(df: pd.DataFrame) -> bytes:
+    """
+    Encode a DataFrame as an Arrow IPC stream, with the string columns dictionary-encoded.
+    :param df: The DataFrame.
+    :return: The payload.
+    """
+    df = df.astype({name: 'category' for name in df.select_dtypes(include='object').columns})
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def response(df: pd.DataFrame, mimetype: str):
+    """
+    Build the binary response of a DataFrame.
+    :param df: The DataFrame.
+    :param mimetype: COLUMNS or ARROW.
+    :return: The response.
+    """
+    with metrics.phase("serialize"):
+        body = encode_arrow(df) if mimetype == ARROW else encode_columns(df)
+    return make_response(body, 200, {"Content-Type": mimetype})
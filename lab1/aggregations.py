@@ -0,0 +1,81 @@
+import math
+
+import numpy as np
+
+
+
+def nice_thresholds(start: float, stop: float, count: int) -> np.ndarray:
+    """
+    Return round thresholds between start and stop, the same ones d3's scale.ticks(count) picks.
+    :param start: The smallest value.
+    :param stop: The biggest value.
+    :param count: The approximate number of thresholds.
+    :return: The thresholds.
+    """
+    if stop <= start or count <= 0:
+        return np.asarray([start])
+
+    step = (stop - start) / count
+    power = math.floor(math.log10(step))
+    error = step / 10 ** power
+    factor = 10 if error >= math.sqrt(50) else 5 if error >= math.sqrt(10) else 2 if error >= math.sqrt(2) else 1
+
+    # like d3, divide by the inverse of fractional steps so that e.g. 0.3 is not 0.30000000000000004
+    if power < 0:
+        inverse = 10 ** -power / factor
+        first, last = math.ceil(start * inverse), math.floor(stop * inverse)
+        return np.arange(first, last + 1) / inverse
+    increment = factor * 10 ** power
+    first, last = math.ceil(start / increment), math.floor(stop / increment)
+    return np.arange(first, last + 1) * increment
+
+
+def histogram(values: np.ndarray, bins: int = 10, nice: bool = True) -> dict:
+    """
+    Bin a numerical column.
+    :param values: The column values.
+    :param bins: The number of bins (approximate when nice is set).
+    :param nice: Whether to use round thresholds like d3.histogram().thresholds(x.ticks(bins)),
+        otherwise the range is split into bins equal-width bins.
+    :return: The min, max and the list of bins with their bounds (x0, x1) and count.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {"min": None, "max": None, "bins": []}
+
+    low, high = float(values.min()), float(values.max())
+    if nice:
+        thresholds = nice_thresholds(low, high, bins)
+    else:
+        thresholds = np.linspace(low, high, bins + 1)[1:-1]
+
+    # same binning rule as d3: thresholds in (min, max], a value goes right of the thresholds it equals
+    thresholds = thresholds[(thresholds > low) & (thresholds <= high)]
+    counts = np.bincount(np.searchsorted(thresholds, values, side='right'), minlength=len(thresholds) + 1)
+    edges = np.concatenate([[low], thresholds, [high]])
+
+    return {
+        "min": low,
+        "max": high,
+        "bins": [{"x0": float(x0), "x1": float(x1), "count": int(count)} for x0, x1, count in zip(edges[:-1], edges[1:], counts)],
+    }
+
+
+def category_counts(codes: np.ndarray, mapping: dict) -> list:
+    """
+    Count the occurrences of each code of a dictionary-encoded categorical column.
+    :param codes: The integer codes of the column.
+    :param mapping: The code to label mapping (keys are strings, as stored in mappings.json).
+    :return: The list of codes with their label and count, sorted by decreasing count.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    counts = np.bincount(codes - codes.min()) if len(codes) else np.asarray([], dtype=np.int64)
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(-counts[present], kind='stable')]
+    offset = int(codes.min()) if len(codes) else 0
+
+    return [
+        {"code": int(i + offset), "label": mapping.get(str(i + offset), str(i + offset)), "count": int(counts[i])}
+        for i in order
+    ]
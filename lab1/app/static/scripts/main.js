@@ -36,15 +36,6 @@ async function fetchDataFromAPI(endpoint) {
 }
 
 // --- Data Fetching Functions ---
-/**
- * Fetches mapping data for a given variable.
- * @param {string} variable - The variable to fetch mapping data for.
- * @returns {Promise<object|null>} - A promise that resolves with the mapping data or null on error.
- */
-async function fetchMapping(variable) {
-  return fetchDataFromAPI(`/data/mapping/${variable}`);
-}
-
 /**
  * Fetches data for a given variable and determines the chart type to draw.
  * @param {string} variable - The variable to fetch data for.
@@ -54,19 +45,24 @@ async function fetchDataAndDrawChart(variable, isSideways = false) {
   isTwoSelected = false;
 
   try {
-    const data = await fetchDataFromAPI(`/data/${variable}`);
-    if (!data) return;
-
     const typeData = await fetchDataFromAPI(`/data/type/${variable}`);
     if (!typeData) return;
 
     switch (typeData.type) {
-      case "categorical":
-        isSideways ? drawBarchartSideways(variable, data) : drawBarchart(variable, data);
+      case "categorical": {
+        // the server returns the labeled counts, sorted by decreasing count
+        const counts = await fetchDataFromAPI(`/data/counts/${variable}`);
+        if (!counts) return;
+        isSideways ? drawBarchartSideways(variable, counts) : drawBarchart(variable, counts);
         break;
-      case "numerical":
-        isSideways ? drawHistogramSideways(variable, data) : drawHistogram(variable, data);
+      }
+      case "numerical": {
+        // the server returns the bins, with the same thresholds as d3.histogram().thresholds(x.ticks(10))
+        const histogram = await fetchDataFromAPI(`/data/histogram/${variable}?bins=10`);
+        if (!histogram) return;
+        isSideways ? drawHistogramSideways(variable, histogram) : drawHistogram(variable, histogram);
         break;
+      }
       default:
         console.error('Unknown variable type:', typeData.type);
     }
@@ -198,25 +194,15 @@ async function drawScatterplot(variableX, variableY, data) {
 /**
  * Draws a sideways barchart with the given data.
  * @param {string} variable - The variable to visualize.
- * @param {Array<any>} data - The data to use.
+ * @param {Array<object>} data - The category counts ({code, label, count}) returned by /data/counts.
  */
 async function drawBarchartSideways(variable, data) {
   const svg = d3.select('#chart');
   svg.selectAll('*').remove();
   svg.attr('width', WIDTH).attr('height', HEIGHT);
 
-  // Fetch mapping data
-  const mapping = await fetchMapping(variable);
-  if (!mapping) return;
-
-  // Group data by value and count occurrences
-  const groupedData = d3.rollup(data, v => v.length, d => d);
-  const groupedArray = Array.from(groupedData, ([key, value]) => ({ key, value }));
-
-  // Replace keys with mapped values
-  groupedArray.forEach(d => {
-    d.key = mapping[d.key] || d.key;
-  });
+  // Use the mapped labels of the category counts
+  const groupedArray = data.map(d => ({ key: d.label, value: d.count }));
 
   // Sort the array by value in descending order
   groupedArray.sort((a, b) => b.value - a.value);
@@ -305,25 +291,15 @@ async function drawBarchartSideways(variable, data) {
 /**
  * Draws a barchart with the given data.
  * @param {string} variable - The variable to visualize.
- * @param {Array<any>} data - The data to use.
+ * @param {Array<object>} data - The category counts ({code, label, count}) returned by /data/counts.
  */
 async function drawBarchart(variable, data) {
   const svg = d3.select('#chart');
   svg.selectAll('*').remove();
   svg.attr('width', WIDTH).attr('height', HEIGHT);
 
-  // Fetch mapping data
-  const mapping = await fetchMapping(variable);
-  if (!mapping) return;
-
-  // Group data by value and count occurrences
-  const groupedData = d3.rollup(data, v => v.length, d => d);
-  const groupedArray = Array.from(groupedData, ([key, value]) => ({ key, value }));
-
-  // Replace keys with mapped values
-  groupedArray.forEach(d => {
-    d.key = mapping[d.key] || d.key;
-  });
+  // Use the mapped labels of the category counts
+  const groupedArray = data.map(d => ({ key: d.label, value: d.count }));
 
   // Sort the array by value in descending order
   groupedArray.sort((a, b) => b.value - a.value);
@@ -414,7 +390,7 @@ async function drawBarchart(variable, data) {
 /**
  * Draws a sideways histogram with the given data.
  * @param {string} variable - The variable to visualize.
- * @param {Array<number>} data - The data to use.
+ * @param {object} data - The histogram ({min, max, bins}) returned by /data/histogram.
  */
 function drawHistogramSideways(variable, data) {
   const svg = d3.select('#chart');
@@ -423,16 +399,11 @@ function drawHistogramSideways(variable, data) {
 
   // Create a scale for the y-axis (originally x-axis)
   const y = d3.scaleLinear()
-    .domain([d3.min(data), d3.max(data)])
+    .domain([data.min, data.max])
     .range([HEIGHT - MARGIN.bottom, MARGIN.top]);
 
-  // Create a histogram generator
-  const histogram = d3.histogram()
-    .domain(y.domain())
-    .thresholds(y.ticks(10));
-
-  // Generate bins
-  const bins = histogram(data);
+  // Use the bins computed by the server
+  const bins = data.bins.map(d => ({ x0: d.x0, x1: d.x1, length: d.count }));
 
   // Create a scale for the x-axis (originally y-axis)
   const x = d3.scaleLinear()
@@ -506,7 +477,7 @@ function drawHistogramSideways(variable, data) {
 /**
  * Draws a histogram with the given data.
  * @param {string} variable - The variable to visualize.
- * @param {Array<number>} data - The data to use.
+ * @param {object} data - The histogram ({min, max, bins}) returned by /data/histogram.
  */
 function drawHistogram(variable, data) {
   const svg = d3.select('#chart');
@@ -515,16 +486,11 @@ function drawHistogram(variable, data) {
 
   // Create a scale for the x-axis
   const x = d3.scaleLinear()
-    .domain([d3.min(data), d3.max(data)])
+    .domain([data.min, data.max])
     .range([MARGIN.left, WIDTH - MARGIN.right]);
 
-  // Create a histogram generator
-  const histogram = d3.histogram()
-    .domain(x.domain())
-    .thresholds(x.ticks(10));
-
-  // Generate bins
-  const bins = histogram(data);
+  // Use the bins computed by the server
+  const bins = data.bins.map(d => ({ x0: d.x0, x1: d.x1, length: d.count }));
 
   // Create a scale for the y-axis
   const y = d3.scaleLinear()
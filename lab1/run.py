@@ -1,10 +1,37 @@
-from flask import Flask, render_template, jsonify
+import os
+import sys
+
+from flask import Flask, render_template, jsonify, request
+
+# the modules shared by the apps are in the common package at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import metrics, preload, wire
+from store import DatasetStore
 
 
 
 # create a Flask app
 app = Flask(__name__, static_folder='app/static', template_folder='app/templates')
 
+# keep the dataset and its sidecars resident in memory for the whole process
+store = DatasetStore('./data/500_laptop_prices.csv', './data/metadata.json', './data/mappings.json')
+
+# the bounds of the bins query parameter of the histogram route
+MAX_BINS = 1000
+
+# whether to load the dataset and encode the bulk responses while the app is created
+PRELOAD = True
+
+# whether to trace the allocations to report the memory peak of every request (slower)
+METRICS_TRACE_MEMORY = False
+# the duration in seconds from which the stacks of a request are dumped to PROFILE_DIR, None to disable it
+PROFILE_SLOW_REQUESTS = None
+PROFILE_INTERVAL = 0.005
+PROFILE_DIR = './data/profiles'
+
+# record the latency, phases and memory of every request, and profile the slow ones when enabled
+metrics.instrument(app, METRICS_TRACE_MEMORY, PROFILE_SLOW_REQUESTS, PROFILE_DIR, PROFILE_INTERVAL)
+
 
 # define a route that returns the index.html file
 @app.route('/')
@@ -15,10 +42,9 @@ def home():
 # define a route that returns the data from the csv file for a specific column
 @app.route('/data/<column_name>')
 def data_column(column_name):
-    import pandas as pd
-    df = pd.read_csv('./data/500_laptop_prices.csv')
-    if column_name in df.columns:
-        return df[column_name].to_json(orient='records')
+    payload = store.column_json(column_name)
+    if payload is not None:
+        return app.response_class(payload, mimetype='application/json')
     else:
         return jsonify({"error": "Column not found"}), 404
 
@@ -26,13 +52,9 @@ def data_column(column_name):
 # define a route that returns the type of data by reading metadata.json file and check if the column is categorical or numerical
 @app.route('/data/type/<column_name>')
 def data_column_type(column_name):
-    import json
-    with open('./data/metadata.json') as f:
-        metadata = json.load(f)
-    if column_name in metadata["categorical"]:
-        return jsonify({"type": "categorical"})
-    elif column_name in metadata["numerical"]:
-        return jsonify({"type": "numerical"})
+    column_type = store.column_type(column_name)
+    if column_type is not None:
+        return jsonify({"type": column_type})
     else:
         return jsonify({"error": "Column not found"}), 404
 
@@ -40,29 +62,67 @@ def data_column_type(column_name):
 # define a route that returns the mapping list for a specific column by reading mappings.json file
 @app.route('/data/mapping/<column_name>')
 def data_column_mapping(column_name):
-    import json
-    with open('./data/mappings.json') as f:
-        mapping = json.load(f)
-    if column_name in mapping:
-        return jsonify(mapping[column_name])
+    mapping = store.mapping(column_name)
+    if mapping is not None:
+        return jsonify(mapping)
     else:
         return jsonify({"error": "Column not found"}), 404
 
 
-# define a route that returns the data from the csv file
+# define a route that returns the pre-binned histogram of a numerical column
+@app.route('/data/histogram/<column_name>')
+def data_column_histogram(column_name):
+    try:
+        bins = int(request.args.get('bins', '10'))
+    except ValueError:
+        bins = None
+    nice = request.args.get('nice', default='true').lower() != 'false'
+    if bins is None or not 1 <= bins <= MAX_BINS:
+        return jsonify({"error": f"bins must be an integer between 1 and {MAX_BINS}"}), 400
+
+    payload = store.histogram_json(column_name, bins, nice)
+    if payload is not None:
+        return app.response_class(payload, mimetype='application/json')
+    else:
+        return jsonify({"error": "Numerical column not found"}), 404
+
+
+# define a route that returns the category counts of a categorical column, labeled with mappings.json
+@app.route('/data/counts/<column_name>')
+def data_column_counts(column_name):
+    payload = store.counts_json(column_name)
+    if payload is not None:
+        return app.response_class(payload, mimetype='application/json')
+    else:
+        return jsonify({"error": "Categorical column not found"}), 404
+
+
+# define a route that returns the data from the csv file, as JSON records or binary columns depending on the Accept header
 @app.route('/data')
 def data():
-    import pandas as pd
-    df = pd.read_csv('./data/500_laptop_prices.csv')
-    return df.to_json(orient='records')
+    mimetype = wire.negotiate()
+    if mimetype is None:
+        return wire.not_acceptable()
+    elif mimetype != wire.JSON:
+        return app.response_class(store.records_binary(mimetype), mimetype=mimetype)
+    return app.response_class(store.records_json(), mimetype='application/json')
 
 
 # define a route that returns the data headers from the csv file
 @app.route('/headers')
 def data_headers():
-    import pandas as pd
-    df = pd.read_csv('./data/500_laptop_prices.csv')
-    return jsonify(df.columns.tolist())
+    return jsonify(store.headers())
+
+
+# define a route that returns the metrics of the requests in the Prometheus text format
+@app.route('/metrics')
+def request_metrics():
+    return metrics.export()
+
+
+# load the dataset and encode the records once, so the first requests do not pay for it
+if PRELOAD:
+    preload.warm(app, ['data', 'data_headers'])
 
 
 # run the app
@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+import aggregations
+from common import metrics, wire
+
+
+
+class DatasetStore:
+    """
+    Process-wide in-memory store for the lab1 dataset and its JSON sidecars.
+
+    The CSV is parsed once into typed column arrays and the metadata/mappings
+    files are parsed once into dictionaries. Every access checks the file mtimes
+    and reloads only when one of the files has changed on disk.
+    """
+
+    def __init__(self, dataset: str, metadata: str, mappings: str):
+        """
+        :param dataset: The path of the CSV dataset.
+        :param metadata: The path of the metadata.json file.
+        :param mappings: The path of the mappings.json file.
+        """
+        self.paths = (dataset, metadata, mappings)
+        self.lock = threading.Lock()
+        self.version = None
+        self.state = None
+
+    def _mtimes(self) -> tuple:
+        """
+        Return the modification times of the dataset and its sidecars.
+        :return: A tuple of mtimes in nanoseconds.
+        """
+        return tuple(os.stat(path).st_mtime_ns for path in self.paths)
+
+    def _load(self, version: tuple):
+        """
+        Load the dataset and the sidecars into memory.
+        :param version: The mtimes of the files being loaded.
+        """
+        dataset, metadata, mappings = self.paths
+
+        # keep each column as a typed numpy array
+        df = pd.read_csv(dataset)
+        headers = df.columns.tolist()
+        columns = {col: df[col].to_numpy() for col in headers}
+
+        with open(metadata) as f:
+            metadata = json.load(f)
+        with open(mappings) as f:
+            mappings = json.load(f)
+
+        # swap the whole state at once so readers never mix two versions
+        self.state = {
+            "headers": headers,
+            "columns": columns,
+            "metadata": metadata,
+            "mappings": mappings,
+            "encoded": {},
+        }
+        self.version = version
+
+    def snapshot(self) -> dict:
+        """
+        Reload the store if any of the files changed since the last load.
+        :return: The current state of the store.
+        """
+        version = self._mtimes()
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    with metrics.phase("load"):
+                        self._load(version)
+        return self.state
+
+    @staticmethod
+    def _cached(state: dict, key) -> bool:
+        """
+        Check whether a payload is already encoded for the current version, counting the lookup.
+        :param state: The state of the store.
+        :param key: The key of the payload.
+        :return: True if the payload is cached.
+        """
+        hit = key in state["encoded"]
+        metrics.cache_event("store", hit)
+        return hit
+
+    def headers(self) -> list:
+        """
+        Return the column names of the dataset.
+        :return: The list of column names.
+        """
+        return self.snapshot()["headers"]
+
+    def column(self, name: str):
+        """
+        Return the values of a column.
+        :param name: The column name.
+        :return: The column array, or None if the column does not exist.
+        """
+        return self.snapshot()["columns"].get(name)
+
+    def column_json(self, name: str):
+        """
+        Return the JSON encoded values of a column, encoding it once per version.
+        :param name: The column name.
+        :return: The JSON string, or None if the column does not exist.
+        """
+        state = self.snapshot()
+        if name not in state["columns"]:
+            return None
+        if not self._cached(state, name):
+            with metrics.phase("serialize"):
+                state["encoded"][name] = json.dumps(state["columns"][name].tolist())
+        return state["encoded"][name]
+
+    def records_json(self) -> str:
+        """
+        Return the JSON encoded dataset as a list of records, encoding it once per version.
+        :return: The JSON string.
+        """
+        state = self.snapshot()
+        if not self._cached(state, None):
+            with metrics.phase("serialize"):
+                headers = state["headers"]
+                values = [state["columns"][col].tolist() for col in headers]
+                records = [dict(zip(headers, row)) for row in zip(*values)]
+                state["encoded"][None] = json.dumps(records)
+        return state["encoded"][None]
+
+    def records_binary(self, mimetype: str) -> bytes:
+        """
+        Return the dataset in a binary columnar format, encoding it once per version and format.
+        :param mimetype: wire.COLUMNS or wire.ARROW.
+        :return: The payload.
+        """
+        state = self.snapshot()
+        key = ("wire", mimetype)
+        if not self._cached(state, key):
+            df = pd.DataFrame({col: state["columns"][col] for col in state["headers"]}, copy=False)
+            with metrics.phase("serialize"):
+                state["encoded"][key] = wire.encode_arrow(df) if mimetype == wire.ARROW else wire.encode_columns(df)
+        return state["encoded"][key]
+
+    def histogram_json(self, name: str, bins: int = 10, nice: bool = True):
+        """
+        Return the JSON encoded histogram of a numerical column, binning it once per version and bin count.
+        :param name: The column name.
+        :param bins: The number of bins.
+        :param nice: Whether to use round thresholds, like the d3 histograms of the frontend.
+        :return: The JSON string, or None if the column is not numerical.
+        """
+        state = self.snapshot()
+        if name not in state["columns"] or self.column_type(name) != "numerical":
+            return None
+        key = ("histogram", name, bins, nice)
+        if not self._cached(state, key):
+            histogram = aggregations.histogram(state["columns"][name], bins, nice)
+            with metrics.phase("serialize"):
+                state["encoded"][key] = json.dumps(histogram)
+        return state["encoded"][key]
+
+    def counts_json(self, name: str):
+        """
+        Return the JSON encoded category counts of a categorical column, counting it once per version.
+        :param name: The column name.
+        :return: The JSON string, or None if the column is not categorical.
+        """
+        state = self.snapshot()
+        if name not in state["columns"] or self.column_type(name) != "categorical":
+            return None
+        key = ("counts", name)
+        if not self._cached(state, key):
+            counts = aggregations.category_counts(state["columns"][name], state["mappings"].get(name, {}))
+            with metrics.phase("serialize"):
+                state["encoded"][key] = json.dumps(counts)
+        return state["encoded"][key]
+
+    def column_type(self, name: str):
+        """
+        Return the type of a column based on the metadata file.
+        :param name: The column name.
+        :return: 'categorical', 'numerical' or None if the column is unknown.
+        """
+        metadata = self.snapshot()["metadata"]
+        if name in metadata.get("categorical", []):
+            return "categorical"
+        if name in metadata.get("numerical", []):
+            return "numerical"
+        return None
+
+    def mapping(self, name: str):
+        """
+        Return the code to label mapping of a categorical column.
+        :param name: The column name.
+        :return: The mapping dictionary, or None if the column has no mapping.
+        """
+        return self.snapshot()["mappings"].get(name)
@@ -812,7 +812,7 @@ async function plotClusters(k) {
     ]);
 
     const dataPoints = kmeansResults.map(d => ({
-      coordinates: JSON.parse(d.coordinates),
+      coordinates: d.coordinates,
       cluster_id: d.cluster_id
     }));
 
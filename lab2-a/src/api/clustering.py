@@ -1,146 +1,287 @@
-from src import config
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans
+from threadpoolctl import threadpool_limits
 
+from common import artifacts, cache, kmeans, lineage, metrics
+from common.api import jobs
+from src import config, knee
 
 
-def create_clusters():
+
+# the k-means artifacts, rebuilt when the sampled dataset or the loadings that pick its top attributes change
+KMEANS = lineage.Stage('kmeans', inputs=(config.SAMPLED_DATASET, config.LOADINGS),
+                       outputs=(config.KMEANS_RESULTS, config.KMEANS_CENTERS, config.KMEANS_CURVE))
+
+def _fit_kmeans(X, k: int) -> dict:
     """
-    Perform k-means clustering from k=1 to k=10 using the best two features and export the MSE score, 
-    each point's cluster ID, the center point, and the radius of each cluster into a CSV file.
-    :return: A successful response.
+    Fit k-means for a single K and derive every per-point and per-cluster statistic with batched NumPy operations.
+    :param X: The points as an (n, d) array.
+    :param k: The number of clusters.
+    :return: The labels, radii, centers, per-cluster max radius and size, MSE and SSE of the fit.
+    """
+    kmeans = KMeans(n_clusters=k)
+    labels = kmeans.fit_predict(X)
+    centers = kmeans.cluster_centers_
+
+    # distance of each point to its own center
+    residuals = X - centers[labels]
+    radii = np.sqrt(np.einsum('ij,ij->i', residuals, residuals))
+
+    # biggest radius of each cluster, clusters without points keep a radius of zero
+    max_radius = np.zeros(k)
+    np.maximum.at(max_radius, labels, radii)
+
+    squared = np.square(residuals)
+    return {
+        "labels": labels.astype(np.int32),
+        "radii": radii,
+        "centers": centers,
+        "max_radius": max_radius,
+        "size": np.bincount(labels, minlength=k),
+        "mse": float(np.mean(squared)),
+        "sse": float(np.sum(squared)),
+    }
+
+def kmeans_sweep(X, k_values, n_jobs: int = None) -> tuple:
+    """
+    Fit k-means for every K in parallel and lay the results out as columns.
+    :param X: The points as an (n, 2) array.
+    :param k_values: The K values to fit.
+    :param n_jobs: The number of parallel fits, defaults to config.KMEANS_JOBS.
+    :return: The per-point columns (x, y, label_<k>, radius_<k>), the per-cluster summary
+        columns (k, cluster_id, center_x, center_y, radius, size, mse) sorted by (k, cluster_id),
+        and the per-K columns (k, mse, sse, offset) where offset is the first summary row of each K.
     """
-    from flask import jsonify
-    import pandas as pd
-    import numpy as np
-    from sklearn.cluster import KMeans
-    from sklearn.metrics import mean_squared_error
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    k_values = list(k_values)
+    n_jobs = config.KMEANS_JOBS if n_jobs is None else n_jobs
+
+    # the fits are independent, sklearn releases the GIL so threads avoid copying X to workers,
+    # each fit keeps a single OpenMP/BLAS thread so the parallel fits do not oversubscribe the cores
+    with threadpool_limits(limits=1 if n_jobs != 1 else None):
+        fits = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(_fit_kmeans)(X, k) for k in k_values)
+
+    points = {"x": X[:, 0], "y": X[:, 1]}
+    for k, fit in zip(k_values, fits):
+        points[f"label_{k}"] = fit["labels"]
+        points[f"radius_{k}"] = fit["radii"]
+
+    clusters = {
+        "k": np.concatenate([np.full(k, k, dtype=np.int32) for k in k_values]),
+        "cluster_id": np.concatenate([np.arange(k, dtype=np.int32) for k in k_values]),
+        "center_x": np.concatenate([fit["centers"][:, 0] for fit in fits]),
+        "center_y": np.concatenate([fit["centers"][:, 1] for fit in fits]),
+        "radius": np.concatenate([fit["max_radius"] for fit in fits]),
+        "size": np.concatenate([fit["size"] for fit in fits]).astype(np.int64),
+        "mse": np.concatenate([np.full(k, fit["mse"]) for k, fit in zip(k_values, fits)]),
+    }
+
+    curve = {
+        "k": np.asarray(k_values, dtype=np.int32),
+        "mse": np.asarray([fit["mse"] for fit in fits]),
+        "sse": np.asarray([fit["sse"] for fit in fits]),
+        "offset": np.cumsum([0] + k_values[:-1]).astype(np.int64),
+    }
+
+    # score every K as the elbow of the SSE curve, so the best K is looked up for any method and sensitivity
+    for method, values in knee.scores(curve["k"], curve["sse"]).items():
+        curve[f"knee_{method}"] = values
+    return points, clusters, curve
+
+def _clusters_of(k: int):
+    """
+    Look up the summary rows of a single K using the offsets of the K-means curve.
+    :param k: The K value.
+    :return: A dictionary of summary column slices, or None if K was not fitted.
+    """
+    curve = artifacts.columns(config.KMEANS_CURVE, ['k', 'offset'])
+    index = np.flatnonzero(curve['k'] == k)
+    if len(index) == 0:
+        return None
 
-    # get the top two attributes using the pca_attributes function
-    dimensionality_index = 2
-    df_loadings = pd.read_csv(config.LOADINGS)
+    offset = int(curve['offset'][index[0]])
+    return {name: values[offset:offset + k] for name, values in artifacts.columns(config.KMEANS_CENTERS).items()}
+
+def _top_attributes(dimensionality_index: int = 2) -> list:
+    """
+    Return the attributes with the largest squared loadings on the first principal components.
+    :param dimensionality_index: The number of components, and of attributes.
+    :return: The list of attribute names.
+    """
+    df_loadings = artifacts.load(config.LOADINGS)
     selected_components = [f'PC{i+1}' for i in range(dimensionality_index)]
     df_loadings['squared_sum'] = np.square(df_loadings[selected_components]).sum(axis=1)
     df_loadings = df_loadings.sort_values(by='squared_sum', ascending=False)
-    top_attributes = df_loadings['feature'].values.tolist()[:dimensionality_index]
+    return df_loadings['feature'].values.tolist()[:dimensionality_index]
 
-    # read the sampled dataset and select the top two attributes
-    df = pd.read_csv(config.SAMPLED_DATASET)
-    df_selected = df[top_attributes]
+def compute_clusters(progress=None) -> dict:
+    """
+    Perform k-means clustering from k=1 to k=10 using the best two features and export the MSE score, 
+    each point's cluster ID, the center point, and the radius of each cluster as columnar artifacts.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message.
+    """
+    progress = progress or (lambda fraction, message=None: None)
 
-    # create an empty list to store the results
-    results = []
+    # get the top two attributes using the pca_attributes function
+    progress(0.1, "selecting the top attributes")
+    top_attributes = _top_attributes()
+
+    # read the sampled dataset and select the top two attributes
+    with metrics.phase("load"):
+        df = pd.read_csv(config.SAMPLED_DATASET)
+    df_selected = df[top_attributes].to_numpy()
 
     # perform k-means clustering from k=1 to k=10
-    for k in range(1, 11):
-        kmeans = KMeans(n_clusters=k)
-        clusters = kmeans.fit_predict(df_selected)
-        mse = mean_squared_error(df_selected, kmeans.cluster_centers_[clusters])
-        for i, cluster in enumerate(clusters):
-            center = kmeans.cluster_centers_[cluster]
-            radius = np.linalg.norm(df_selected.iloc[i] - center)
-            results.append({
-                "k": k, 
-                "coordinates": df_selected.iloc[i].tolist(), 
-                "cluster_id": cluster, 
-                "mse": mse, 
-                "center": center.tolist(), 
-                "radius": radius
-            })
-
-    # convert the results to a DataFrame and save to CSV
-    results_df = pd.DataFrame(results)
-    results_df.to_csv(config.KMEANS_RESULTS, index=False)
-
-    return jsonify({"message": "K-means clustering completed successfully"}), 200
+    progress(0.2, "fitting k-means for k=1..10")
+    points, clusters, curve = kmeans_sweep(df_selected, range(1, 11))
+
+    # save the per-point columns, the per-cluster summaries and the per-K curve as binary artifacts
+    progress(0.9, "saving the artifacts")
+    artifacts.save(config.KMEANS_RESULTS, points)
+    artifacts.save(config.KMEANS_CENTERS, clusters)
+    artifacts.save(config.KMEANS_CURVE, curve)
+
+    # record the inputs the artifacts were built from
+    return KMEANS.record({}, {"message": "K-means clustering completed successfully"})
+
+def create_clusters():
+    """
+    Perform the k-means sweep, in the background when async=true.
+    Unless force=true, the existing artifacts are kept when they were built from the
+    current sampled dataset and loadings.
+    :return: The result message, or the id of the background job.
+    """
+    # the artifacts are already built from the current sampled dataset and loadings
+    result = None if request.args.get('force', 'false').lower() == 'true' else KMEANS.lookup({})
+    if result is not None:
+        return jsonify(result), 200
+
+    outputs = (config.KMEANS_RESULTS, config.KMEANS_CENTERS, config.KMEANS_CURVE)
+    if request.args.get('async', 'false').lower() == 'true':
+        return jobs.submit('create_clusters', compute_clusters, artifacts=outputs)
+
+    result = compute_clusters()
+
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(*outputs)
+
+    return jsonify(result), 200
 
+@cache.cached(config.KMEANS_CURVE)
 def get_clusters_mse():
     """
     Return the MSE of each K from the K-means results.
     :return: A list of pairs <k-MSE> from the K-means results.
     """
-    from flask import jsonify
-    import pandas as pd
-
-    # read the K-means results from the CSV file
-    df = pd.read_csv(config.KMEANS_RESULTS)
-
-    # group by 'k' and calculate the mean MSE for each K
-    mse_per_k = df.groupby('k')['mse'].mean().reset_index()
+    # read the per-K curve from the artifact
+    curve = artifacts.columns(config.KMEANS_CURVE, ['k', 'mse'])
 
     # convert the results to a list of pairs <k-MSE>
-    mse_list = mse_per_k.values.tolist()
+    mse_list = [[float(k), mse] for k, mse in zip(curve['k'].tolist(), curve['mse'].tolist())]
 
     return jsonify({"mse": mse_list})
 
+@cache.cached(config.KMEANS_CURVE)
 def get_clusters_bestk():
     """
-    Return the best K value from the K-means results using the kneedle algorithm.
-    :return: The best K value.
+    Return the best K value from the K-means results, looked up in the knee scores saved with the per-K curve.
+    :param method: kneedle (the default), curvature or lmethod.
+    :param sensitivity: The sensitivity of the kneedle method, 1 by default.
+    :return: The best K value, null if the SSE curve has no elbow.
     """
-    from flask import jsonify
-    import pandas as pd
-    from kneed import KneeLocator
-
-    # read the K-means results from the CSV file
-    df = pd.read_csv(config.KMEANS_RESULTS)
-
-    # calculate the sum of squared errors for each K
-    sse = df.groupby('k')['mse'].sum()
-
-    # use the kneedle algorithm to find the elbow point
-    kneedle = KneeLocator(sse.index, sse.values, curve='convex', direction='decreasing')
-    best_k = int(kneedle.elbow)
-
-    return jsonify({"best_k": best_k})
-
+    # get the knee detection method from the request query parameters
+    try:
+        method, sensitivity = knee.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # read the knee scores of each K from the artifact, computed here for a curve saved without them
+    if f"knee_{method}" in artifacts.names(config.KMEANS_CURVE):
+        curve = artifacts.columns(config.KMEANS_CURVE, ['k', f"knee_{method}"])
+        scores = {method: curve[f"knee_{method}"]}
+    else:
+        curve = artifacts.columns(config.KMEANS_CURVE, ['k', 'sse'])
+        scores = knee.scores(curve['k'], curve['sse'])
+
+    index = knee.locate(scores, method, sensitivity)
+    return jsonify({"best_k": None if index is None else int(curve['k'][index])})
+
+@cache.cached(config.KMEANS_RESULTS, config.KMEANS_CENTERS, config.KMEANS_CURVE)
 def get_kmeans_results():
     """
     Return the data of the K-means results for the selected K.
     :param k: The K value to return the data for.
     :return: The data of the K-means results for the selected K.
     """
-    from flask import jsonify, request
-    import pandas as pd
-
     # get the K value from the request query parameters
     k = int(request.args.get('k', 1))
 
-    # read the K-means results from the CSV file
-    df = pd.read_csv(config.KMEANS_RESULTS)
+    # unknown K values have no results
+    clusters = _clusters_of(k)
+    if clusters is None:
+        return jsonify([])
+
+    # read only the columns of the selected K from the artifact
+    points = artifacts.columns(config.KMEANS_RESULTS, ['x', 'y', f'label_{k}', f'radius_{k}'])
 
-    # filter the results by the selected K
-    results = df[df['k'] == k].to_dict(orient='records')
+    # rebuild the coordinate pairs and look up the center of each point
+    centers = [[x, y] for x, y in zip(clusters['center_x'].tolist(), clusters['center_y'].tolist())]
+    mse = float(clusters['mse'][0])
+    results = [
+        {"k": k, "coordinates": [x, y], "cluster_id": label, "mse": mse, "center": centers[label], "radius": radius}
+        for x, y, label, radius in zip(points['x'].tolist(), points['y'].tolist(), points[f'label_{k}'].tolist(), points[f'radius_{k}'].tolist())
+    ]
 
     return jsonify(results)
 
+@cache.cached(config.KMEANS_CENTERS, config.KMEANS_CURVE)
 def get_clusters_centers():
     """
     Return the cluster centers from the K-means results for a specific K.
     :return: The cluster centers from the K-means results.
     """
-    from flask import jsonify, request
-    import pandas as pd
-    import numpy as np
-    import ast
-
     # get the K value from the request query parameters
     k = int(request.args.get('k', 1))
 
-    # read the K-means results from the CSV file
-    df = pd.read_csv(config.KMEANS_RESULTS)
-
-    # filter the results by the selected K
-    df_k = df[df['k'] == k]
-
-    # convert the 'coordinates' column from string to list
-    df_k.loc[:, 'coordinates'] = df_k['coordinates'].apply(ast.literal_eval)
-
-    # group by 'cluster_id' and calculate the mean coordinates for each cluster
-    centers = df_k.groupby('cluster_id')['coordinates'].apply(lambda x: np.mean(x.tolist(), axis=0).tolist()).reset_index()
-
-    # calculate the biggest radius for each cluster
-    centers['radius'] = centers['cluster_id'].apply(lambda cluster_id: df_k[df_k['cluster_id'] == cluster_id]['radius'].max())
+    # look up the precomputed summaries of the selected K
+    clusters = _clusters_of(k)
+    if clusters is None:
+        return jsonify({"centers": []})
 
     # convert the results to a list of cluster centers
-    centers_list = centers.to_dict(orient='records')
+    centers_list = [
+        {"cluster_id": cluster_id, "coordinates": [x, y], "radius": radius, "size": size}
+        for cluster_id, x, y, radius, size in zip(
+            clusters['cluster_id'].tolist(), clusters['center_x'].tolist(), clusters['center_y'].tolist(),
+            clusters['radius'].tolist(), clusters['size'].tolist()
+        )
+    ]
 
     return jsonify({"centers": centers_list})
+
+@cache.cached(config.SAMPLED_DATASET, config.LOADINGS)
+def get_clusters_fit():
+    """
+    Cluster the sampled dataset on any features for one or more K, without saving the K-means
+    artifacts, so the page can re-cluster interactively. The fits are cached per version of the dataset.
+    :param features: The comma-separated features, defaults to the top two attributes of the PCA.
+    :param k: A K value, a range like 2-10 or a comma-separated list, 1-10 by default.
+    :param algorithm: auto (the default), lloyd, elkan or minibatch.
+    :param seed: The seed of the k-means initialization, 0 by default.
+    :param labels: Whether to return the cluster of every point for a single K, true by default.
+    :return: The features, the algorithm and the fits, plus the labels.
+    """
+    # get the clustering parameters from the request query parameters
+    try:
+        default = [] if 'features' in request.args else _top_attributes()
+        features, k_values, algorithm, seed = kmeans.parse_args(request.args, default, '1-10')
+        models = kmeans.sweep(config.SAMPLED_DATASET, features, k_values, algorithm, seed)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    labels = request.args.get('labels', 'true').lower() == 'true'
+    return jsonify(dict(kmeans.summary(models, labels), features=features)), 200
@@ -1,39 +1,147 @@
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+
+from common import cache, lineage, metrics, prep, streaming, wire
+from common.api import jobs
 from src import config
 
 
 
+# the sampled dataset, rebuilt when the original dataset or the sampling parameters change
+DATASET = lineage.Stage('dataset', inputs=(config.ORIGINAL_DATASET,), outputs=(config.SAMPLED_DATASET,))
+
+def _count_rows(path: str) -> int:
+    """
+    Count the rows of a CSV file without parsing it.
+    :param path: The path of the CSV file.
+    :return: The number of rows, without the header.
+    """
+    lines, last = 0, b"\n"
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (last != b"\n") - 1
+
+def _stream_dataset(mimetype: str):
+    """
+    Stream a page of data/dataset.csv, reading and encoding it config.STREAM_CHUNK_SIZE rows at a time.
+    :param mimetype: wire.JSON for a JSON array, or wire.NDJSON.
+    :return: The streamed response.
+    """
+    # read the page from the request query parameters
+    token = streaming.version(config.SAMPLED_DATASET)
+    try:
+        offset, limit = streaming.page(token, mimetype)
+    except streaming.StaleCursorError as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # skip the rows before the page without parsing them, then parse the page chunk by chunk,
+    # the skipped rows are tested one at a time rather than gathered, so deep pages stay flat in memory
+    frames = pd.read_csv(config.SAMPLED_DATASET, skiprows=lambda row: 0 < row <= offset, nrows=limit,
+                         chunksize=config.STREAM_CHUNK_SIZE)
+    return streaming.response(frames, mimetype, offset, limit, _count_rows(config.SAMPLED_DATASET), token)
+
+@cache.cached(config.SAMPLED_DATASET)
 def get_dataset():
     """
-    Get data from data/dataset.csv into a JSON format.
-    :return: The data in JSON format.
+    Get data from data/dataset.csv into a JSON format, or a binary columnar format
+    (see common/wire.py) when the Accept header asks for one. NDJSON, stream=true and
+    the offset, limit and cursor parameters stream the data instead (see common/streaming.py).
+    :return: The data in the negotiated format.
     """
-    from flask import jsonify
-    import pandas as pd
-    data = pd.read_csv('data/dataset.csv').to_dict(orient='records')
+    mimetype = wire.negotiate(streaming=True)
+    if mimetype is None:
+        return wire.not_acceptable(streaming=True)
+
+    if streaming.requested(mimetype):
+        return _stream_dataset(mimetype)
+
+    with metrics.phase("load"):
+        df = pd.read_csv(config.SAMPLED_DATASET)
+    if mimetype != wire.JSON:
+        return wire.response(df, mimetype)
+
+    data = df.to_dict(orient='records')
     return jsonify(data)
 
+def _fresh_seed() -> int:
+    """
+    Draw the seed of a sample the client did not seed, returned with the sample so it can be reproduced.
+    :return: A random 32-bit seed.
+    """
+    return int(np.random.default_rng().integers(2 ** 32))
+
+def compute_dataset(number_of_samples: int, drop_none: bool, drop_categorical: bool, seed: int = None,
+                    stratify: str = None, progress=None) -> dict:
+    """
+    Sample exactly N valid rows of the original dataset in a single streaming pass and save them as the sampled dataset.
+    :param number_of_samples: The number of samples.
+    :param drop_none: Whether rows with missing values are left out of the sample.
+    :param drop_categorical: Whether to keep only the int and float columns.
+    :param seed: The seed of the sample, None for a fresh one.
+    :param stratify: The column whose values the sample is stratified by, None for a uniform sample.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message, the number of rows and the seed of the sample.
+    :raises ValueError: If the stratify column does not exist or there are not enough valid rows.
+    """
+    progress = progress or (lambda fraction, message=None: None)
+    seed = _fresh_seed() if seed is None else seed
+
+    progress(0.1, "sampling the original dataset")
+    sample_df = prep.sample_csv(config.ORIGINAL_DATASET, number_of_samples, seed, stratify, drop_none, drop_categorical,
+                                 config.STREAM_CHUNK_SIZE)
+
+    progress(0.9, "saving the sampled dataset")
+    sample_df.to_csv(config.SAMPLED_DATASET, index=False)
+
+    # record the inputs and parameters the sampled dataset was built from
+    params = {"number_of_samples": number_of_samples, "drop_none": drop_none, "drop_categorical": drop_categorical,
+              "seed": seed, "stratify": stratify}
+    return DATASET.record(params, {"message": f"Sampled {number_of_samples} rows from the original dataset",
+                                   "rows": len(sample_df), "seed": seed})
+
 def create_dataset(number_of_samples: int):
     """
-    Reads the original dataset and create a new dataset with N number of samples.
+    Reads the original dataset and create a new dataset with N number of samples, in the background when async=true.
+    Every call draws a fresh sample, whose seed is returned, unless the seed query parameter asks to
+    reproduce one. stratify names a column to stratify the sample by. Unless force=true, a seeded
+    sample is kept when it was drawn from the current original dataset with the same parameters.
     :param number_of_samples: The number of samples to return.
     """
-    from flask import jsonify, request
-    import pandas as pd
-
     # read two boolean values from request query parameters (drop_none and drop_categorical)
     drop_none = request.args.get('drop_none', 'true').lower() == 'true'
     drop_categorical = request.args.get('drop_categorical', 'true').lower() == 'true'
+    force = request.args.get('force', 'false').lower() == 'true'
+
+    # read the seed and the stratify column of the sample, without a seed the sample is drawn afresh
+    seeded = 'seed' in request.args
+    try:
+        seed = int(request.args['seed']) if seeded else _fresh_seed()
+    except ValueError:
+        return jsonify({"error": "seed must be an integer"}), 400
+    stratify = request.args.get('stratify')
+
+    # the sampled dataset is already built from the current inputs with these parameters
+    params = {"number_of_samples": number_of_samples, "drop_none": drop_none, "drop_categorical": drop_categorical,
+              "seed": seed, "stratify": stratify}
+    result = DATASET.lookup(params) if seeded and not force else None
+    if result is not None:
+        return jsonify(result), 200
+
+    if request.args.get('async', 'false').lower() == 'true':
+        return jobs.submit('create_dataset', compute_dataset, number_of_samples, drop_none, drop_categorical, seed, stratify,
+                           artifacts=(config.SAMPLED_DATASET,))
+
+    try:
+        result = compute_dataset(number_of_samples, drop_none, drop_categorical, seed, stratify)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(config.SAMPLED_DATASET)
 
-    df = pd.read_csv(config.ORIGINAL_DATASET)
-    if number_of_samples > config.DATASET_SIZE:
-        return jsonify({"error": "Number of samples exceeds the size of the dataset"}), 400
-    else:
-        sample_df = df.sample(n=number_of_samples)
-        if drop_none:
-            sample_df = sample_df.dropna()
-        if drop_categorical:
-            # only select int, and float columns
-            sample_df = sample_df.select_dtypes(include=['int', 'float'])
-
-        sample_df.to_csv(config.SAMPLED_DATASET, index=False)
-    return jsonify({"message": f"Sampled {number_of_samples} rows from the original dataset"}), 200
+    return jsonify(result), 200
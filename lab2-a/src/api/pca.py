@@ -1,24 +1,84 @@
-from src import config
+import os
 
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
 
+from common import artifacts, cache, lineage, lod, metrics, query
+from common.api import jobs
+from src import config, incremental_pca, knee
 
-def create_eigenvalues_and_eigenvectors():
+
+
+# the eigendecomposition artifacts, rebuilt when the sampled dataset or the PCA parameters change
+EIGENDECOMPOSITION = lineage.Stage('pca', inputs=(config.SAMPLED_DATASET,),
+                                   outputs=(config.EIGENDECOMPOSITION, config.PRINCIPAL_COMPONENTS, config.LOADINGS, config.PCA_STATE))
+
+def _save_eigendecomposition(eigenvalues, eigenvectors):
     """
-    Perform eigendecomposition on the sampled dataset.
-    :return: The eigenvalues and eigenvectors of the sampled dataset.
+    Save the eigenvalues and eigenvectors to a npz file, with the knee scores of the eigenvalues
+    so that the elbow endpoint only looks them up.
+    :param eigenvalues: The eigenvalues, in decreasing order.
+    :param eigenvectors: The eigenvectors, one per row.
+    """
+    scores = knee.scores(np.arange(len(eigenvalues)), eigenvalues)
+    np.savez(config.EIGENDECOMPOSITION, eigenvalues=eigenvalues, eigenvectors=eigenvectors,
+             **{f"knee_{method}": values for method, values in scores.items()})
+
+def _save_streaming_decomposition(accumulator, standardize: bool, chunk_size: int, progress):
+    """
+    Save the eigendecomposition of an accumulator with the same artifacts as the full PCA,
+    projecting the sampled dataset chunk by chunk.
+    :param accumulator: The covariance accumulator of the sampled dataset.
+    :param standardize: Whether the data is standardized.
+    :param chunk_size: The number of rows per chunk.
+    :param progress: A callable receiving the completed fraction and a message.
+    """
+    eigenvalues, eigenvectors = accumulator.decomposition(standardize)
+    columns = [f'PC{i+1}' for i in range(len(eigenvalues))]
+
+    # save the eigenvalues, eigenvectors, loadings and the accumulator used to update them later
+    progress(0.6, "saving the decomposition")
+    _save_eigendecomposition(eigenvalues, eigenvectors)
+    loadings = pd.DataFrame(eigenvectors.T, columns=columns)
+    loadings["feature"] = accumulator.columns
+    artifacts.save(config.LOADINGS, loadings)
+    accumulator.save(config.PCA_STATE, standardize)
+
+    # project the sampled dataset on the components
+    progress(0.7, "projecting the sampled dataset")
+    incremental_pca.project_csv(config.SAMPLED_DATASET, accumulator, standardize, eigenvectors, config.PRINCIPAL_COMPONENTS, chunk_size)
+
+    # index every component for the brushing queries of the views
+    query.index(config.PRINCIPAL_COMPONENTS).prepare()
+
+def compute_eigendecomposition(standardize: bool, mode: str = 'full', chunk_size: int = None, progress=None) -> dict:
+    """
+    Perform eigendecomposition on the sampled dataset and save the eigenvalues, principal components and loadings.
+    :param standardize: Whether to standardize the data before the decomposition.
+    :param mode: 'full' to fit sklearn's PCA in memory, 'streaming' to accumulate the covariance chunk by chunk.
+    :param chunk_size: The number of rows per chunk in streaming mode, defaults to config.PCA_CHUNK_SIZE.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message.
     """
-    from flask import jsonify, request
-    import pandas as pd
-    import numpy as np
-    from sklearn.decomposition import PCA
-    from sklearn.preprocessing import StandardScaler
+    progress = progress or (lambda fraction, message=None: None)
+    chunk_size = chunk_size or config.PCA_CHUNK_SIZE
+
+    # in streaming mode memory stays O(d^2 + chunk) regardless of the number of rows
+    if mode == 'streaming':
+        progress(0.1, "accumulating the covariance")
+        accumulator = incremental_pca.accumulate_csv(config.SAMPLED_DATASET, chunk_size)
+        _save_streaming_decomposition(accumulator, standardize, chunk_size, progress)
+        return EIGENDECOMPOSITION.record({"standardize": standardize, "mode": mode},
+                                         {"message": "Eigendecomposition completed", "mode": mode, "rows": accumulator.n})
 
     # read the sampled dataset
-    df = pd.read_csv(config.SAMPLED_DATASET)
+    progress(0.1, "reading the sampled dataset")
+    with metrics.phase("load"):
+        df = pd.read_csv(config.SAMPLED_DATASET)
 
-    # read two boolean values from request query parameters (dstandardize)
-    standardize = request.args.get('standardize', 'true').lower() == 'true'
-    
     # create Standardize
     scaler = StandardScaler()
     pca = PCA()
@@ -30,6 +90,7 @@ def create_eigenvalues_and_eigenvectors():
         scaled_data = df
 
     # fit the PCA model to the data
+    progress(0.3, "fitting the PCA model")
     principal_components = pca.fit_transform(scaled_data)
     columns=[f'PC{i+1}' for i in range(principal_components.shape[1])]
     principal_components = pd.DataFrame(principal_components, columns=columns)
@@ -44,101 +105,242 @@ def create_eigenvalues_and_eigenvectors():
     eigenvectors = pca.components_
 
     # save the eigenvalues and eigenvectors to a npz file
-    np.savez(config.EIGENDECOMPOSITION, eigenvalues=eigenvalues, eigenvectors=eigenvectors)
+    progress(0.8, "saving the artifacts")
+    _save_eigendecomposition(eigenvalues, eigenvectors)
 
-    # save the principal components and loadings to a csv file
-    pd.DataFrame(principal_components).to_csv(config.PRINCIPAL_COMPONENTS, index=False)
-    pd.DataFrame(loadings).to_csv(config.LOADINGS, index=False)
+    # save the principal components and loadings as binary artifacts
+    artifacts.save(config.PRINCIPAL_COMPONENTS, principal_components)
+    artifacts.save(config.LOADINGS, loadings)
+    query.index(config.PRINCIPAL_COMPONENTS).prepare()
 
-    return jsonify({"message": "Eigendecomposition completed"}), 200
+    # save the covariance accumulator so new rows can be appended without refitting
+    accumulator = incremental_pca.CovarianceAccumulator(df.columns)
+    accumulator.update(df.to_numpy())
+    accumulator.save(config.PCA_STATE, standardize)
 
-def get_elbow_index():
+    # record the inputs and parameters the artifacts were built from
+    return EIGENDECOMPOSITION.record({"standardize": standardize, "mode": mode},
+                                     {"message": "Eigendecomposition completed", "mode": mode, "rows": len(df)})
+
+def create_eigenvalues_and_eigenvectors():
     """
-    Return the elbow index of the sampled dataset.
-    :return: The elbow index of the sampled dataset.
+    Perform eigendecomposition on the sampled dataset, in the background when async=true.
+    Unless force=true, the existing artifacts are kept when they were built from the
+    current sampled dataset with the same parameters.
+    :return: The result message, or the id of the background job.
     """
-    from flask import jsonify
-    import numpy as np
-    from kneed import KneeLocator
+    # read three boolean values from request query parameters (standardize, async, force)
+    standardize = request.args.get('standardize', 'true').lower() == 'true'
+    run_async = request.args.get('async', 'false').lower() == 'true'
+    force = request.args.get('force', 'false').lower() == 'true'
+
+    # read the fitting mode (full or streaming) and the chunk size of the streaming mode
+    mode = request.args.get('mode', 'full')
+    try:
+        chunk_size = int(request.args.get('chunk_size', config.PCA_CHUNK_SIZE))
+    except ValueError:
+        return jsonify({"error": "chunk_size must be an integer"}), 400
+    if chunk_size <= 0:
+        return jsonify({"error": "chunk_size must be positive"}), 400
+    if mode not in ('full', 'streaming'):
+        return jsonify({"error": "Unknown mode, expected full or streaming"}), 400
+
+    # the artifacts are already built from the current sampled dataset with these parameters
+    result = None if force else EIGENDECOMPOSITION.lookup({"standardize": standardize, "mode": mode})
+    if result is not None:
+        return jsonify(result), 200
 
-    # load the eigenvalues from the npz file
-    data = np.load(config.EIGENDECOMPOSITION)
-    eigenvalues = data['eigenvalues']
+    outputs = (config.EIGENDECOMPOSITION, config.PRINCIPAL_COMPONENTS, config.LOADINGS)
+    if run_async:
+        return jobs.submit('create_eigenvalues_and_eigenvectors', compute_eigendecomposition, standardize, mode, chunk_size, artifacts=outputs)
 
-    # use the kneedle algorithm to find the elbow point
-    kneedle = KneeLocator(range(len(eigenvalues)), eigenvalues, curve='convex', direction='decreasing')
-    elbow_index = int(kneedle.elbow)
+    result = compute_eigendecomposition(standardize, mode, chunk_size)
 
-    return jsonify({"elbow_index": elbow_index})
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(*outputs)
 
+    return jsonify(result), 200
+
+def append_rows():
+    """
+    Append new rows to the sampled dataset and update the decomposition from the saved
+    covariance accumulator, without refitting the existing rows.
+    The request body is a JSON list of records with the columns of the sampled dataset.
+    :return: The number of rows of the updated decomposition.
+    """
+    if not os.path.exists(config.PCA_STATE):
+        return jsonify({"error": "Run /api/pca/create before appending rows"}), 409
+
+    accumulator, standardize = incremental_pca.CovarianceAccumulator.load(config.PCA_STATE)
+
+    # read the new rows from the request body, with exactly the columns of the sampled dataset
+    records = request.get_json(silent=True)
+    if not isinstance(records, list) or not records or not all(isinstance(record, dict) for record in records):
+        return jsonify({"error": f"Expected a list of records with the columns {accumulator.columns}"}), 400
+    rows = pd.DataFrame(records)
+    if set(rows.columns) != set(accumulator.columns):
+        return jsonify({"error": f"Expected the columns {accumulator.columns}, got {list(rows.columns)}"}), 400
+
+    # coerce the values to float in the column order of the sampled dataset, a missing
+    # or non-numeric value would corrupt the accumulator and the appended dataset
+    try:
+        rows = rows[accumulator.columns].astype(np.float64)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Every value must be a number"}), 400
+    if not np.isfinite(rows.to_numpy()).all():
+        return jsonify({"error": "Every value must be a finite number"}), 400
+
+    # append the rows to the dataset and merge them into the accumulator
+    rows.to_csv(config.SAMPLED_DATASET, mode='a', header=False, index=False)
+    accumulator.update(rows.to_numpy())
+    _save_streaming_decomposition(accumulator, standardize, config.PCA_CHUNK_SIZE, lambda fraction, message=None: None)
+
+    # the artifacts now match the updated dataset, as if the streaming decomposition ran on it
+    EIGENDECOMPOSITION.record({"standardize": standardize, "mode": "streaming"},
+                              {"message": "Eigendecomposition completed", "mode": "streaming", "rows": accumulator.n})
+
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(config.SAMPLED_DATASET, config.EIGENDECOMPOSITION, config.PRINCIPAL_COMPONENTS, config.LOADINGS)
+
+    return jsonify({"message": f"Appended {len(rows)} rows", "rows": accumulator.n}), 200
+
+@cache.cached(config.EIGENDECOMPOSITION)
+def get_elbow_index():
+    """
+    Return the elbow index of the sampled dataset, looked up in the knee scores saved with the eigenvalues.
+    :param method: kneedle (the default), curvature or lmethod.
+    :param sensitivity: The sensitivity of the kneedle method, 1 by default.
+    :return: The elbow index of the sampled dataset, null if the eigenvalues have no elbow.
+    """
+    # get the knee detection method from the request query parameters
+    try:
+        method, sensitivity = knee.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # load the knee scores from the npz file, computed here for a decomposition saved without them
+    with metrics.phase("load"):
+        data = np.load(config.EIGENDECOMPOSITION)
+        if f"knee_{method}" in data.files:
+            scores = {method: data[f"knee_{method}"]}
+        else:
+            scores = knee.scores(np.arange(len(data['eigenvalues'])), data['eigenvalues'])
+
+    return jsonify({"elbow_index": knee.locate(scores, method, sensitivity)})
+
+def query_pca():
+    """
+    Return the points of the principal components that match every predicate, so the scatterplot
+    and the biplot can be brushed on the server. The predicates are answered from the sorted indexes
+    of common/query.py, e.g. range=PC1:-1:1&range=PC2:0:.
+    :param range: component:low:high, the points within [low, high] on a component, may be repeated.
+    :param in: column:value,value, the points with one of the values, may be repeated.
+    :param ids: Whether to return the ids of the matching points, true by default.
+    :param aggregate: The comma-separated columns to summarize over the matching points.
+    :return: The number of matching points, plus their ids and the aggregates.
+    """
+    # get the predicates from the request query parameters
+    try:
+        predicates, ids, aggregate = query.parse_args(request.args)
+        result = query.run(config.PRINCIPAL_COMPONENTS, predicates, ids, aggregate)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(result), 200
+
+@cache.cached(config.EIGENDECOMPOSITION)
 def get_eigenvalues_and_eigenvectors():
     """
     Return the eigenvalues and eigenvectors of the sampled dataset.
     :return: The eigenvalues and eigenvectors of the sampled dataset.
     """
-    from flask import jsonify
-    import numpy as np
-
     # load the eigenvalues and eigenvectors from the npz file
-    data = np.load(config.EIGENDECOMPOSITION)
-    eigenvalues = data['eigenvalues'].tolist()
-    eigenvectors = data['eigenvectors'].tolist()
+    with metrics.phase("load"):
+        data = np.load(config.EIGENDECOMPOSITION)
+        eigenvalues, eigenvectors = data['eigenvalues'], data['eigenvectors']
 
-    return jsonify({"eigenvalues": eigenvalues, "eigenvectors": eigenvectors})
+    return jsonify({"eigenvalues": eigenvalues.tolist(), "eigenvectors": eigenvectors.tolist()})
 
+@cache.cached(config.PRINCIPAL_COMPONENTS)
 def get_pca():
     """
     Return the principal components of the sampled dataset.
+    With max_points, a density-preserving downsample of the points (in the plane of the
+    first two components, restricted to the optional viewport) is returned instead.
     :return: The principal components of the sampled dataset.
     """
-    from flask import jsonify, request
-    import pandas as pd
-
-    # get PCA selected components from the request query parameters
+    # get PCA selected components and the level of detail from the request query parameters
     components = request.args.get('components', 'PC1,PC2').split(',')
+    try:
+        max_points, viewport, grid_size = lod.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # add id to the beginning of the list
     components.insert(0, 'id')
 
-    # read the principal components from the csv file and return them tolist
-    df = pd.read_csv(config.PRINCIPAL_COMPONENTS)
-    principal_components = df[components].values.tolist()
-    return jsonify({"principal_components": principal_components})
+    # read the principal components from the artifact and return them tolist
+    df = artifacts.load(config.PRINCIPAL_COMPONENTS, components)
+    if max_points is None and viewport is None:
+        return jsonify({"principal_components": df.values.tolist()})
+
+    # keep the points of the viewport, then downsample them on the plane of the first two components
+    x, y = df[components[1]].to_numpy(), df[components[min(2, len(components) - 1)]].to_numpy()
+    selected = lod.in_viewport(x, y, viewport)
+    if max_points is not None:
+        selected = selected[lod.downsample(x[selected], y[selected], max_points, grid_size=grid_size)]
 
+    principal_components = df.iloc[selected].values.tolist()
+    return jsonify({"principal_components": principal_components, "total": len(df)})
+
+@cache.cached(config.PRINCIPAL_COMPONENTS)
+def get_pca_density():
+    """
+    Return the point counts of a grid over the plane of two principal components,
+    the companion of a downsampled /api/pca response.
+    :return: The extent, the grid size and the counts of the grid.
+    """
+    # get PCA selected components and the grid from the request query parameters
+    components = request.args.get('components', 'PC1,PC2').split(',')[:2]
+    try:
+        _, viewport, grid_size = lod.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # read the two principal components from the artifact and count them per cell
+    df = artifacts.load(config.PRINCIPAL_COMPONENTS, components)
+    x, y = df[components[0]].to_numpy(), df[components[-1]].to_numpy()
+    return jsonify(lod.density_grid(x, y, grid_size, viewport))
+
+@cache.cached(config.LOADINGS)
 def get_loadings():
     """
     Return the loadings of the sampled dataset.
     :return: The loadings of the sampled dataset.
     """
-    from flask import jsonify, request
-    import pandas as pd
-
     # get PCA selected components from the request query parameters
     components = request.args.get('components', 'PC1,PC2').split(',')
 
     # add feature to the beginning of the list
     components.insert(0, 'feature')
 
-    # read the loadings from the csv file and return them tolist
-    df = pd.read_csv(config.LOADINGS)
-    loadings = df[components].values.tolist()
+    # read the loadings from the artifact and return them tolist
+    df = artifacts.load(config.LOADINGS, components)
+    loadings = df.values.tolist()
     return jsonify({"loadings": loadings})
 
+@cache.cached(config.LOADINGS)
 def get_pca_attributes():
     """
     Return the 4 attributes with the highest squared sum of PCA loadings.
     :return: The 4 attributes with the highest squared sum of PCA loadings.
     """
-    from flask import jsonify, request
-    import pandas as pd
-    import numpy as np
-
     # get the dimensionality index from the request query parameters
     dimensionality_index = int(request.args.get('dimensionality_index', 4))
     dimensionality_index = min(dimensionality_index, 4)
 
-    # read the loadings from the csv file
-    df = pd.read_csv(config.LOADINGS)
+    # read the loadings from the artifact
+    df = artifacts.load(config.LOADINGS)
 
     # calculate the squared sum of PCA loadings
     df['squared_sum'] = np.square(df.drop('feature', axis=1)).sum(axis=1)
@@ -150,21 +352,23 @@ def get_pca_attributes():
     attributes = df[['feature', 'squared_sum']].values.tolist()[:dimensionality_index]
     return jsonify({"attributes": attributes})
 
+@cache.cached(config.LOADINGS, config.SAMPLED_DATASET)
 def get_pca_attributes_data():
     """
     Return the data of the top attributes based on the selected dimensionality index.
+    With max_points, a density-preserving downsample of the rows is returned instead.
     :return: The data of the top attributes based on the selected dimensionality index.
     """
-    from flask import jsonify, request
-    import pandas as pd
-    import numpy as np
-
     # get the dimensionality index from the request query parameters
     dimensionality_index = int(request.args.get('dimensionality_index', 4))
     dimensionality_index = min(dimensionality_index, 4)
+    try:
+        max_points, _, grid_size = lod.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # read the loadings from the csv file
-    df_loadings = pd.read_csv(config.LOADINGS)
+    # read the loadings from the artifact
+    df_loadings = artifacts.load(config.LOADINGS)
 
     # calculate the squared sum of PCA loadings for the selected number of components
     selected_components = [f'PC{i+1}' for i in range(dimensionality_index)]
@@ -177,8 +381,15 @@ def get_pca_attributes_data():
     top_attributes = df_loadings['feature'].values.tolist()[:dimensionality_index]
 
     # read the sampled dataset
-    df_sampled = pd.read_csv(config.SAMPLED_DATASET)
+    with metrics.phase("load"):
+        df_sampled = pd.read_csv(config.SAMPLED_DATASET)
+    df_sampled = df_sampled[top_attributes]
+
+    # downsample the rows on the plane of the two top attributes, the rows are shared by every panel
+    if max_points is not None:
+        x, y = df_sampled.iloc[:, 0].to_numpy(), df_sampled.iloc[:, min(1, dimensionality_index - 1)].to_numpy()
+        df_sampled = df_sampled.iloc[lod.downsample(x, y, max_points, grid_size=grid_size)]
 
     # return the data of the top attributes
-    data = df_sampled[top_attributes].values.tolist()
+    data = df_sampled.values.tolist()
     return jsonify({"data": data})
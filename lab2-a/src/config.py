@@ -1,7 +1,22 @@
 ORIGINAL_DATASET="./data/laptop_prices.csv"
 SAMPLED_DATASET="./data/dataset.csv"
 EIGENDECOMPOSITION="./data/eigendecomposition.npz"
-PRINCIPAL_COMPONENTS="./data/eigenvalues_and_eigenvectors.csv"
-LOADINGS="./data/loadings.csv"
-KMEANS_RESULTS="./data/kmeans_results.csv"
-DATASET_SIZE=1275
+PRINCIPAL_COMPONENTS="./data/eigenvalues_and_eigenvectors"
+LOADINGS="./data/loadings"
+PCA_STATE="./data/pca_state.npz"
+KMEANS_RESULTS="./data/kmeans_results"
+KMEANS_CENTERS="./data/kmeans_centers"
+KMEANS_CURVE="./data/kmeans_curve"
+KMEANS_JOBS=-1
+PCA_CHUNK_SIZE=100000
+EXPORT_CSV=False
+JOB_WORKERS=2
+JOB_QUEUE_SIZE=16
+JOB_HISTORY=100
+STREAM_CHUNK_SIZE=10000
+LINEAGE="./data/lineage"
+METRICS_TRACE_MEMORY=False
+PROFILE_SLOW_REQUESTS=None
+PROFILE_INTERVAL=0.005
+PROFILE_DIR="./data/profiles"
+PRELOAD=True
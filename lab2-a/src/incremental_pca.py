@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from common import artifacts, moments
+
+
+
+class CovarianceAccumulator(moments.MomentAccumulator):
+    """
+    Streaming estimate of the covariance of a dataset, see moments.MomentAccumulator, and of
+    its principal components. The accumulator can be saved and updated later with new rows.
+    """
+
+    def scale(self, standardize: bool) -> np.ndarray:
+        """
+        Return the per-column scale used to standardize the data, like StandardScaler.
+        :param standardize: Whether the data is standardized.
+        :return: The population standard deviation of each column, or ones.
+        """
+        if not standardize:
+            return np.ones(len(self.columns))
+        scale = np.sqrt(np.diag(self.m2) / self.n)
+        scale[scale == 0] = 1.0
+        return scale
+
+    def decomposition(self, standardize: bool) -> tuple:
+        """
+        Return the eigendecomposition of the covariance matrix, matching sklearn's PCA output.
+        :param standardize: Whether to decompose the covariance of the standardized data.
+        :return: The eigenvalues (explained variances), in decreasing order, and the components as rows.
+        :raises ValueError: If fewer than two rows were accumulated.
+        """
+        covariance = self.covariance()
+        scale = self.scale(standardize)
+        covariance = covariance / np.outer(scale, scale)
+
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1]
+        eigenvalues = np.maximum(eigenvalues[order], 0)
+        components = eigenvectors[:, order].T
+
+        # same sign convention as sklearn (svd_flip with u_based_decision=False)
+        signs = np.sign(components[range(len(components)), np.abs(components).argmax(axis=1)])
+        signs[signs == 0] = 1
+        return eigenvalues, components * signs[:, None]
+
+    def save(self, path: str, standardize: bool):
+        """
+        Save the accumulator so it can be updated later.
+        :param path: The path of the npz file.
+        :param standardize: Whether the decomposition built from it is standardized.
+        """
+        np.savez(path, columns=np.asarray(self.columns), n=self.n, mean=self.mean, m2=self.m2, standardize=standardize)
+
+    @classmethod
+    def load(cls, path: str) -> tuple:
+        """
+        Load a saved accumulator.
+        :param path: The path of the npz file.
+        :return: The accumulator and whether its decomposition is standardized.
+        """
+        data = np.load(path)
+        accumulator = cls(data["columns"].tolist())
+        accumulator.n = int(data["n"])
+        accumulator.mean = data["mean"]
+        accumulator.m2 = data["m2"]
+        return accumulator, bool(data["standardize"])
+
+
+def accumulate_csv(path: str, chunk_size: int, progress=None) -> CovarianceAccumulator:
+    """
+    Accumulate the covariance of a CSV file, reading it in chunks.
+    :param path: The path of the CSV file.
+    :param chunk_size: The number of rows per chunk.
+    :param progress: An optional callable receiving the number of rows read so far.
+    :return: The accumulator.
+    :raises ValueError: If the file has no rows.
+    """
+    accumulator = None
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        if accumulator is None:
+            accumulator = CovarianceAccumulator(chunk.columns)
+        accumulator.update(chunk.to_numpy())
+        if progress is not None:
+            progress(accumulator.n)
+    if accumulator is None:
+        raise ValueError(f"no rows to accumulate in {path}")
+    return accumulator
+
+
+def project_csv(path: str, accumulator: CovarianceAccumulator, standardize: bool, components: np.ndarray,
+                output: str, chunk_size: int):
+    """
+    Project every row of a CSV file on the components, reading and writing in chunks.
+    :param path: The path of the CSV file.
+    :param accumulator: The accumulator of the file, gives the mean, scale and number of rows.
+    :param standardize: Whether the decomposition is standardized.
+    :param components: The components as rows.
+    :param output: The artifact receiving the PC1..PCd and id columns.
+    :param chunk_size: The number of rows per chunk.
+    """
+    scale = accumulator.scale(standardize)
+    names = [f'PC{i+1}' for i in range(len(components))]
+    schema = {name: np.float64 for name in names}
+    schema["id"] = np.int64
+
+    writer = artifacts.Writer(output, schema, accumulator.n)
+    start = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        rows = slice(start, start + len(chunk))
+        projected = ((chunk.to_numpy(dtype=np.float64) - accumulator.mean) / scale) @ components.T
+        writer.write(rows, {**dict(zip(names, projected.T)), "id": np.arange(rows.start, rows.stop)})
+        start = rows.stop
+    writer.commit()
@@ -0,0 +1,149 @@
+import numpy as np
+
+
+
+# the knee detection methods, each stored as one score per point of the curve, see scores
+METHODS = ("kneedle", "curvature", "lmethod")
+# the default sensitivity of the kneedle method, the S of Satopaa et al. and of kneed
+SENSITIVITY = 1.0
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    """
+    Scale values to [0, 1].
+    :param values: The values.
+    :return: The scaled values.
+    """
+    return (values - values.min()) / (values.max() - values.min())
+
+def _kneedle(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Run the offline kneedle algorithm of Satopaa et al. (as implemented by kneed) for every sensitivity at once.
+    The knee found for a sensitivity S is the first point whose score is greater than S, since a
+    larger S lowers the thresholds of the difference curve and can only move the knee further.
+    :param x: The normalized x values.
+    :param y: The normalized y values.
+    :return: The largest sensitivity (exclusive) for which every point is the knee, -inf for the
+        points that are never the knee.
+    """
+    n = len(x)
+    bounds = np.full(n, -np.inf)
+
+    # the difference curve of the elbow flipped into a knee, and its local maxima and minima
+    difference = (1 - y) - x
+    padded = np.concatenate(([difference[0]], difference, [difference[-1]]))
+    maxima = (difference >= padded[:-2]) & (difference >= padded[2:])
+    minima = (difference <= padded[:-2]) & (difference <= padded[2:])
+    if not maxima.any():
+        return bounds
+
+    # every point is in the threshold region of the last extremum before it, a minimum resets the threshold to 0
+    index = np.arange(n)
+    last_maximum = np.maximum.accumulate(np.where(maxima, index, -1))
+    last_minimum = np.maximum.accumulate(np.where(minima, index, -1))
+    step = np.abs(np.diff(x)).mean()
+
+    # the traversal stops at the first point after the first maximum whose successor drops below the threshold,
+    # which happens for the sensitivities below the drop from the maximum of the region
+    i = index[np.argmax(maxima):n - 1]
+    m = last_maximum[i]
+    below = np.where(difference[i + 1] < 0, np.inf, -np.inf)
+    sensitivity = np.where(last_minimum[i] >= m, below, (difference[m] - difference[i + 1]) / step)
+
+    # only the points raising the running maximum are the first to stop the traversal for some sensitivities
+    previous = np.concatenate(([-np.inf], np.maximum.accumulate(sensitivity)[:-1]))
+    first = sensitivity > previous
+    np.maximum.at(bounds, m[first], sensitivity[first])
+    return bounds
+
+def _curvature(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Compute the curvature of the normalized curve, whose maximum is the elbow.
+    :param x: The normalized x values.
+    :param y: The normalized y values.
+    :return: The curvature of every point, NaN at the ends where it is not defined.
+    """
+    slope = np.gradient(y, x)
+    curvature = np.abs(np.gradient(slope, x)) / (1 + slope ** 2) ** 1.5
+    curvature[[0, -1]] = np.nan
+    return curvature
+
+def _lmethod(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Compute the error of the L-method of Salvador and Chan, which fits one line to the points up to
+    the elbow and another one to the points after it, for every split at once with cumulative sums.
+    :param x: The normalized x values.
+    :param y: The normalized y values.
+    :return: The size-weighted RMSE of the two lines when every point is the last of the first line,
+        inf when one of the lines would have less than two points.
+    """
+    n = len(x)
+    errors = np.full(n, np.inf)
+    if n < 4:
+        return errors
+
+    def sums(x, y):
+        # the sums of the least squares fits of the prefixes
+        return (np.arange(1, len(x) + 1), np.cumsum(x), np.cumsum(y),
+                np.cumsum(x * x), np.cumsum(x * y), np.cumsum(y * y))
+
+    def rmse(count, sx, sy, sxx, sxy, syy):
+        # the residuals of the line fitted to the points summed up
+        vxx, vxy, vyy = sxx - sx * sx / count, sxy - sx * sy / count, syy - sy * sy / count
+        return np.sqrt(np.maximum(vyy - vxy * vxy / vxx, 0) / count)
+
+    # the prefixes ending at the split and the suffixes starting after it, reversed
+    head = [s[1:n - 2] for s in sums(x, y)]
+    tail = [s[n - 3:0:-1] for s in sums(x[::-1], y[::-1])]
+    errors[1:n - 2] = (head[0] * rmse(*head) + tail[0] * rmse(*tail)) / n
+    return errors
+
+def scores(x, y) -> dict:
+    """
+    Score every point of a decreasing convex curve, e.g. the eigenvalues of a PCA or the SSE of a
+    K-means sweep, so that its elbow can be looked up later for any method and sensitivity.
+    :param x: The x values, in increasing order.
+    :param y: The y values.
+    :return: A dictionary of method to the array of scores of every point, see locate.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+    # a curve with less than three points or a flat one has no elbow
+    if len(x) < 3 or np.ptp(x) == 0 or np.ptp(y) == 0:
+        return {"kneedle": np.full(len(x), -np.inf), "curvature": np.full(len(x), np.nan), "lmethod": np.full(len(x), np.inf)}
+
+    x, y = _normalize(x), _normalize(y)
+    return {"kneedle": _kneedle(x, y), "curvature": _curvature(x, y), "lmethod": _lmethod(x, y)}
+
+def locate(scores: dict, method: str = "kneedle", sensitivity: float = SENSITIVITY):
+    """
+    Look up the elbow of a curve from the scores of its points.
+    :param scores: A dictionary of method to the array of scores of every point, see scores.
+    :param method: 'kneedle', 'curvature' (the point of maximum curvature) or 'lmethod'.
+    :param sensitivity: The sensitivity of the kneedle method, larger values find more conservative elbows.
+    :return: The index of the elbow point, or None if the curve has none.
+    """
+    values = np.asarray(scores[method])
+    if method == "kneedle":
+        found = np.flatnonzero(values > sensitivity)
+        return int(found[0]) if len(found) else None
+    if method == "curvature":
+        return None if np.isnan(values).all() else int(np.nanargmax(values))
+    return None if np.isinf(values).all() else int(np.argmin(values))
+
+def parse_args(args) -> tuple:
+    """
+    Parse the knee detection query parameters of an elbow endpoint.
+    :param args: The request query parameters.
+    :return: The method and the sensitivity.
+    :raises ValueError: If one of the parameters is invalid.
+    """
+    method = args.get('method', 'kneedle')
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+
+    sensitivity = float(args.get('sensitivity', SENSITIVITY))
+    if not sensitivity >= 0:
+        raise ValueError("sensitivity must be a non-negative number")
+
+    return method, sensitivity
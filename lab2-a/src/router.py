@@ -7,8 +7,14 @@ def configure_routes(app: Flask):
     Configure the routes for the Flask app.
     :param app: The Flask app to configure.
     """
-    from . import views
-    from .api import data, pca, clustering
+    from common import metrics
+    from common.api import jobs
+    from . import config, views
+    from .api import data, pca, clustering, pipeline
+
+    # record the latency, phases and memory of every request, and profile the slow ones when enabled
+    metrics.instrument(app, config.METRICS_TRACE_MEMORY, config.PROFILE_SLOW_REQUESTS, config.PROFILE_DIR,
+                       config.PROFILE_INTERVAL)
 
     # define a route that returns the index.html file
     app.add_url_rule('/', 'home', views.home)
@@ -22,12 +28,21 @@ def configure_routes(app: Flask):
     # define a route that performs eigendecomposition on the sampled data
     app.add_url_rule('/api/pca/create', 'create_eigenvalues_and_eigenvectors', pca.create_eigenvalues_and_eigenvectors)
 
+    # define a route that appends rows to the sampled data and updates the eigendecomposition
+    app.add_url_rule('/api/pca/append', 'append_rows', pca.append_rows, methods=['POST'])
+
     # define a route that returns the principal components of the sampled data
     app.add_url_rule('/api/pca', 'get_pca', pca.get_pca)
 
+    # define a route that returns the density grid of the principal components
+    app.add_url_rule('/api/pca/density', 'get_pca_density', pca.get_pca_density)
+
     # define a route that returns the elbow index of the sampled data
     app.add_url_rule('/api/pca/elbow', 'get_elbow_index', pca.get_elbow_index)
 
+    # define a route that returns the points of the principal components matching the brushed predicates
+    app.add_url_rule('/api/pca/query', 'query_pca', pca.query_pca)
+
     # define a route that returns the loadings of the sampled data
     app.add_url_rule('/api/pca/loadings', 'get_loadings', pca.get_loadings)
 
@@ -49,8 +64,29 @@ def configure_routes(app: Flask):
     # define a route that returns the best k value for k-means clustering
     app.add_url_rule('/api/kmeans/bestk', 'get_clusters_bestk', clustering.get_clusters_bestk)
 
+    # define a route that clusters the sampled data on any features and K without saving the artifacts
+    app.add_url_rule('/api/kmeans/fit', 'get_clusters_fit', clustering.get_clusters_fit)
+
     # define a route that returns the results of k-means clustering
     app.add_url_rule('/api/kmeans/results', 'get_kmeans_results', clustering.get_kmeans_results)
 
     # define a route that returns the cluster centers of k-means clustering
     app.add_url_rule('/api/kmeans/centers', 'get_clusters_centers', clustering.get_clusters_centers)
+
+    # define a route that returns the lineage status of every stage of the pipeline
+    app.add_url_rule('/api/pipeline', 'get_pipeline', pipeline.get_pipeline)
+
+    # define a route that rebuilds the stale stages of the pipeline
+    app.add_url_rule('/api/pipeline/rebuild', 'rebuild_pipeline', pipeline.rebuild_pipeline)
+
+    # define a route that returns the status of every background job
+    app.add_url_rule('/api/jobs', 'get_jobs', jobs.get_jobs)
+
+    # define a route that returns the status and progress of a background job
+    app.add_url_rule('/api/jobs/<job_id>', 'get_job', jobs.get_job)
+
+    # define a route that returns the result of a finished background job
+    app.add_url_rule('/api/jobs/<job_id>/result', 'get_job_result', jobs.get_job_result)
+
+    # define a route that returns the metrics of the requests in the Prometheus text format
+    app.add_url_rule('/metrics', 'metrics', metrics.export)
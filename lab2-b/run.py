@@ -1,8 +1,21 @@
+import os
+import sys
+
 from flask import Flask
-from src import router
+
+# the modules shared by the apps are in the common package at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import artifacts, jobs, lineage, preload, streaming
+from src import config, router
 
 
 
+# pass the settings of the app to the modules shared by the apps
+artifacts.configure(config.EXPORT_CSV)
+jobs.configure(config.JOB_WORKERS, config.JOB_QUEUE_SIZE, config.JOB_HISTORY)
+lineage.configure(config.LINEAGE)
+streaming.configure(config.STREAM_CHUNK_SIZE)
+
 # create a Flask app
 app = Flask(__name__, static_folder='app/static', template_folder='app/templates')
 app.config["JSON_SORT_KEYS"] = False
@@ -10,6 +23,10 @@ app.config["JSON_SORT_KEYS"] = False
 # configure the routes
 router.configure_routes(app)
 
+# request the cached routes once, so the first requests do not pay for loading the artifacts
+if config.PRELOAD:
+    preload.warm(app)
+
 # run the app
 if __name__ == '__main__':
     app.run(debug=True, port=5000)  # set the port number here
@@ -1,156 +1,352 @@
-from src import config
+import time
 
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
 
-def create_dataset():
+from common import artifacts, cache, kmeans, lineage, metrics, prep, query, streaming, wire
+from common.api import jobs
+from src import cleaning, config, correlation, profiling
+
+
+
+# the cleaned dataset, rebuilt when the raw data changes
+DATASET = lineage.Stage('dataset', inputs=(config.RAW_DATA,), outputs=(config.ORIGINAL_DATASET,))
+# the clustered dataset and its profile, rebuilt when the cleaned dataset or the clustering parameters change
+CLUSTER_DATA = lineage.Stage('cluster_data', inputs=(config.ORIGINAL_DATASET,), outputs=(config.CLUSTER_DATA, config.CLUSTER_PROFILE))
+
+def compute_dataset(steps: list = None, mode: str = 'auto', progress=None) -> dict:
     """
-    Create a sampled dataset from the original dataset.
+    Clean the raw data and save it as the original dataset.
+    :param steps: The cleaning steps to apply, defaults to every step of cleaning.STEPS.
+    :param mode: 'memory' to clean the raw data in memory with exact quartiles, 'chunked' to stream
+        it with approximate quartiles, or 'auto' to stream it once it is bigger than config.CLEANING_MEMORY_LIMIT.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message, the number of rows, the mode and the seconds spent per step.
     """
-    from flask import jsonify
-    import pandas as pd
+    progress = progress or (lambda fraction, message=None: None)
+    steps = list(cleaning.STEPS) if steps is None else steps
+    mode = cleaning.resolve_mode(config.RAW_DATA, mode)
+
+    # files bigger than memory are cleaned in two passes, writing the dataset chunk by chunk
+    if mode == 'chunked':
+        progress(0.1, "cleaning the raw data in chunks")
+        rows, timings = cleaning.clean_csv(config.RAW_DATA, config.ORIGINAL_DATASET, steps)
+    else:
+        # load the original dataset
+        progress(0.1, "reading the raw data")
+        start = time.perf_counter()
+        with metrics.phase("load"):
+            df = prep.read_csv(config.RAW_DATA)
+        read = time.perf_counter() - start
+
+        # remove the missing values and the duplicates, then the outliers of every numeric column
+        # with a single mask, and normalize the numeric columns to a range of 0-1 for consistency
+        progress(0.3, "cleaning the raw data")
+        df, timings = cleaning.clean(df, steps)
+
+        # save the sampled dataset to a CSV file
+        progress(0.9, "saving the dataset")
+        start = time.perf_counter()
+        df.to_csv(config.ORIGINAL_DATASET, index=False)
+        rows, timings = len(df), {"read": read, **timings, "write": time.perf_counter() - start}
+
+    # record the inputs and parameters the dataset was built from
+    timings = {step: round(seconds, 6) for step, seconds in timings.items()}
+    return DATASET.record({"steps": steps, "mode": mode},
+                          {'message': 'dataset created', 'rows': rows, 'mode': mode, 'timings': timings})
 
-    # load the original dataset
-    df = pd.read_csv(config.RAW_DATA)
-
-    # remove rows with missing values
-    df = df.dropna()
+def create_dataset():
+    """
+    Create a sampled dataset from the original dataset, in the background when async=true.
+    The steps query parameter lists the cleaning steps to apply (every step by default) and
+    mode selects memory, chunked or auto (default) cleaning, see compute_dataset.
+    Unless force=true, the existing dataset is kept when it was built from the current raw data
+    with the same parameters.
+    """
+    # read the cleaning steps and mode from the request query parameters
+    steps = request.args.get('steps', ','.join(cleaning.STEPS)).split(',')
+    unknown = [step for step in steps if step and step not in cleaning.STEPS]
+    if unknown:
+        return jsonify({"error": f"Unknown steps {unknown}, expected some of {', '.join(cleaning.STEPS)}"}), 400
+    steps = [step for step in cleaning.STEPS if step in steps]
 
-    # normalize the numeric columns to a range of 0-1 for consistency
-    numeric_cols = df.select_dtypes(include='number').columns
-    df[numeric_cols] = (df[numeric_cols] - df[numeric_cols].min()) / (df[numeric_cols].max() - df[numeric_cols].min())
+    mode = request.args.get('mode', 'auto')
+    if mode not in ('auto', 'memory', 'chunked'):
+        return jsonify({"error": "Unknown mode, expected auto, memory or chunked"}), 400
+    mode = cleaning.resolve_mode(config.RAW_DATA, mode)
 
-    # remove duplicate rows to ensure uniqueness
-    df = df.drop_duplicates()
+    # the dataset is already built from the current raw data with these parameters
+    result = None if request.args.get('force', 'false').lower() == 'true' else DATASET.lookup({"steps": steps, "mode": mode})
+    if result is not None:
+        return jsonify(result), 200
 
-    # remove outliers in numeric columns using the IQR method
-    for col in numeric_cols:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        # filter out the outliers
-        df = df[(df[col] >= lower_bound) & (df[col] <= upper_bound)]
-    
+    if request.args.get('async', 'false').lower() == 'true':
+        return jobs.submit('create_dataset', compute_dataset, steps, mode, artifacts=(config.ORIGINAL_DATASET,))
 
-    # save the sampled dataset to a CSV file
-    df.to_csv(config.ORIGINAL_DATASET, index=False)
+    return jsonify(compute_dataset(steps, mode)), 200
 
-    return jsonify({'message': 'dataset created'}), 200
 
+def _table_columns() -> list:
+    """
+    Open the columns of the sampled dataset shown by the data table, without loading them.
+    :return: The (column profile, memory mapped array) pairs, without the yes or no columns.
+    """
+    # the profile already knows which columns only hold yes or no values
+    profile = profiling.load(config.CLUSTER_PROFILE, config.CLUSTER_DATA)
+    visible = profiling.visible(profile)
+    columns = artifacts.columns(config.CLUSTER_DATA, [column["name"] for column in visible], decode=False)
+    return [(column, columns[column["name"]]) for column in visible]
 
+def _stream_data(mimetype: str):
+    """
+    Stream a page of the sampled dataset, slicing and encoding config.STREAM_CHUNK_SIZE rows at a time.
+    :param mimetype: wire.JSON for a JSON array, or wire.NDJSON.
+    :return: The streamed response.
+    """
+    # read the page from the request query parameters
+    token = streaming.version(config.CLUSTER_DATA)
+    try:
+        offset, limit = streaming.page(token, mimetype)
+    except streaming.StaleCursorError as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns = _table_columns()
+    total = len(columns[0][1]) if columns else 0
+    stop = total if limit is None else min(total, offset + limit)
+
+    def frames():
+        for rows in streaming.chunks(offset, stop):
+            # set 5 letter limit for all string columns
+            yield pd.DataFrame({
+                column["name"]: profiling.display(column, values[rows]) for column, values in columns
+            })
+
+    return streaming.response(frames(), mimetype, offset, limit, total, token)
+
+@cache.cached(config.CLUSTER_DATA, config.CLUSTER_PROFILE)
 def get_data():
     """
-    Load the sampled dataset.
+    Load the sampled dataset, as JSON records or in a binary columnar format
+    (see common/wire.py) when the Accept header asks for one. NDJSON, stream=true and
+    the offset, limit and cursor parameters stream the data instead (see common/streaming.py).
     """
-    from flask import jsonify
-    import pandas as pd
+    # pick the representation of the response
+    mimetype = wire.negotiate(streaming=True)
+    if mimetype is None:
+        return wire.not_acceptable(streaming=True)
 
-    # load sampled dataset
-    df = pd.read_csv(config.CLUSTER_DATA)
+    if streaming.requested(mimetype):
+        return _stream_data(mimetype)
 
-    # drop columns with only yes or no values
-    for col in df.columns:
-        if df[col].nunique() == 2:
-            df = df.drop(col, axis=1)
+    # load sampled dataset, without the yes or no columns and with a 5 letter limit for all string columns
+    df = pd.DataFrame({column["name"]: profiling.display(column, values) for column, values in _table_columns()})
 
-    # set 5 letter limit for all string columns
-    for col in df.select_dtypes(include='object').columns:
-        df[col] = df[col].str[:5]
+    # return the sampled dataset as typed columns or Arrow, without building the records
+    if mimetype != wire.JSON:
+        return wire.response(df, mimetype)
 
     # return the sampled dataset as a JSON response
     return jsonify(df.to_dict(orient='records')), 200
 
+@cache.cached(config.CLUSTER_PROFILE, config.SAMPLED_DATASET)
 def get_data_columns():
     """
     Get the columns of the dataset.
     """
-    from flask import jsonify, request
-    import pandas as pd
-
-    # read two query parameters (order_type (correlations, original, customize), order_by (array of columns))
+    # read three query parameters (order_type (correlations, optimal, original, customize), order_by (array of columns),
+    # method (pearson, spearman))
     order_type = request.args.get('order_type', 'original')
     order_by = request.args.get('order_by').split(',') if request.args.get('order_by') else []
+    method = request.args.get('method', 'pearson')
+    if method not in correlation.METHODS:
+        return jsonify({"error": f"Unknown method, expected one of {list(correlation.METHODS)}"}), 400
 
-    # load sampled dataset
-    df = pd.read_csv(config.CLUSTER_DATA)
-
-    # drop columns with only yes or no values
-    for col in df.columns:
-        if df[col].nunique() == 2:
-            df = df.drop(col, axis=1)
+    # take the columns of the sampled dataset from its profile, without the yes or no columns
+    profile = profiling.load(config.CLUSTER_PROFILE, config.CLUSTER_DATA)
+    columns = [column["name"] for column in profiling.visible(profile)]
 
-    # order the columns based on the order_type
+    # order the columns based on the order_type, from the correlations of the current sampled dataset
     if order_type == 'correlations':
-        # load the correlations
-        correlations = pd.read_csv(config.CORRELATIONS)
+        correlations = correlation.matrix(config.SAMPLED_DATASET, method).abs()
         # return sorted order based on correlation strength
         order_by = list(correlations.mean().sort_values(ascending=False).index)
+    elif order_type == 'optimal':
+        correlations = correlation.matrix(config.SAMPLED_DATASET, method)
+        # return the order that maximizes the correlation between adjacent axes
+        order_by = correlation.order_axes(correlations)
 
     if order_type != 'original':
         # take the order_by columns at first, then put rest of them as they were
-        ordered_columns = order_by + [col for col in df.columns if col not in order_by]
-        df = df[ordered_columns]
-
-    # get the columns of the dataframe
-    columns = list(df.columns)
+        columns = [col for col in order_by if col in columns] + [col for col in columns if col not in order_by]
 
     return jsonify(columns), 200
 
+@cache.cached(config.SAMPLED_DATASET)
+def get_correlations():
+    """
+    Get the correlation matrix of the numeric columns of the sampled dataset.
+    """
+    # read the correlation method from the query parameters
+    method = request.args.get('method', 'pearson')
+    if method not in correlation.METHODS:
+        return jsonify({"error": f"Unknown method, expected one of {list(correlation.METHODS)}"}), 400
+
+    # the matrix is computed once per version of the sampled dataset
+    correlations = correlation.matrix(config.SAMPLED_DATASET, method)
+    matrix = correlations.to_numpy()
+    return jsonify({
+        "columns": list(correlations.columns),
+        "matrix": [[None if value != value else float(value) for value in row] for row in matrix],
+    }), 200
+
+@cache.cached(config.CLUSTER_DATA)
 def get_cluster_means():
     """
     Get the means of each cluster, including frequency means for object columns.
+    Each statistic is a bincount over the cluster labels (and the dictionary codes for
+    object columns), so no Python code runs per group or per row.
     """
-    from flask import jsonify
-    import pandas as pd
+    # load the cluster data, with the object columns still dictionary-encoded
+    df = artifacts.load(config.CLUSTER_DATA, decode=False)
+
+    # number the clusters 0..n-1 and count their rows
+    clusters, labels = np.unique(df['cluster'].to_numpy(), return_inverse=True)
+    statistics = {'cluster': clusters.tolist(), 'count': np.bincount(labels, minlength=len(clusters)).tolist()}
+
+    for col in df.columns.drop('cluster'):
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            # calculate the means for numeric columns, skipping missing values like groupby().mean()
+            values = values.to_numpy(dtype=np.float64)
+            present = ~np.isnan(values)
+            sums = np.bincount(labels[present], weights=values[present], minlength=len(clusters))
+            counts = np.bincount(labels[present], minlength=len(clusters))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                statistics[col] = [float(mean) if count else None for mean, count in zip(sums / counts, counts)]
+        else:
+            # calculate the frequency mean (mode) for object columns from a cluster x code count table,
+            # ties go to the smallest code, i.e. the first value in sorted order like Series.mode()
+            categorical = values.array if isinstance(values.dtype, pd.CategoricalDtype) else pd.Categorical(values)
+            codes, dictionary = categorical.codes.astype(np.int64), np.asarray(categorical.categories)
+            present = codes >= 0
+            table = np.bincount(labels[present] * len(dictionary) + codes[present],
+                                minlength=len(clusters) * len(dictionary)).reshape(len(clusters), len(dictionary))
+            statistics[col] = [str(dictionary[mode]) if table[i, mode] else None for i, mode in enumerate(table.argmax(axis=1))]
+
+    # convert to dictionary format for JSON response, one record per cluster
+    cluster_means_dict = [dict(zip(statistics, record)) for record in zip(*statistics.values())]
 
-    # load the cluster data
-    df = pd.read_csv(config.CLUSTER_DATA)
+    return jsonify(cluster_means_dict), 200
 
-    # separate numeric and object columns
-    numeric_cols = df.select_dtypes(include='number').columns
-    object_cols = df.select_dtypes(include='object').columns
+def compute_cluster_data(n_clusters: int = 3, features: list = None, algorithm: str = 'auto', seed: int = 0,
+                         progress=None) -> dict:
+    """
+    Cluster the original dataset on some of its columns and save the cluster data and its profile.
+    :param n_clusters: The number of clusters.
+    :param features: The numeric columns to cluster on, defaults to config.CLUSTER_FEATURES.
+    :param algorithm: The k-means algorithm, see kmeans.fit.
+    :param seed: The seed of the k-means initialization.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message.
+    """
+    progress = progress or (lambda fraction, message=None: None)
+    features = features or config.CLUSTER_FEATURES
 
-    # drop cluster column from numeric columns to avoid it being included in the mean calculation
-    numeric_cols = numeric_cols.drop('cluster', errors='ignore')
+    # load sampled dataset
+    progress(0.1, "reading the dataset")
+    with metrics.phase("load"):
+        df = pd.read_csv(config.ORIGINAL_DATASET)
 
-    # calculate the means for numeric columns
-    cluster_means_numeric = df.groupby('cluster')[numeric_cols].mean()
+    # fit the model on the selected features, reusing the fit of an earlier request
+    model = kmeans.fit(config.ORIGINAL_DATASET, features, n_clusters, algorithm, seed)
 
-    # calculate the frequency mean (mode) for object columns
-    cluster_modes_object = df.groupby('cluster')[object_cols].agg(lambda x: x.mode().iloc[0] if not x.mode().empty else None)
+    # add the cluster labels to the dataframe
+    df['cluster'] = model["labels"]
 
-    # combine numeric means and object modes
-    cluster_means = pd.concat([cluster_means_numeric, cluster_modes_object], axis=1).reset_index()
+    # save the cluster data and its column profile
+    progress(0.9, "saving the cluster data")
+    artifacts.save(config.CLUSTER_DATA, df)
+    profiling.save(config.CLUSTER_PROFILE, profiling.build(config.CLUSTER_DATA))
 
-    # convert to dictionary format for JSON response
-    cluster_means_dict = cluster_means.to_dict(orient='records')
+    # index every column for the brushing queries of the views
+    progress(0.95, "indexing the cluster data")
+    query.index(config.CLUSTER_DATA).prepare()
 
-    return jsonify(cluster_means_dict), 200
+    # record the inputs and parameters the cluster data was built from
+    params = {"n_clusters": n_clusters, "features": features, "algorithm": algorithm, "seed": seed}
+    return CLUSTER_DATA.record(params, {'message': 'Cluster data created'})
 
 def create_cluster_data():
     """
-    Create the cluster data.
+    Create the cluster data, on the features, single K, algorithm and seed of the query parameters.
+    Unless force=true, the existing cluster data is kept when it was built from the current dataset
+    with the same parameters.
     """
-    from flask import jsonify
-    import pandas as pd
-    from sklearn.cluster import KMeans
-
-    # load sampled dataset
-    df = pd.read_csv(config.ORIGINAL_DATASET)
-
-    # select the features for clustering
-    X = df[['Inches', 'Ram']].values
-
-    # create the KMeans model
-    kmeans = KMeans(n_clusters=3)
-
-    # fit the model
-    kmeans.fit(X)
-
-    # add the cluster labels to the dataframe
-    df['cluster'] = kmeans.labels_
+    # get the clustering parameters from the request query parameters
+    try:
+        features, k_values, algorithm, seed = kmeans.parse_args(request.args, config.CLUSTER_FEATURES, '3')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(k_values) != 1:
+        return jsonify({"error": "k must be a single value"}), 400
+
+    # the cluster data is already built from the current dataset
+    params = {"n_clusters": k_values[0], "features": features, "algorithm": algorithm, "seed": seed}
+    result = None if request.args.get('force', 'false').lower() == 'true' else CLUSTER_DATA.lookup(params)
+    if result is not None:
+        return jsonify(result), 200
+
+    try:
+        result = compute_cluster_data(k_values[0], features, algorithm, seed)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(config.CLUSTER_DATA, config.CLUSTER_PROFILE)
+
+    return jsonify(result), 200
+
+@cache.cached(config.ORIGINAL_DATASET)
+def get_clusters():
+    """
+    Cluster the original dataset on any numeric features for one or more K, without saving the
+    cluster data, so the page can re-cluster interactively. The fits are cached per version of the dataset.
+    :param features: The comma-separated features, defaults to config.CLUSTER_FEATURES.
+    :param k: A K value, a range like 2-10 or a comma-separated list, 3 by default.
+    :param algorithm: auto (the default), lloyd, elkan or minibatch.
+    :param seed: The seed of the k-means initialization, 0 by default.
+    :param labels: Whether to return the cluster of every row for a single K, true by default.
+    :return: The features, the algorithm and the fits, plus the labels.
+    """
+    # get the clustering parameters from the request query parameters
+    try:
+        features, k_values, algorithm, seed = kmeans.parse_args(request.args, config.CLUSTER_FEATURES, '3')
+        models = kmeans.sweep(config.ORIGINAL_DATASET, features, k_values, algorithm, seed)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # save the cluster data
-    df.to_csv(config.CLUSTER_DATA, index=False)
+    labels = request.args.get('labels', 'true').lower() == 'true'
+    return jsonify(dict(kmeans.summary(models, labels), features=features)), 200
 
-    return jsonify({'message': 'Cluster data created'}), 200
+def query_data():
+    """
+    Return the rows of the cluster data that match every predicate, so the linked views can be
+    brushed on the server. The predicates are answered from the sorted and bitmap indexes of
+    common/query.py, e.g. range=Price:0.2:0.4&in=Company:Apple,Dell&in=cluster:0,2.
+    :param range: column:low:high, the rows of a numeric column within [low, high], may be repeated.
+    :param in: column:value,value, the rows of a column with one of the values, may be repeated.
+    :param ids: Whether to return the ids (positions) of the matching rows, true by default.
+    :param aggregate: The comma-separated columns to summarize over the matching rows.
+    :return: The number of matching rows, plus their ids and the aggregates.
+    """
+    # get the predicates from the request query parameters
+    try:
+        predicates, ids, aggregate = query.parse_args(request.args)
+        result = query.run(config.CLUSTER_DATA, predicates, ids, aggregate)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(result), 200
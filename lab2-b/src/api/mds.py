@@ -1,27 +1,48 @@
-from src import config
+import pandas as pd
+from flask import jsonify, request
+from sklearn.cluster import KMeans
+from sklearn.manifold import MDS
+from sklearn.preprocessing import StandardScaler
 
+from common import artifacts, cache, lineage, lod, metrics
+from common.api import jobs
+from src import config, correlation, embedding
 
 
-def create_data_mds():
+
+# the embedding of the rows, rebuilt when the sampled dataset or the MDS parameters change
+DATA_MDS = lineage.Stage('data_mds', inputs=(config.SAMPLED_DATASET,), outputs=(config.MDS_TRANSFORMED,))
+# the embedding of the variables, rebuilt when the sampled dataset changes
+VARIABLES_MDS = lineage.Stage('variables_mds', inputs=(config.SAMPLED_DATASET,),
+                              outputs=(config.VARS_MDS_TRANSFORMED, config.CORRELATIONS))
+
+def compute_data_mds(method: str = 'smacof', landmarks: int = None, progress=None) -> dict:
     """
     Perform MDS on the sampled dataset and save the transformed data.
+    :param method: 'smacof' for the exact sklearn MDS, or one of the fast 'classical', 'landmark' and 'pivot' methods.
+    :param landmarks: The number of landmarks or pivots of the fast methods, defaults to config.MDS_LANDMARKS.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message, the method and the stress of the embedding.
     """
-    from flask import jsonify
-    import pandas as pd
-    from sklearn.cluster import KMeans
-    from sklearn.manifold import MDS
-    from sklearn.preprocessing import StandardScaler
+    progress = progress or (lambda fraction, message=None: None)
 
     # load sampled dataset
-    df = pd.read_csv(config.SAMPLED_DATASET)
+    progress(0.1, "reading the sampled dataset")
+    with metrics.phase("load"):
+        df = pd.read_csv(config.SAMPLED_DATASET)
 
     # standardize the data
     scaler = StandardScaler()
     df_scaled = scaler.fit_transform(df)
 
-    # compute MDS
-    mds = MDS(n_components=2, dissimilarity='euclidean', random_state=42)
-    mds_transformed = mds.fit_transform(df_scaled)
+    # compute MDS, the fast methods scale roughly linearly with the number of rows
+    progress(0.2, f"computing MDS ({method})")
+    if method == 'smacof':
+        mds = MDS(n_components=2, dissimilarity='euclidean', random_state=42)
+        mds_transformed = mds.fit_transform(df_scaled)
+        stress = embedding.stress(df_scaled, mds_transformed)
+    else:
+        mds_transformed, stress = embedding.embed(df_scaled, method, n_landmarks=landmarks or config.MDS_LANDMARKS)
 
     # apply KMeans to the MDS-transformed data
     kmeans = KMeans(n_clusters=3)
@@ -32,71 +53,154 @@ def create_data_mds():
     df_mds['cluster'] = kmeans.labels_
 
     # save the transformed data
-    df_mds.to_csv(config.MDS_TRANSFORMED, index=False)
+    progress(0.9, "saving the transformed data")
+    artifacts.save(config.MDS_TRANSFORMED, df_mds)
+
+    # record the inputs and parameters the embedding was built from
+    return DATA_MDS.record({"method": method, "landmarks": landmarks},
+                           {"message": "MDS completed successfully", "method": method, "stress": stress})
+
+def create_data_mds():
+    """
+    Perform MDS on the sampled dataset, in the background when async=true.
+    The method query parameter selects smacof (default), classical, landmark or pivot MDS.
+    Unless force=true, the existing embedding is kept when it was built from the current
+    sampled dataset with the same parameters.
+    """
+    # read the MDS method and the number of landmarks from the request query parameters
+    method = request.args.get('method', 'smacof')
+    try:
+        landmarks = int(request.args.get('landmarks', config.MDS_LANDMARKS))
+    except ValueError:
+        return jsonify({"error": "landmarks must be an integer"}), 400
+    if landmarks < 2:
+        return jsonify({"error": "landmarks must be at least 2"}), 400
+    if method not in embedding.METHODS:
+        return jsonify({"error": f"Unknown method, expected one of {', '.join(embedding.METHODS)}"}), 400
+
+    # the number of landmarks only matters to the fast methods
+    if method == 'smacof':
+        landmarks = None
 
-    return jsonify({"message": "MDS completed successfully"}), 200
+    # the embedding is already built from the current sampled dataset with these parameters
+    result = None if request.args.get('force', 'false').lower() == 'true' else DATA_MDS.lookup({"method": method, "landmarks": landmarks})
+    if result is not None:
+        return jsonify(result), 200
 
+    if request.args.get('async', 'false').lower() == 'true':
+        return jobs.submit('create_data_mds', compute_data_mds, method, landmarks, artifacts=(config.MDS_TRANSFORMED,))
+
+    result = compute_data_mds(method, landmarks)
+
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(config.MDS_TRANSFORMED)
+
+    return jsonify(result), 200
+
+@cache.cached(config.MDS_TRANSFORMED)
 def get_data_mds():
     """
     Load the transformed data from the MDS analysis.
+    With max_points, a density-preserving downsample stratified by cluster (restricted to
+    the optional viewport) is returned instead.
     """
-    from flask import jsonify
-    import pandas as pd
+    # get the level of detail from the request query parameters
+    try:
+        max_points, viewport, grid_size = lod.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # load the transformed data
-    df = pd.read_csv(config.MDS_TRANSFORMED)
+    df = artifacts.load(config.MDS_TRANSFORMED)
+
+    # keep the points of the viewport, then downsample every cluster on the grid
+    if max_points is not None or viewport is not None:
+        x, y = df['x'].to_numpy(), df['y'].to_numpy()
+        selected = lod.in_viewport(x, y, viewport)
+        if max_points is not None:
+            strata = df['cluster'].to_numpy()[selected] if 'cluster' in df else None
+            selected = selected[lod.downsample(x[selected], y[selected], max_points, strata, grid_size)]
+        df = df.iloc[selected]
 
     # return the transformed data as a JSON response
     return jsonify(df.to_dict(orient='records')), 200
 
-def create_variables_mds():
+@cache.cached(config.MDS_TRANSFORMED)
+def get_data_mds_density():
     """
-    Perform MDS on the sampled dataset using only the variables selected by the user and save the transformed data.
+    Return the point counts of a grid over the MDS plane, the companion of a downsampled /api/data/mds response.
     """
-    from flask import jsonify
-    import pandas as pd
-    from sklearn.manifold import MDS
-    from sklearn.preprocessing import StandardScaler
+    # get the grid from the request query parameters
+    try:
+        _, viewport, grid_size = lod.parse_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # load sampled dataset
-    df = pd.read_csv(config.SAMPLED_DATASET)
+    # load the transformed data and count it per cell
+    df = artifacts.load(config.MDS_TRANSFORMED, ['x', 'y'])
+    return jsonify(lod.density_grid(df['x'].to_numpy(), df['y'].to_numpy(), grid_size, viewport)), 200
 
-    # standardize the data
-    scaler = StandardScaler()
-    df_scaled = scaler.fit_transform(df)
-
-    # convert the standardized data back to a DataFrame
-    df_scaled = pd.DataFrame(df_scaled, columns=df.columns)
+def compute_variables_mds(progress=None) -> dict:
+    """
+    Perform MDS on the sampled dataset using only the variables selected by the user and save the transformed data.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message.
+    """
+    progress = progress or (lambda fraction, message=None: None)
 
-    # computer pairwise correlation
-    correlation_matrix = df_scaled.corr().abs()
+    # computer pairwise correlation in a single pass over the sampled dataset,
+    # standardizing first is not needed since correlations are scale invariant
+    progress(0.1, "computing the correlations")
+    correlation_matrix = correlation.matrix(config.SAMPLED_DATASET).abs()
 
     # transform the correlation matrix into a distance matrix
     distance_matrix = 1 - correlation_matrix
     
     # computer MDS
+    progress(0.5, "computing MDS")
     mds = MDS(n_components=2, dissimilarity='precomputed', random_state=42)
     mds_transformed = mds.fit_transform(distance_matrix)
 
     # add the variable names to the transformed data
     df_mds = pd.DataFrame(mds_transformed, columns=['MDS1', 'MDS2'])
-    df_mds['variable'] = df.columns
+    df_mds['variable'] = correlation_matrix.columns
 
     # save the transformed data
-    df_mds.to_csv(config.VARS_MDS_TRANSFORMED, index=False)
-    correlation_matrix.to_csv(config.CORRELATIONS, index=False)
+    progress(0.9, "saving the transformed data")
+    artifacts.save(config.VARS_MDS_TRANSFORMED, df_mds)
+    artifacts.save(config.CORRELATIONS, correlation_matrix)
+
+    # record the inputs the embedding was built from
+    return VARIABLES_MDS.record({}, {"message": "Variables MDS completed successfully"})
 
-    return jsonify({"message": "Variables MDS completed successfully"}), 200
+def create_variables_mds():
+    """
+    Perform variable-based MDS on the sampled dataset, in the background when async=true.
+    Unless force=true, the existing embedding is kept when it was built from the current sampled dataset.
+    """
+    # the embedding is already built from the current sampled dataset
+    result = None if request.args.get('force', 'false').lower() == 'true' else VARIABLES_MDS.lookup({})
+    if result is not None:
+        return jsonify(result), 200
+
+    outputs = (config.VARS_MDS_TRANSFORMED, config.CORRELATIONS)
+    if request.args.get('async', 'false').lower() == 'true':
+        return jobs.submit('create_variables_mds', compute_variables_mds, artifacts=outputs)
 
+    result = compute_variables_mds()
+
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(*outputs)
+
+    return jsonify(result), 200
+
+@cache.cached(config.VARS_MDS_TRANSFORMED)
 def get_variables_mds():
     """
     Load the transformed data from the variable-based MDS analysis.
     """
-    from flask import jsonify
-    import pandas as pd
-
     # load the transformed data
-    df = pd.read_csv(config.VARS_MDS_TRANSFORMED)
+    df = artifacts.load(config.VARS_MDS_TRANSFORMED)
 
     # return the transformed data as a JSON response
     return jsonify(df.to_dict(orient='records')), 200
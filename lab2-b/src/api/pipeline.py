@@ -0,0 +1,64 @@
+from flask import jsonify, request
+
+from common import cache
+from common.api import jobs
+from . import data, mds
+
+
+
+def _stages() -> list:
+    """
+    Return the stages of the pipeline in dependency order.
+    :return: The list of (stage, compute function) pairs.
+    """
+    return [
+        (data.DATASET, data.compute_dataset),
+        (data.CLUSTER_DATA, data.compute_cluster_data),
+        (mds.DATA_MDS, mds.compute_data_mds),
+        (mds.VARIABLES_MDS, mds.compute_variables_mds),
+    ]
+
+def rebuild(progress=None) -> dict:
+    """
+    Rerun the stale stages in dependency order, with the parameters of their last run.
+    Each stage is checked after the previous ones ran, so a stage whose inputs were rebuilt
+    with the same content stays fresh and only the stages a change actually affects rerun.
+    :param progress: An optional callable receiving the completed fraction and a message.
+    :return: The result message and the names of the rebuilt stages.
+    """
+    progress = progress or (lambda fraction, message=None: None)
+
+    stages = _stages()
+    rebuilt = []
+    for i, (stage, compute) in enumerate(stages):
+        status = stage.status()
+        if status["status"] != "stale":
+            continue
+        progress(i / len(stages), f"rebuilding {stage.name}")
+        compute(**status["params"])
+        rebuilt.append(stage.name)
+
+    return {"message": "Pipeline is up to date", "rebuilt": rebuilt}
+
+def get_pipeline():
+    """
+    Return the lineage status of every stage of the pipeline.
+    :return: The name, parameters and status (untracked, stale, modified or fresh) of every stage.
+    """
+    return jsonify({"stages": [stage.status() for stage, _ in _stages()]})
+
+def rebuild_pipeline():
+    """
+    Rebuild the stale stages of the pipeline, in the background when async=true.
+    :return: The names of the rebuilt stages, or the id of the background job.
+    """
+    outputs = tuple(path for stage, _ in _stages() for path in stage.outputs)
+    if request.args.get('async', 'false').lower() == 'true':
+        return jobs.submit('rebuild_pipeline', rebuild, artifacts=outputs)
+
+    result = rebuild()
+
+    # drop the cached responses built from the previous artifacts
+    cache.invalidate(*outputs)
+
+    return jsonify(result), 200
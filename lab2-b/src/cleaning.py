@@ -0,0 +1,294 @@
+import contextlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import prep
+from src import config
+
+
+
+# the cleaning steps, always applied in this order
+STEPS = ("dropna", "dedup", "outliers", "normalize")
+# the number of values kept per level of the quantile sketch, its rank error is about log2(n / SKETCH_SIZE) / SKETCH_SIZE
+SKETCH_SIZE = 2048
+
+
+def resolve_mode(path: str, mode: str) -> str:
+    """
+    Resolve the auto cleaning mode of a file from its size.
+    :param path: The path of the CSV file.
+    :param mode: 'memory', 'chunked' or 'auto'.
+    :return: 'chunked' for auto once the file is bigger than config.CLEANING_MEMORY_LIMIT, 'memory' otherwise.
+    """
+    if mode != 'auto':
+        return mode
+    return 'chunked' if os.path.getsize(path) > config.CLEANING_MEMORY_LIMIT else 'memory'
+
+@contextlib.contextmanager
+def _timed(timings: dict, step: str):
+    """
+    Add the time spent in a block to the total of a step.
+    :param timings: The seconds spent per step.
+    :param step: The name of the step.
+    """
+    start = time.perf_counter()
+    yield
+    timings[step] = timings.get(step, 0.0) + time.perf_counter() - start
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of several columns in one pass with bounded memory.
+
+    Values enter level 0 with a weight of 1. A level holding more than SKETCH_SIZE rows is
+    sorted per column and every other row moves to the next level with twice the weight,
+    like the compactors of the KLL sketch. Every column receives the same number of values,
+    so all the columns share the same levels and are compacted together.
+    """
+
+    def __init__(self, columns: list):
+        """
+        :param columns: The names of the sketched columns.
+        """
+        self.columns = list(columns)
+        self.levels = []
+        self.parity = []
+
+    def update(self, X):
+        """
+        Add a chunk of rows to the sketch.
+        :param X: An (n, d) array of rows.
+        """
+        level, values = 0, np.asarray(X, dtype=np.float64)
+        while len(values):
+            if level == len(self.levels):
+                self.levels.append(np.empty((0, len(self.columns))))
+                self.parity.append(0)
+            values = np.concatenate([self.levels[level], values])
+            if len(values) <= SKETCH_SIZE:
+                self.levels[level] = values
+                break
+
+            # keep an even number of rows, promote every other one of them, alternating which half survives
+            values.sort(axis=0)
+            odd = len(values) % 2
+            self.levels[level] = values[len(values) - odd:]
+            values = values[self.parity[level]:len(values) - odd:2]
+            self.parity[level] ^= 1
+            level += 1
+
+    def quantiles(self, q: list) -> pd.DataFrame:
+        """
+        Estimate quantiles of every column.
+        :param q: The quantiles, between 0 and 1.
+        :return: The estimates, indexed by quantile with one column per sketched column.
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+
+        # the weight of the values below each value of each column, in sorted order
+        order = values.argsort(axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        sorted_values = np.take_along_axis(values, order, axis=0)
+
+        estimates = []
+        for quantile in q:
+            rank = (cumulative < quantile * cumulative[-1]).sum(axis=0).clip(max=len(values) - 1)
+            estimates.append(sorted_values[rank, np.arange(len(self.columns))])
+        return pd.DataFrame(estimates, index=q, columns=self.columns)
+
+
+class RowSet:
+    """
+    The set of 64-bit hashes of the rows seen so far, kept as sorted runs merged like the
+    digits of a binary counter, so adding n rows costs O(n log n) overall.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def first_seen(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Add row hashes to the set.
+        :param hashes: The hashes of a chunk of rows.
+        :return: The mask of the rows seen for the first time, the first of equal rows of the chunk included.
+        """
+        _, first = np.unique(hashes, return_index=True)
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first] = True
+        for run in self.runs:
+            position = np.searchsorted(run, hashes).clip(max=len(run) - 1)
+            mask &= run[position] != hashes
+
+        # merge the new run with the previous ones while they are no bigger
+        run = np.sort(hashes[mask])
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.sort(np.concatenate([self.runs.pop(), run]))
+        if len(run):
+            self.runs.append(run)
+        return mask
+
+
+def _bounds(quantiles: pd.DataFrame, factor: float) -> tuple:
+    """
+    Compute the IQR fences of every column.
+    :param quantiles: The first and third quartiles of every column.
+    :param factor: The multiple of the IQR beyond which a value is an outlier.
+    :return: The lower and upper bound arrays.
+    """
+    q1, q3 = quantiles.loc[0.25].to_numpy(), quantiles.loc[0.75].to_numpy()
+    iqr = q3 - q1
+    return q1 - factor * iqr, q3 + factor * iqr
+
+def _inliers(X: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    Build the combined outlier mask of every column at once.
+    :param X: An (n, d) array of rows.
+    :param lower: The lower bound of every column.
+    :param upper: The upper bound of every column.
+    :return: The mask of the rows inside the bounds of every column.
+    """
+    return ((X >= lower) & (X <= upper)).all(axis=1)
+
+def _normalize(df: pd.DataFrame, columns, low: np.ndarray, high: np.ndarray) -> pd.DataFrame:
+    """
+    Scale numeric columns to the 0-1 range of their minimum and maximum, constant columns become 0.
+    :param df: The rows.
+    :param columns: The numeric columns.
+    :param low: The minimum of every column.
+    :param high: The maximum of every column.
+    :return: The rows, with the numeric columns scaled.
+    """
+    span = np.where(high > low, high - low, 1.0)
+    return df.assign(**dict(zip(columns, ((df[columns].to_numpy(dtype=np.float64) - low) / span).T)))
+
+def clean(df: pd.DataFrame, steps: list = STEPS, factor: float = None) -> tuple:
+    """
+    Clean a dataset held in memory.
+    The quartiles of every numeric column are computed in one vectorized call on the deduplicated
+    rows, and the outliers of every column are removed with a single combined mask.
+    :param df: The dataset.
+    :param steps: The steps to apply among STEPS.
+    :param factor: The IQR multiple of the outlier fences, defaults to config.IQR_FACTOR.
+    :return: The cleaned dataset and the seconds spent per step.
+    """
+    factor = config.IQR_FACTOR if factor is None else factor
+    timings = {}
+
+    if "dropna" in steps:
+        with _timed(timings, "dropna"):
+            df = df.dropna()
+
+    # the range of the numeric columns is taken before the duplicates and outliers are removed
+    columns = prep.columns_of(prep.infer_schema(df), prep.NUMERIC)
+    low, high = df[columns].min().to_numpy(), df[columns].max().to_numpy()
+
+    if "dedup" in steps:
+        with _timed(timings, "dedup"):
+            df = df.drop_duplicates()
+
+    if "outliers" in steps:
+        with _timed(timings, "outliers"):
+            X = df[columns].to_numpy(dtype=np.float64)
+            lower, upper = _bounds(df[columns].quantile([0.25, 0.75]), factor)
+            df = df[_inliers(X, lower, upper)]
+
+    if "normalize" in steps:
+        with _timed(timings, "normalize"):
+            df = _normalize(df, columns, low, high)
+
+    return df, timings
+
+def clean_csv(path: str, output: str, steps: list = STEPS, factor: float = None, chunk_size: int = None) -> tuple:
+    """
+    Clean a CSV file in two passes over its chunks, without holding it in memory.
+    The first pass drops the missing values and the duplicates, remembering the kept rows of
+    every chunk as a mask, and sketches the quartiles and the range of the numeric columns.
+    The second pass applies the masks, the outlier fences and the normalization and writes the rows.
+    The quartiles are approximate, see QuantileSketch.
+    :param path: The path of the CSV file.
+    :param output: The path of the cleaned CSV file, replaced atomically.
+    :param steps: The steps to apply among STEPS.
+    :param factor: The IQR multiple of the outlier fences, defaults to config.IQR_FACTOR.
+    :param chunk_size: The number of rows per chunk, defaults to config.STREAM_CHUNK_SIZE.
+    :return: The number of rows written and the seconds spent per step.
+    """
+    factor = config.IQR_FACTOR if factor is None else factor
+    chunk_size = chunk_size or config.STREAM_CHUNK_SIZE
+    timings = {}
+
+    # first pass: the kept rows, the range and the quartile sketch of the numeric columns
+    columns, sketch, seen, masks = None, None, RowSet(), []
+    low, high = None, None
+    try:
+        reader = iter(pd.read_csv(path, chunksize=chunk_size))
+    except pd.errors.EmptyDataError:
+        reader = iter(())
+    while True:
+        with _timed(timings, "read"):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        if columns is None:
+            columns = prep.columns_of(prep.infer_schema(chunk), prep.NUMERIC)
+            sketch = QuantileSketch(columns)
+
+        keep = np.ones(len(chunk), dtype=bool)
+        if "dropna" in steps:
+            with _timed(timings, "dropna"):
+                keep = chunk.notna().all(axis=1).to_numpy()
+
+        # the range of the numeric columns is taken before the duplicates and outliers are removed
+        X = chunk[columns].to_numpy(dtype=np.float64)[keep]
+        if len(X):
+            low = np.nanmin(X, axis=0) if low is None else np.fmin(low, np.nanmin(X, axis=0))
+            high = np.nanmax(X, axis=0) if high is None else np.fmax(high, np.nanmax(X, axis=0))
+
+        if "dedup" in steps:
+            with _timed(timings, "dedup"):
+                hashes = pd.util.hash_pandas_object(chunk[keep], index=False).to_numpy()
+                first = seen.first_seen(hashes)
+                keep[np.flatnonzero(keep)[~first]] = False
+                X = X[first]
+        masks.append(keep)
+
+        # without dropna, the rows with missing values are outliers anyway and stay out of the sketch
+        if "outliers" in steps:
+            with _timed(timings, "outliers"):
+                sketch.update(X[~np.isnan(X).any(axis=1)])
+
+    # a source without rows may yield no chunk at all, its output is its header alone
+    if not masks:
+        with _timed(timings, "write"):
+            with open(path) as source, open(f"{output}.tmp", 'w') as f:
+                f.write(source.readline())
+        os.replace(f"{output}.tmp", output)
+        return 0, timings
+
+    if "outliers" in steps and sketch.levels:
+        lower, upper = _bounds(sketch.quantiles([0.25, 0.75]), factor)
+
+    # second pass: filter, normalize and write every chunk
+    rows, tmp = 0, f"{output}.tmp"
+    reader = iter(pd.read_csv(path, chunksize=chunk_size))
+    for i, keep in enumerate(masks):
+        with _timed(timings, "read"):
+            chunk = next(reader)[keep]
+
+        if "outliers" in steps and len(chunk):
+            with _timed(timings, "outliers"):
+                chunk = chunk[_inliers(chunk[columns].to_numpy(dtype=np.float64), lower, upper)]
+
+        if "normalize" in steps and len(chunk):
+            with _timed(timings, "normalize"):
+                chunk = _normalize(chunk, columns, low, high)
+
+        with _timed(timings, "write"):
+            chunk.to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows += len(chunk)
+
+    os.replace(tmp, output)
+    return rows, timings
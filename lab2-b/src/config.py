@@ -1,8 +1,24 @@
 RAW_DATA="./data/org_laptop_prices.csv"
 ORIGINAL_DATASET="./data/laptop_prices.csv"
 SAMPLED_DATASET="./data/dataset.csv"
-CLUSTER_DATA="./data/cluster_data.csv"
-MDS_TRANSFORMED="./data/mds_transformed.csv"
-VARS_MDS_TRANSFORMED="./data/vars_mds_transformed.csv"
-CORRELATIONS="./data/correlations.csv"
+CLUSTER_DATA="./data/cluster_data"
+CLUSTER_PROFILE="./data/cluster_profile.json"
+CLUSTER_FEATURES=["Inches", "Ram"]
+MDS_TRANSFORMED="./data/mds_transformed"
+VARS_MDS_TRANSFORMED="./data/vars_mds_transformed"
+CORRELATIONS="./data/correlations"
 DATASET_SIZE=1275
+MDS_LANDMARKS=200
+IQR_FACTOR=1.5
+CLEANING_MEMORY_LIMIT=536870912
+EXPORT_CSV=False
+JOB_WORKERS=2
+JOB_QUEUE_SIZE=16
+JOB_HISTORY=100
+STREAM_CHUNK_SIZE=10000
+LINEAGE="./data/lineage"
+METRICS_TRACE_MEMORY=False
+PROFILE_SLOW_REQUESTS=None
+PROFILE_INTERVAL=0.005
+PROFILE_DIR="./data/profiles"
+PRELOAD=True
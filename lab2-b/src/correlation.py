@@ -0,0 +1,183 @@
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from common import cache, metrics, moments
+from src import config
+
+
+
+# the correlation methods accepted by matrix
+METHODS = ("pearson", "spearman")
+# above this many axes the exact ordering (Held-Karp, O(2^d d^2)) gives way to greedy + 2-opt
+EXACT_ORDER_MAX = 10
+
+# the matrices computed by this process, keyed by dataset path, dataset version and method
+_matrices = {}
+_lock = threading.Lock()
+
+
+def _frame(accumulator: moments.MomentAccumulator) -> pd.DataFrame:
+    """
+    Return the correlation matrix of an accumulator as a DataFrame.
+    :param accumulator: The accumulator.
+    :return: The matrix, indexed by column name on both axes.
+    :raises ValueError: If no rows were accumulated.
+    """
+    columns = accumulator.columns
+    return pd.DataFrame(accumulator.correlation(), index=columns, columns=columns)
+
+
+def compute(path: str, method: str = "pearson", chunk_size: int = None) -> pd.DataFrame:
+    """
+    Compute the correlation matrix of the numeric columns of a CSV file.
+    Pearson reads the file in chunks; Spearman needs the ranks of whole columns, so it
+    ranks every column once and then accumulates the ranks in chunks.
+    :param path: The path of the CSV file.
+    :param method: 'pearson' or 'spearman'.
+    :param chunk_size: The number of rows per chunk, defaults to config.STREAM_CHUNK_SIZE.
+    :return: The correlation matrix.
+    :raises ValueError: If the method is unknown or the file has no rows.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown correlation method: {method}")
+    chunk_size = chunk_size or config.STREAM_CHUNK_SIZE
+
+    if method == "spearman":
+        ranks = pd.read_csv(path).select_dtypes(include='number').rank()
+        accumulator = moments.MomentAccumulator(ranks.columns)
+        for start in range(0, len(ranks), chunk_size):
+            accumulator.update(ranks.iloc[start:start + chunk_size].to_numpy())
+        return _frame(accumulator)
+
+    accumulator = None
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        chunk = chunk.select_dtypes(include='number')
+        if accumulator is None:
+            accumulator = moments.MomentAccumulator(chunk.columns)
+        accumulator.update(chunk.to_numpy())
+    if accumulator is None:
+        raise ValueError(f"no rows to correlate in {path}")
+    return _frame(accumulator)
+
+
+def matrix(path: str, method: str = "pearson") -> pd.DataFrame:
+    """
+    Return the correlation matrix of a CSV file, computing it once per version of the file.
+    :param path: The path of the CSV file.
+    :param method: 'pearson' or 'spearman'.
+    :return: The correlation matrix.
+    :raises ValueError: If the method is unknown or the file has no rows.
+    """
+    key = (path, cache.artifact_version(path), method)
+    with _lock:
+        correlations = _matrices.get(key)
+    metrics.cache_event("correlations", correlations is not None)
+    if correlations is not None:
+        return correlations
+
+    correlations = compute(path, method)
+    with _lock:
+        # forget the matrices of the previous versions of the file
+        for stale in [stale for stale in _matrices if stale[0] == path and stale[1] != key[1]]:
+            del _matrices[stale]
+        _matrices[key] = correlations
+    return correlations
+
+
+def _path_weight(weights: np.ndarray, order) -> float:
+    """
+    Return the total weight of the edges between adjacent axes.
+    :param weights: A (d, d) array of edge weights.
+    :param order: The axis order.
+    :return: The sum of the weights of consecutive axes.
+    """
+    order = np.asarray(order)
+    return float(weights[order[:-1], order[1:]].sum())
+
+
+def _exact_order(weights: np.ndarray) -> list:
+    """
+    Find the axis order with the maximum adjacent weight with the Held-Karp dynamic program.
+    :param weights: A (d, d) array of edge weights.
+    :return: The axis order.
+    """
+    d = len(weights)
+    full = (1 << d) - 1
+
+    # best[mask, j]: the best weight of a path visiting the axes of mask and ending with j
+    best = np.full((1 << d, d), -np.inf)
+    parent = np.full((1 << d, d), -1, dtype=np.int64)
+    for j in range(d):
+        best[1 << j, j] = 0.0
+
+    for mask in range(1, full + 1):
+        ends = [j for j in range(d) if mask >> j & 1 and best[mask, j] > -np.inf]
+        for j in ends:
+            for k in range(d):
+                if mask >> k & 1:
+                    continue
+                value = best[mask, j] + weights[j, k]
+                if value > best[mask | 1 << k, k]:
+                    best[mask | 1 << k, k] = value
+                    parent[mask | 1 << k, k] = j
+
+    # walk the parents back from the best full path
+    order, mask, j = [], full, int(best[full].argmax())
+    while j >= 0:
+        order.append(j)
+        mask, j = mask & ~(1 << j), int(parent[mask, j])
+    return order[::-1]
+
+
+def _greedy_order(weights: np.ndarray) -> list:
+    """
+    Build an axis order greedily, then improve it with 2-opt moves.
+    :param weights: A (d, d) array of edge weights.
+    :return: The axis order.
+    """
+    d = len(weights)
+    masked = weights.copy()
+    np.fill_diagonal(masked, -np.inf)
+
+    # start from the strongest pair and grow the path at whichever end gains the most
+    i, j = np.unravel_index(masked.argmax(), masked.shape)
+    order, left = [int(i), int(j)], set(range(d)) - {int(i), int(j)}
+    while left:
+        candidates = list(left)
+        head = masked[order[0], candidates]
+        tail = masked[order[-1], candidates]
+        if head.max() > tail.max():
+            axis = candidates[int(head.argmax())]
+            order.insert(0, axis)
+        else:
+            axis = candidates[int(tail.argmax())]
+            order.append(axis)
+        left.remove(axis)
+
+    # reverse segments while that increases the weight of the path
+    improved = True
+    while improved:
+        improved = False
+        for a, b in itertools.combinations(range(d), 2):
+            candidate = order[:a] + order[a:b + 1][::-1] + order[b + 1:]
+            if _path_weight(weights, candidate) > _path_weight(weights, order) + 1e-12:
+                order, improved = candidate, True
+    return order
+
+
+def order_axes(correlations: pd.DataFrame) -> list:
+    """
+    Order the axes of a parallel coordinates plot so that adjacent axes are as correlated as
+    possible, i.e. the maximum weight Hamiltonian path on the absolute correlations.
+    :param correlations: The correlation matrix.
+    :return: The column names in order.
+    """
+    weights = np.nan_to_num(correlations.abs().to_numpy(), nan=0.0)
+    if len(weights) <= 2:
+        return list(correlations.columns)
+
+    order = _exact_order(weights) if len(weights) <= EXACT_ORDER_MAX else _greedy_order(weights)
+    return [correlations.columns[i] for i in order]
@@ -0,0 +1,193 @@
+import numpy as np
+
+
+
+# the MDS methods accepted by compute_data_mds, smacof is the exact sklearn path
+METHODS = ("smacof", "classical", "landmark", "pivot")
+
+
+def _chunks(n: int, size: int):
+    """
+    Yield the slices that split n rows into chunks.
+    :param n: The number of rows.
+    :param size: The number of rows per chunk.
+    """
+    for start in range(0, n, size):
+        yield slice(start, min(start + size, n))
+
+
+def _squared_distances(X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+    """
+    Return the squared Euclidean distances between the rows of X and Y.
+    :param X: An (n, d) array.
+    :param Y: An (m, d) array.
+    :return: An (n, m) array.
+    """
+    distances = np.einsum('ij,ij->i', X, X)[:, None] + np.einsum('ij,ij->i', Y, Y)[None, :] - 2 * X @ Y.T
+    return np.maximum(distances, 0)
+
+
+def _flip_signs(embedding: np.ndarray) -> np.ndarray:
+    """
+    Make the embedding deterministic by giving the largest coordinate of each axis a positive sign.
+    :param embedding: An (n, k) array.
+    :return: The embedding with flipped axes.
+    """
+    signs = np.sign(embedding[np.abs(embedding).argmax(axis=0), range(embedding.shape[1])])
+    signs[signs == 0] = 1
+    return embedding * signs
+
+
+def select_landmarks(X: np.ndarray, n_landmarks: int, random_state: int = 42) -> np.ndarray:
+    """
+    Select spread out landmarks with the max-min (farthest point) strategy.
+    :param X: An (n, d) array.
+    :param n_landmarks: The number of landmarks.
+    :param random_state: The seed used to pick the first landmark.
+    :return: The indices of the landmarks.
+    """
+    rng = np.random.default_rng(random_state)
+    n_landmarks = min(n_landmarks, len(X))
+
+    landmarks = np.empty(n_landmarks, dtype=np.int64)
+    landmarks[0] = rng.integers(len(X))
+    nearest = np.full(len(X), np.inf)
+    for i in range(1, n_landmarks):
+        nearest = np.minimum(nearest, _squared_distances(X, X[landmarks[i - 1]][None, :])[:, 0])
+        landmarks[i] = nearest.argmax()
+    return landmarks
+
+
+def classical_mds(X: np.ndarray, n_components: int = 2) -> np.ndarray:
+    """
+    Classical (Torgerson) MDS. On Euclidean dissimilarities it equals projecting the
+    centered data on the top eigenvectors of its d x d scatter matrix, so it is O(n d^2).
+    :param X: An (n, d) array.
+    :param n_components: The number of dimensions of the embedding.
+    :return: An (n, n_components) array.
+    """
+    centered = X - X.mean(axis=0)
+    eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+    order = np.argsort(eigenvalues)[::-1][:n_components]
+    return _flip_signs(centered @ eigenvectors[:, order])
+
+
+def landmark_mds(X: np.ndarray, n_components: int = 2, n_landmarks: int = 200, chunk_size: int = 65536,
+                 random_state: int = 42) -> np.ndarray:
+    """
+    Landmark MDS (de Silva and Tenenbaum): classical MDS on a few landmarks, then every
+    point is placed by distance-based triangulation against the landmarks, chunk by chunk.
+    :param X: An (n, d) array.
+    :param n_components: The number of dimensions of the embedding.
+    :param n_landmarks: The number of landmarks.
+    :param chunk_size: The number of rows triangulated at once, bounds the memory to chunk_size x n_landmarks.
+    :param random_state: The seed used to pick the first landmark.
+    :return: An (n, n_components) array.
+    """
+    landmarks = X[select_landmarks(X, n_landmarks, random_state)]
+    m = len(landmarks)
+
+    # classical MDS on the double-centered squared distances of the landmarks
+    delta = _squared_distances(landmarks, landmarks)
+    centering = np.eye(m) - np.ones((m, m)) / m
+    eigenvalues, eigenvectors = np.linalg.eigh(-0.5 * centering @ delta @ centering)
+    order = np.argsort(eigenvalues)[::-1][:n_components]
+    eigenvalues = np.maximum(eigenvalues[order], 1e-12)
+
+    # the pseudo-inverse transpose of the landmark coordinates
+    pseudo_inverse = eigenvectors[:, order] / np.sqrt(eigenvalues)
+    mean_delta = delta.mean(axis=0)
+
+    embedding = np.empty((len(X), n_components))
+    for rows in _chunks(len(X), chunk_size):
+        embedding[rows] = -0.5 * (_squared_distances(X[rows], landmarks) - mean_delta) @ pseudo_inverse
+    return _flip_signs(embedding)
+
+
+def pivot_mds(X: np.ndarray, n_components: int = 2, n_pivots: int = 200, chunk_size: int = 65536,
+              random_state: int = 42) -> np.ndarray:
+    """
+    Pivot MDS (Brandes and Pich): the double-centered n x k block of squared distances to a
+    few pivots approximates the classical MDS matrix. Both passes run chunk by chunk, so
+    only the k x k products are kept in memory.
+    :param X: An (n, d) array.
+    :param n_components: The number of dimensions of the embedding.
+    :param n_pivots: The number of pivots.
+    :param chunk_size: The number of rows processed at once.
+    :param random_state: The seed used to pick the first pivot.
+    :return: An (n, n_components) array.
+    """
+    pivots = X[select_landmarks(X, n_pivots, random_state)]
+
+    # first pass: the column means of the squared distances
+    column_sums = np.zeros(len(pivots))
+    for rows in _chunks(len(X), chunk_size):
+        column_sums += _squared_distances(X[rows], pivots).sum(axis=0)
+    column_means = column_sums / len(X)
+    grand_mean = column_means.mean()
+
+    def centered(rows):
+        distances = _squared_distances(X[rows], pivots)
+        return -0.5 * (distances - distances.mean(axis=1, keepdims=True) - column_means + grand_mean)
+
+    # second pass: the k x k product C^T C, whose eigenvectors give the right singular vectors of C
+    gram = np.zeros((len(pivots), len(pivots)))
+    for rows in _chunks(len(X), chunk_size):
+        block = centered(rows)
+        gram += block.T @ block
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    order = np.argsort(eigenvalues)[::-1][:n_components]
+
+    # third pass: project every row on the right singular vectors
+    embedding = np.empty((len(X), n_components))
+    for rows in _chunks(len(X), chunk_size):
+        embedding[rows] = centered(rows) @ eigenvectors[:, order]
+    return _flip_signs(embedding)
+
+
+def stress(X: np.ndarray, embedding: np.ndarray, n_pairs: int = 100000, random_state: int = 42,
+           rescale: bool = False):
+    """
+    Kruskal's stress-1 between the original and the embedded distances, estimated on random pairs
+    so its cost does not grow with n^2.
+    :param X: The original (n, d) array.
+    :param embedding: The (n, k) embedding.
+    :param n_pairs: The number of sampled pairs.
+    :param random_state: The seed of the pair sampling.
+    :param rescale: Whether to also return the scale factor that minimizes the stress.
+    :return: The stress, or the pair (stress, scale) when rescale is set.
+    """
+    rng = np.random.default_rng(random_state)
+    i = rng.integers(len(X), size=n_pairs)
+    j = rng.integers(len(X), size=n_pairs)
+
+    original = np.linalg.norm(X[i] - X[j], axis=1)
+    embedded = np.linalg.norm(embedding[i] - embedding[j], axis=1)
+
+    # the least-squares scale of the embedded distances, 1 when the embedding is not rescaled
+    scale = (original @ embedded) / max(embedded @ embedded, 1e-12) if rescale else 1.0
+    value = float(np.sqrt(np.sum((original - scale * embedded) ** 2) / max(original @ original, 1e-12)))
+    return (value, float(scale)) if rescale else value
+
+
+def embed(X: np.ndarray, method: str, n_landmarks: int = 200, random_state: int = 42) -> tuple:
+    """
+    Embed the rows of X in two dimensions with one of the fast MDS methods.
+    The approximate methods are rescaled to the scale that minimizes their stress.
+    :param X: An (n, d) array.
+    :param method: 'classical', 'landmark' or 'pivot'.
+    :param n_landmarks: The number of landmarks or pivots.
+    :param random_state: The seed used by the landmark selection and the stress estimate.
+    :return: The (n, 2) embedding and its stress.
+    """
+    if method == "classical":
+        embedding = classical_mds(X)
+    elif method == "landmark":
+        embedding = landmark_mds(X, n_landmarks=n_landmarks, random_state=random_state)
+    elif method == "pivot":
+        embedding = pivot_mds(X, n_pivots=n_landmarks, random_state=random_state)
+    else:
+        raise ValueError(f"unknown MDS method: {method}")
+
+    value, scale = stress(X, embedding, random_state=random_state, rescale=True)
+    return embedding * scale, value
@@ -0,0 +1,113 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from common import artifacts
+
+
+
+# the number of letters of a string value shown by the data table
+DISPLAY_WIDTH = 5
+
+
+def _profile_column(name: str, values: np.ndarray) -> dict:
+    """
+    Compute the statistics of one column.
+    :param name: The column name.
+    :param values: The column values.
+    :return: The name, dtype, kind, cardinality, null count, min, max and binary flag of the column,
+        plus the sorted dictionary of its values and their display truncation for string columns.
+    """
+    if isinstance(values, pd.Categorical):
+        # a dictionary-encoded column, its sorted dictionary holds exactly its distinct values
+        nulls = values.codes < 0
+        unique = np.asarray(values.categories, dtype=str)
+        dtype, kind = unique.dtype, "string"
+    else:
+        values = np.asarray(values)
+        nulls = pd.isna(values)
+        unique = np.unique(values[~nulls])
+        dtype, kind = values.dtype, "numeric" if values.dtype.kind in "biuf" else "string"
+
+    column = {
+        "name": name,
+        "dtype": str(dtype),
+        "kind": kind,
+        "cardinality": int(len(unique)),
+        "nulls": int(nulls.sum()),
+        "min": unique[0].item() if len(unique) else None,
+        "max": unique[-1].item() if len(unique) else None,
+        "binary": len(unique) == 2,
+    }
+    if column["kind"] == "string":
+        column["dictionary"] = {
+            "values": unique.tolist(),
+            "display": unique.astype(f'<U{DISPLAY_WIDTH}').tolist(),
+        }
+    return column
+
+
+def build(path: str) -> dict:
+    """
+    Profile every column of an artifact.
+    :param path: The artifact directory.
+    :return: The profile, the number of rows and the list of column statistics.
+    """
+    columns = artifacts.columns(path, decode=False)
+    return {
+        "rows": len(next(iter(columns.values()))) if columns else 0,
+        "columns": [_profile_column(name, values) for name, values in columns.items()],
+    }
+
+
+def save(path: str, profile: dict):
+    """
+    Atomically write a profile next to its artifact.
+    :param path: The path of the profile JSON file.
+    :param profile: The profile.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(profile, f)
+    os.replace(tmp, path)
+
+
+def load(path: str, artifact: str) -> dict:
+    """
+    Load the profile of an artifact, building it first if the artifact predates its profile.
+    :param path: The path of the profile JSON file.
+    :param artifact: The artifact directory.
+    :return: The profile.
+    """
+    if not os.path.exists(path):
+        save(path, build(artifact))
+    with open(path) as f:
+        return json.load(f)
+
+
+def visible(profile: dict) -> list:
+    """
+    Return the columns shown by the data table, i.e. every column but the yes or no ones.
+    :param profile: The profile.
+    :return: The column statistics, in the artifact order.
+    """
+    return [column for column in profile["columns"] if not column["binary"]]
+
+
+def display(column: dict, values) -> np.ndarray:
+    """
+    Truncate the values of a string column for display through its dictionary.
+    :param column: The column statistics.
+    :param values: The column values, or a Categorical over the codes of a dictionary-encoded column.
+    :return: The truncated values, the values themselves for numeric columns.
+    """
+    if column["kind"] != "string":
+        return values
+    dictionary = column["dictionary"]
+    if isinstance(values, pd.Categorical):
+        codes = values.codes
+    else:
+        codes = np.searchsorted(np.asarray(dictionary["values"]), values)
+    return np.asarray(dictionary["display"], dtype=object)[codes]
@@ -7,8 +7,14 @@ def configure_routes(app: Flask):
     Configure the routes for the Flask app.
     :param app: The Flask app to configure.
     """
-    from . import views
-    from .api import mds, data
+    from common import metrics
+    from common.api import jobs
+    from . import config, views
+    from .api import mds, data, pipeline
+
+    # record the latency, phases and memory of every request, and profile the slow ones when enabled
+    metrics.instrument(app, config.METRICS_TRACE_MEMORY, config.PROFILE_SLOW_REQUESTS, config.PROFILE_DIR,
+                       config.PROFILE_INTERVAL)
 
     # define a route that returns the index.html file
     app.add_url_rule('/', 'home', views.home)
@@ -22,20 +28,50 @@ def configure_routes(app: Flask):
     # define a route that returns the columns of the dataset
     app.add_url_rule('/api/data/columns', 'data_columns', data.get_data_columns, methods=['GET'])
 
+    # define a route that returns the correlation matrix of the dataset
+    app.add_url_rule('/api/data/correlations', 'correlations', data.get_correlations, methods=['GET'])
+
     # define a route that returns the means of each cluster
     app.add_url_rule('/api/data/cluster_means', 'cluster_means', data.get_cluster_means, methods=['GET'])
 
+    # define a route that returns the rows of the cluster data matching the brushed predicates
+    app.add_url_rule('/api/data/query', 'query_data', data.query_data, methods=['GET'])
+
     # define a route that performs clustering on the data
     app.add_url_rule('/api/data/cluster', 'cluster_data', data.create_cluster_data, methods=['POST'])
 
+    # define a route that clusters the data on any features and K without saving it
+    app.add_url_rule('/api/data/kmeans', 'get_clusters', data.get_clusters, methods=['GET'])
+
     # define a route that performs MDS on the data
     app.add_url_rule('/api/data/mds', 'data_mds', mds.create_data_mds, methods=['POST'])
 
     # define a route that returns the transformed data from the MDS analysis
     app.add_url_rule('/api/data/mds', 'get_data_mds', mds.get_data_mds, methods=['GET'])
 
+    # define a route that returns the density grid of the transformed data from the MDS analysis
+    app.add_url_rule('/api/data/mds/density', 'get_data_mds_density', mds.get_data_mds_density, methods=['GET'])
+
     # define a route that performs variable-based MDS on the data
     app.add_url_rule('/api/data/mds/variables', 'variables_mds', mds.create_variables_mds, methods=['POST'])
 
     # define a route that returns the transformed data from the variable-based MDS analysis
     app.add_url_rule('/api/data/mds/variables', 'get_variables_mds', mds.get_variables_mds, methods=['GET'])
+
+    # define a route that returns the lineage status of every stage of the pipeline
+    app.add_url_rule('/api/pipeline', 'get_pipeline', pipeline.get_pipeline, methods=['GET'])
+
+    # define a route that rebuilds the stale stages of the pipeline
+    app.add_url_rule('/api/pipeline/rebuild', 'rebuild_pipeline', pipeline.rebuild_pipeline, methods=['POST'])
+
+    # define a route that returns the status of every background job
+    app.add_url_rule('/api/jobs', 'get_jobs', jobs.get_jobs, methods=['GET'])
+
+    # define a route that returns the status and progress of a background job
+    app.add_url_rule('/api/jobs/<job_id>', 'get_job', jobs.get_job, methods=['GET'])
+
+    # define a route that returns the result of a finished background job
+    app.add_url_rule('/api/jobs/<job_id>/result', 'get_job_result', jobs.get_job_result, methods=['GET'])
+
+    # define a route that returns the metrics of the requests in the Prometheus text format
+    app.add_url_rule('/metrics', 'metrics', metrics.export, methods=['GET'])